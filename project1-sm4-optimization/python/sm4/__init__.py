@@ -0,0 +1,25 @@
+"""
+SM4分组密码Python绑定
+基于ctypes调用project1的C实现 (basic / T表 / SIMD)，
+提供ECB/CBC/CTR/GCM批量模式
+"""
+
+from .backend import BACKENDS, available_backends, fastest_backend, select_backend, build_libraries, cpu_flags
+from .cipher import SM4, BLOCK_SIZE, KEY_SIZE, TAG_SIZE
+
+__version__ = "1.0.0"
+__author__ = "SM4 Optimization Project"
+__description__ = "SM4分组密码Python绑定"
+
+__all__ = [
+ "SM4",
+ "BLOCK_SIZE",
+ "KEY_SIZE",
+ "TAG_SIZE",
+ "BACKENDS",
+ "available_backends",
+ "fastest_backend",
+ "select_backend",
+ "build_libraries",
+ "cpu_flags"
+]
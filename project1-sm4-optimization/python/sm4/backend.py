@@ -0,0 +1,194 @@
+"""
+SM4原生后端加载
+通过ctypes加载project1编译出的共享库 (make shared)。每种实现
+(basic / ttable / simd) 对应一个共享库，CPU不支持的后端不加载；
+自动选择时对可用后端各测一次吞吐量，取最快的一个。
+"""
+
+import ctypes
+import os
+import subprocess
+import time
+from typing import Dict, List, Optional, Set
+
+# project1的源码目录
+PROJECT1_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+# 全部后端，available_backends按此顺序返回
+BACKENDS = ('simd', 'ttable', 'basic')
+
+# 各后端需要的CPU特性 (对应/proc/cpuinfo中的flags)
+_REQUIRED_FLAGS = {
+ 'simd': {'avx2', 'avx512f'},
+ 'ttable': set(),
+ 'basic': set(),
+}
+
+# 自动选择时每个后端测速用的分组数
+_CALIBRATION_BLOCKS = 4096
+
+_libraries: Dict[str, ctypes.CDLL] = {}
+_cpu_flags: Optional[Set[str]] = None
+_fastest: Optional[str] = None
+
+class SM4Context(ctypes.Structure):
+ """对应C中的sm4_context_t"""
+ _fields_ = [('rk', ctypes.c_uint32 * 32)]
+
+def cpu_flags() -> Set[str]:
+ """读取CPU特性标志，无法读取时返回空集合"""
+ global _cpu_flags
+ if _cpu_flags is None:
+ flags = set()
+ try:
+ with open('/proc/cpuinfo') as fp:
+ for line in fp:
+ if line.startswith('flags'):
+ flags.update(line.split(':', 1)[1].split())
+ break
+ except OSError:
+ pass
+ _cpu_flags = flags
+ return _cpu_flags
+
+def library_path(backend: str) -> str:
+ """共享库路径: 环境变量SM4_LIB_DIR指定的目录，否则为project1的build目录"""
+ directory = os.environ.get('SM4_LIB_DIR') or os.path.join(PROJECT1_DIR, 'build')
+ return os.path.join(directory, f'libsm4_{backend}.so')
+
+def _declare(lib: ctypes.CDLL):
+ """声明共享库中函数的参数类型"""
+ ctx = ctypes.POINTER(SM4Context)
+ ptr = ctypes.c_void_p
+ size = ctypes.c_size_t
+
+ signatures = {
+ 'sm4_set_encrypt_key': [ctx, ptr],
+ 'sm4_encrypt_block': [ctx, ptr, ptr],
+ 'sm4_decrypt_block': [ctx, ptr, ptr],
+ 'sm4_ecb_encrypt': [ctx, ptr, ptr, size],
+ 'sm4_ecb_decrypt': [ctx, ptr, ptr, size],
+ 'sm4_cbc_encrypt': [ctx, ptr, ptr, ptr, size],
+ 'sm4_cbc_decrypt': [ctx, ptr, ptr, ptr, size],
+ 'sm4_ctr_crypt': [ctx, ptr, ptr, ptr, size],
+ 'sm4_gcm_encrypt': [ctx, ptr, size, ptr, size, ptr, ptr, size, ptr],
+ 'sm4_gcm_decrypt': [ctx, ptr, size, ptr, size, ptr, ptr, size, ptr],
+ }
+ for name, argtypes in signatures.items():
+ func = getattr(lib, name)
+ func.argtypes = argtypes
+ func.restype = ctypes.c_int
+
+def is_supported(backend: str) -> bool:
+ """CPU是否支持该后端"""
+ if backend not in _REQUIRED_FLAGS:
+ raise ValueError(f"未知的SM4后端: {backend}")
+ return _REQUIRED_FLAGS[backend] <= cpu_flags()
+
+def load(backend: str) -> Optional[ctypes.CDLL]:
+ """
+ 加载指定后端的共享库
+
+ Returns:
+ 共享库对象，共享库不存在、无法加载或CPU不支持时返回None
+ """
+ if backend in _libraries:
+ return _libraries[backend]
+ if not is_supported(backend):
+ return None
+
+ path = library_path(backend)
+ if not os.path.exists(path):
+ return None
+ try:
+ lib = ctypes.CDLL(path)
+ _declare(lib)
+ except (OSError, AttributeError):
+ return None
+
+ _libraries[backend] = lib
+ return lib
+
+def available_backends() -> List[str]:
+ """当前可用的后端 (共享库存在且CPU支持)"""
+ return [name for name in BACKENDS if load(name) is not None]
+
+def _throughput(lib: ctypes.CDLL) -> float:
+ """ECB加密_CALIBRATION_BLOCKS个分组所用时间的倒数"""
+ ctx = SM4Context()
+ lib.sm4_set_encrypt_key(ctypes.byref(ctx), bytes(16))
+ buffer = ctypes.create_string_buffer(_CALIBRATION_BLOCKS * 16)
+
+ lib.sm4_ecb_encrypt(ctypes.byref(ctx), buffer, buffer, 64)
+ start = time.perf_counter()
+ lib.sm4_ecb_encrypt(ctypes.byref(ctx), buffer, buffer, _CALIBRATION_BLOCKS)
+ return 1.0 / max(time.perf_counter() - start, 1e-9)
+
+def fastest_backend() -> Optional[str]:
+ """
+ 可用后端中实测最快的一个 (结果缓存)
+
+ Returns:
+ 后端名称，没有可用后端时返回None
+ """
+ global _fastest
+ if _fastest is None:
+ available = available_backends()
+ if len(available) > 1:
+ available.sort(key=lambda name: _throughput(_libraries[name]), reverse=True)
+ _fastest = available[0] if available else None
+ return _fastest
+
+def select_backend(backend: str = 'auto') -> str:
+ """
+ 选择后端
+
+ Args:
+ backend: 'auto'、'simd'、'ttable' 或 'basic'；
+ 'auto' 时优先使用环境变量SM4_BACKEND，否则选择实测最快的可用后端
+
+ Returns:
+ 后端名称
+
+ Raises:
+ ValueError: 未知的后端名称
+ RuntimeError: 指定的后端不可用
+ """
+ if backend == 'auto':
+ backend = os.environ.get('SM4_BACKEND', 'auto')
+ if backend == 'auto':
+ fastest = fastest_backend()
+ if fastest is None:
+ raise RuntimeError("没有可用的SM4共享库，请先执行 make shared")
+ return fastest
+
+ if backend not in BACKENDS:
+ raise ValueError(f"未知的SM4后端: {backend}")
+ if load(backend) is None:
+ raise RuntimeError(f"SM4后端不可用: {backend}")
+ return backend
+
+def build_libraries() -> List[str]:
+ """
+ 调用project1的Makefile编译共享库 (make shared)
+
+ Returns:
+ 编译出的共享库路径
+
+ Raises:
+ RuntimeError: 编译失败
+ """
+ try:
+ result = subprocess.run(['make', '-C', PROJECT1_DIR, 'shared'],
+ capture_output=True, text=True)
+ except OSError as e:
+ raise RuntimeError(f"无法执行make: {e}")
+
+ paths = [os.path.join(PROJECT1_DIR, 'build', f'libsm4_{name}.so') for name in BACKENDS]
+ if result.returncode != 0 or not all(os.path.exists(path) for path in paths):
+ raise RuntimeError(f"SM4共享库编译失败:\n{result.stderr}")
+ return paths
+
+if __name__ == "__main__":
+ for path in build_libraries():
+ print(f"SM4共享库已编译: {path}")
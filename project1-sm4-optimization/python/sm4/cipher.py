@@ -0,0 +1,209 @@
+"""
+SM4分组密码的Python接口
+ECB/CBC/CTR/GCM整段数据一次交给C实现处理。输入可以是bytes、
+bytearray或memoryview，直接传递内存地址而不复制；通过out参数
+传入可写缓冲区时，结果直接写入该缓冲区 (可以与输入是同一块内存)
+并返回该缓冲区，否则返回新分配的bytearray。
+"""
+
+import ctypes
+from typing import Optional, Tuple, Union
+
+from . import backend as _backend
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+BLOCK_SIZE = 16
+KEY_SIZE = 16
+TAG_SIZE = 16
+
+_MODE_AUTH_FAILED = -2
+
+class _Pinned:
+ """
+ 获取缓冲区的内存地址
+
+ bytes和可写缓冲区不复制；只读的非bytes缓冲区 (如只读memoryview)
+ 复制一份bytes。with块结束时释放对缓冲区的导出。
+ """
+
+ def __init__(self, data: Buffer, writable: bool = False):
+ self._keep = None
+ if isinstance(data, bytes):
+ if writable:
+ raise TypeError("输出缓冲区必须可写")
+ self.length = len(data)
+ self.address = ctypes.cast(ctypes.c_char_p(data), ctypes.c_void_p).value
+ self._keep = data
+ return
+
+ view = memoryview(data)
+ if not view.c_contiguous:
+ raise ValueError("缓冲区必须是连续内存")
+ view = view.cast('B')
+ self.length = len(view)
+
+ if view.readonly:
+ if writable:
+ raise TypeError("输出缓冲区必须可写")
+ copy = view.tobytes()
+ self.address = ctypes.cast(ctypes.c_char_p(copy), ctypes.c_void_p).value
+ self._keep = copy
+ return
+
+ self._keep = (ctypes.c_char * self.length).from_buffer(view) if self.length else None
+ self.address = ctypes.addressof(self._keep) if self.length else None
+
+ def __enter__(self) -> '_Pinned':
+ return self
+
+ def __exit__(self, *exc):
+ self._keep = None
+
+class SM4:
+ """
+ SM4加解密
+
+ Args:
+ key: 16字节密钥
+ backend: 'auto'、'simd'、'ttable' 或 'basic'
+ """
+
+ def __init__(self, key: Buffer, backend: str = 'auto'):
+ key = bytes(key)
+ if len(key) != KEY_SIZE:
+ raise ValueError(f"SM4密钥长度必须为{KEY_SIZE}字节")
+
+ self.backend = _backend.select_backend(backend)
+ self._lib = _backend.load(self.backend)
+ self._ctx = _backend.SM4Context()
+ if self._lib.sm4_set_encrypt_key(ctypes.byref(self._ctx), key) != 0:
+ raise RuntimeError("SM4密钥扩展失败")
+
+ def _output(self, length: int, out: Optional[Buffer]) -> Buffer:
+ """分配输出缓冲区，或检查调用方提供的缓冲区"""
+ if out is None:
+ return bytearray(length)
+ if memoryview(out).nbytes < length:
+ raise ValueError(f"输出缓冲区至少需要{length}字节")
+ return out
+
+ @staticmethod
+ def _check_blocks(data: Buffer) -> int:
+ """ECB/CBC的数据长度必须是分组长度的整数倍"""
+ length = memoryview(data).nbytes
+ if length % BLOCK_SIZE:
+ raise ValueError(f"数据长度必须是{BLOCK_SIZE}字节的整数倍")
+ return length
+
+ @staticmethod
+ def _block_param(value: Buffer, name: str) -> ctypes.Array:
+ """复制IV/计数器，C函数会就地更新它"""
+ value = bytes(value)
+ if len(value) != BLOCK_SIZE:
+ raise ValueError(f"{name}长度必须为{BLOCK_SIZE}字节")
+ return ctypes.create_string_buffer(value, BLOCK_SIZE)
+
+ def _run(self, func, data: Buffer, out: Optional[Buffer], count: int, *params) -> Buffer:
+ """以 func(ctx, *params, in, out, count) 形式调用C函数"""
+ result = self._output(memoryview(data).nbytes, out)
+ with _Pinned(data) as src, _Pinned(result, writable=True) as dst:
+ if func(ctypes.byref(self._ctx), *params, src.address, dst.address, count) != 0:
+ raise RuntimeError("SM4运算失败")
+ return result
+
+ def encrypt_block(self, block: Buffer) -> bytes:
+ """加密单个16字节分组"""
+ if memoryview(block).nbytes != BLOCK_SIZE:
+ raise ValueError(f"分组长度必须为{BLOCK_SIZE}字节")
+ return bytes(self.encrypt_ecb(block))
+
+ def decrypt_block(self, block: Buffer) -> bytes:
+ """解密单个16字节分组"""
+ if memoryview(block).nbytes != BLOCK_SIZE:
+ raise ValueError(f"分组长度必须为{BLOCK_SIZE}字节")
+ return bytes(self.decrypt_ecb(block))
+
+ def encrypt_ecb(self, data: Buffer, out: Optional[Buffer] = None) -> Buffer:
+ """ECB加密，数据长度必须是16的整数倍"""
+ length = self._check_blocks(data)
+ return self._run(self._lib.sm4_ecb_encrypt, data, out, length // BLOCK_SIZE)
+
+ def decrypt_ecb(self, data: Buffer, out: Optional[Buffer] = None) -> Buffer:
+ """ECB解密，数据长度必须是16的整数倍"""
+ length = self._check_blocks(data)
+ return self._run(self._lib.sm4_ecb_decrypt, data, out, length // BLOCK_SIZE)
+
+ def encrypt_cbc(self, data: Buffer, iv: Buffer, out: Optional[Buffer] = None) -> Buffer:
+ """CBC加密 (不做填充)，数据长度必须是16的整数倍"""
+ length = self._check_blocks(data)
+ iv = self._block_param(iv, "IV")
+ return self._run(self._lib.sm4_cbc_encrypt, data, out, length // BLOCK_SIZE, iv)
+
+ def decrypt_cbc(self, data: Buffer, iv: Buffer, out: Optional[Buffer] = None) -> Buffer:
+ """CBC解密 (不去填充)，数据长度必须是16的整数倍"""
+ length = self._check_blocks(data)
+ iv = self._block_param(iv, "IV")
+ return self._run(self._lib.sm4_cbc_decrypt, data, out, length // BLOCK_SIZE, iv)
+
+ def crypt_ctr(self, data: Buffer, counter: Buffer, out: Optional[Buffer] = None) -> Buffer:
+ """
+ CTR模式加解密 (两者相同)，数据长度任意
+
+ Args:
+ counter: 16字节初始计数器，按128位大端整数递增
+ """
+ counter = self._block_param(counter, "计数器")
+ return self._run(self._lib.sm4_ctr_crypt, data, out, memoryview(data).nbytes, counter)
+
+ def encrypt_gcm(self, data: Buffer, iv: Buffer, aad: Buffer = b'',
+ out: Optional[Buffer] = None) -> Tuple[Buffer, bytes]:
+ """
+ GCM认证加密 (RFC 8998)
+
+ Args:
+ iv: 初始向量，推荐12字节
+ aad: 附加认证数据
+
+ Returns:
+ (密文, 16字节认证标签)
+ """
+ iv = bytes(iv)
+ if not iv:
+ raise ValueError("IV不能为空")
+ length = memoryview(data).nbytes
+ result = self._output(length, out)
+ tag = ctypes.create_string_buffer(TAG_SIZE)
+
+ with _Pinned(aad) as a, _Pinned(data) as src, _Pinned(result, writable=True) as dst:
+ status = self._lib.sm4_gcm_encrypt(ctypes.byref(self._ctx), iv, len(iv), a.address, a.length,
+ src.address, dst.address, length, tag)
+ if status != 0:
+ raise RuntimeError("SM4-GCM加密失败")
+ return result, tag.raw
+
+ def decrypt_gcm(self, data: Buffer, iv: Buffer, tag: Buffer, aad: Buffer = b'',
+ out: Optional[Buffer] = None) -> Buffer:
+ """
+ GCM认证解密，先验证标签再解密
+
+ Raises:
+ ValueError: 认证失败
+ """
+ iv = bytes(iv)
+ tag = bytes(tag)
+ if not iv:
+ raise ValueError("IV不能为空")
+ if len(tag) != TAG_SIZE:
+ raise ValueError(f"认证标签长度必须为{TAG_SIZE}字节")
+ length = memoryview(data).nbytes
+ result = self._output(length, out)
+
+ with _Pinned(aad) as a, _Pinned(data) as src, _Pinned(result, writable=True) as dst:
+ status = self._lib.sm4_gcm_decrypt(ctypes.byref(self._ctx), iv, len(iv), a.address, a.length,
+ src.address, dst.address, length, tag)
+ if status == _MODE_AUTH_FAILED:
+ raise ValueError("SM4-GCM认证失败")
+ if status != 0:
+ raise RuntimeError("SM4-GCM解密失败")
+ return result
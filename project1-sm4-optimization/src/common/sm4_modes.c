@@ -0,0 +1,322 @@
+#include "sm4_modes.h"
+#include <string.h>
+
+// Bulk block cipher modes shared by all SM4 backends.
+// Built with -DSM4_MODES_BATCH the SIMD backend's batch functions are used,
+// otherwise blocks are processed through sm4_encrypt_block/sm4_decrypt_block.
+
+#ifdef SM4_MODES_BATCH
+#include "../simd/sm4_simd.h"
+#endif
+
+// Number of blocks processed per chunk (keystream / CBC scratch buffers)
+#define CHUNK_BLOCKS 64
+
+static void encrypt_blocks(const sm4_context_t *ctx, const uint8_t *input, uint8_t *output, size_t num_blocks) {
+#ifdef SM4_MODES_BATCH
+    if (num_blocks > 0) {
+        sm4_encrypt_blocks_simd(ctx, input, output, num_blocks);
+    }
+#else
+    for (size_t i = 0; i < num_blocks; i++) {
+        sm4_encrypt_block(ctx, input + i * SM4_BLOCK_SIZE, output + i * SM4_BLOCK_SIZE);
+    }
+#endif
+}
+
+static void decrypt_blocks(const sm4_context_t *ctx, const uint8_t *input, uint8_t *output, size_t num_blocks) {
+#ifdef SM4_MODES_BATCH
+    if (num_blocks > 0) {
+        sm4_decrypt_blocks_simd(ctx, input, output, num_blocks);
+    }
+#else
+    for (size_t i = 0; i < num_blocks; i++) {
+        sm4_decrypt_block(ctx, input + i * SM4_BLOCK_SIZE, output + i * SM4_BLOCK_SIZE);
+    }
+#endif
+}
+
+static void xor_block(uint8_t *out, const uint8_t *a, const uint8_t *b) {
+    for (int i = 0; i < SM4_BLOCK_SIZE; i++) {
+        out[i] = a[i] ^ b[i];
+    }
+}
+
+// Increment the whole 128-bit big-endian counter
+static void increment_128(uint8_t counter[SM4_BLOCK_SIZE]) {
+    for (int i = SM4_BLOCK_SIZE - 1; i >= 0; i--) {
+        if (++counter[i] != 0) {
+            break;
+        }
+    }
+}
+
+// Increment only the low 32 bits (GCM inc32)
+static void increment_32(uint8_t counter[SM4_BLOCK_SIZE]) {
+    for (int i = SM4_BLOCK_SIZE - 1; i >= SM4_BLOCK_SIZE - 4; i--) {
+        if (++counter[i] != 0) {
+            break;
+        }
+    }
+}
+
+// XOR input with the keystream E(counter), E(counter+1), ...
+static void ctr_xor(const sm4_context_t *ctx, uint8_t counter[SM4_BLOCK_SIZE],
+                    const uint8_t *input, uint8_t *output, size_t len, int inc32) {
+    uint8_t counters[CHUNK_BLOCKS * SM4_BLOCK_SIZE];
+    uint8_t keystream[CHUNK_BLOCKS * SM4_BLOCK_SIZE];
+
+    while (len > 0) {
+        size_t blocks = (len + SM4_BLOCK_SIZE - 1) / SM4_BLOCK_SIZE;
+        if (blocks > CHUNK_BLOCKS) {
+            blocks = CHUNK_BLOCKS;
+        }
+
+        for (size_t i = 0; i < blocks; i++) {
+            memcpy(counters + i * SM4_BLOCK_SIZE, counter, SM4_BLOCK_SIZE);
+            if (inc32) {
+                increment_32(counter);
+            } else {
+                increment_128(counter);
+            }
+        }
+        encrypt_blocks(ctx, counters, keystream, blocks);
+
+        size_t n = blocks * SM4_BLOCK_SIZE;
+        if (n > len) {
+            n = len;
+        }
+        for (size_t i = 0; i < n; i++) {
+            output[i] = input[i] ^ keystream[i];
+        }
+
+        input += n;
+        output += n;
+        len -= n;
+    }
+}
+
+int sm4_ecb_encrypt(const sm4_context_t *ctx, const uint8_t *input, uint8_t *output, size_t num_blocks) {
+    if (!ctx || (num_blocks && (!input || !output))) {
+        return SM4_MODE_ERROR;
+    }
+    encrypt_blocks(ctx, input, output, num_blocks);
+    return SM4_MODE_OK;
+}
+
+int sm4_ecb_decrypt(const sm4_context_t *ctx, const uint8_t *input, uint8_t *output, size_t num_blocks) {
+    if (!ctx || (num_blocks && (!input || !output))) {
+        return SM4_MODE_ERROR;
+    }
+    decrypt_blocks(ctx, input, output, num_blocks);
+    return SM4_MODE_OK;
+}
+
+int sm4_cbc_encrypt(const sm4_context_t *ctx, uint8_t iv[SM4_BLOCK_SIZE], const uint8_t *input, uint8_t *output, size_t num_blocks) {
+    if (!ctx || !iv || (num_blocks && (!input || !output))) {
+        return SM4_MODE_ERROR;
+    }
+
+    // CBC encryption is inherently sequential
+    uint8_t block[SM4_BLOCK_SIZE];
+    for (size_t i = 0; i < num_blocks; i++) {
+        xor_block(block, input + i * SM4_BLOCK_SIZE, iv);
+        sm4_encrypt_block(ctx, block, output + i * SM4_BLOCK_SIZE);
+        memcpy(iv, output + i * SM4_BLOCK_SIZE, SM4_BLOCK_SIZE);
+    }
+    return SM4_MODE_OK;
+}
+
+int sm4_cbc_decrypt(const sm4_context_t *ctx, uint8_t iv[SM4_BLOCK_SIZE], const uint8_t *input, uint8_t *output, size_t num_blocks) {
+    if (!ctx || !iv || (num_blocks && (!input || !output))) {
+        return SM4_MODE_ERROR;
+    }
+
+    // Decrypt a chunk of blocks at once, then XOR with the previous ciphertext.
+    // The ciphertext chunk is copied first so input and output may alias.
+    uint8_t saved[CHUNK_BLOCKS * SM4_BLOCK_SIZE];
+    while (num_blocks > 0) {
+        size_t blocks = num_blocks > CHUNK_BLOCKS ? CHUNK_BLOCKS : num_blocks;
+        size_t n = blocks * SM4_BLOCK_SIZE;
+
+        memcpy(saved, input, n);
+        decrypt_blocks(ctx, saved, output, blocks);
+
+        xor_block(output, output, iv);
+        for (size_t i = 1; i < blocks; i++) {
+            xor_block(output + i * SM4_BLOCK_SIZE, output + i * SM4_BLOCK_SIZE, saved + (i - 1) * SM4_BLOCK_SIZE);
+        }
+        memcpy(iv, saved + n - SM4_BLOCK_SIZE, SM4_BLOCK_SIZE);
+
+        input += n;
+        output += n;
+        num_blocks -= blocks;
+    }
+    return SM4_MODE_OK;
+}
+
+int sm4_ctr_crypt(const sm4_context_t *ctx, uint8_t counter[SM4_BLOCK_SIZE], const uint8_t *input, uint8_t *output, size_t len) {
+    if (!ctx || !counter || (len && (!input || !output))) {
+        return SM4_MODE_ERROR;
+    }
+    ctr_xor(ctx, counter, input, output, len, 0);
+    return SM4_MODE_OK;
+}
+
+// ---------------------------------------------------------------------------
+// GCM
+// ---------------------------------------------------------------------------
+
+static uint64_t load_be64(const uint8_t *p) {
+    uint64_t v = 0;
+    for (int i = 0; i < 8; i++) {
+        v = (v << 8) | p[i];
+    }
+    return v;
+}
+
+static void store_be64(uint8_t *p, uint64_t v) {
+    for (int i = 7; i >= 0; i--) {
+        p[i] = (uint8_t)v;
+        v >>= 8;
+    }
+}
+
+// X = X * H in GF(2^128) (GCM bit order), branch-free on the data
+static void gf128_mul(uint64_t x[2], const uint64_t h[2]) {
+    uint64_t zh = 0, zl = 0;
+    uint64_t vh = h[0], vl = h[1];
+
+    for (int i = 0; i < 128; i++) {
+        uint64_t bit = i < 64 ? (x[0] >> (63 - i)) & 1 : (x[1] >> (127 - i)) & 1;
+        uint64_t mask = (uint64_t)0 - bit;
+        zh ^= vh & mask;
+        zl ^= vl & mask;
+
+        uint64_t reduce = (uint64_t)0 - (vl & 1);
+        vl = (vl >> 1) | (vh << 63);
+        vh = (vh >> 1) ^ (0xE100000000000000ULL & reduce);
+    }
+
+    x[0] = zh;
+    x[1] = zl;
+}
+
+// Absorb data (zero padded to a block boundary) into the GHASH state
+static void ghash_update(uint64_t y[2], const uint64_t h[2], const uint8_t *data, size_t len) {
+    uint8_t block[SM4_BLOCK_SIZE];
+
+    while (len > 0) {
+        size_t n = len < SM4_BLOCK_SIZE ? len : SM4_BLOCK_SIZE;
+        memset(block, 0, SM4_BLOCK_SIZE);
+        memcpy(block, data, n);
+
+        y[0] ^= load_be64(block);
+        y[1] ^= load_be64(block + 8);
+        gf128_mul(y, h);
+
+        data += n;
+        len -= n;
+    }
+}
+
+static void ghash_lengths(uint64_t y[2], const uint64_t h[2], uint64_t a_bytes, uint64_t c_bytes) {
+    y[0] ^= a_bytes * 8;
+    y[1] ^= c_bytes * 8;
+    gf128_mul(y, h);
+}
+
+// Derive the hash key H and the pre-counter block J0
+static void gcm_setup(const sm4_context_t *ctx, const uint8_t *iv, size_t iv_len,
+                      uint64_t h[2], uint8_t j0[SM4_BLOCK_SIZE]) {
+    uint8_t zero[SM4_BLOCK_SIZE] = {0};
+    uint8_t hblock[SM4_BLOCK_SIZE];
+
+    sm4_encrypt_block(ctx, zero, hblock);
+    h[0] = load_be64(hblock);
+    h[1] = load_be64(hblock + 8);
+
+    if (iv_len == 12) {
+        memcpy(j0, iv, 12);
+        j0[12] = 0;
+        j0[13] = 0;
+        j0[14] = 0;
+        j0[15] = 1;
+    } else {
+        uint64_t y[2] = {0, 0};
+        ghash_update(y, h, iv, iv_len);
+        ghash_lengths(y, h, 0, iv_len);
+        store_be64(j0, y[0]);
+        store_be64(j0 + 8, y[1]);
+    }
+}
+
+// tag = E(K, J0) XOR GHASH(H, A, C)
+static void gcm_tag(const sm4_context_t *ctx, const uint64_t h[2], const uint8_t j0[SM4_BLOCK_SIZE],
+                    const uint8_t *aad, size_t aad_len, const uint8_t *ciphertext, size_t len,
+                    uint8_t tag[SM4_GCM_TAG_SIZE]) {
+    uint64_t y[2] = {0, 0};
+    uint8_t s[SM4_BLOCK_SIZE];
+    uint8_t ej0[SM4_BLOCK_SIZE];
+
+    ghash_update(y, h, aad, aad_len);
+    ghash_update(y, h, ciphertext, len);
+    ghash_lengths(y, h, aad_len, len);
+    store_be64(s, y[0]);
+    store_be64(s + 8, y[1]);
+
+    sm4_encrypt_block(ctx, j0, ej0);
+    xor_block(tag, ej0, s);
+}
+
+int sm4_gcm_encrypt(const sm4_context_t *ctx, const uint8_t *iv, size_t iv_len,
+                    const uint8_t *aad, size_t aad_len,
+                    const uint8_t *input, uint8_t *output, size_t len,
+                    uint8_t tag[SM4_GCM_TAG_SIZE]) {
+    if (!ctx || !iv || iv_len == 0 || !tag || (aad_len && !aad) || (len && (!input || !output))) {
+        return SM4_MODE_ERROR;
+    }
+
+    uint64_t h[2];
+    uint8_t j0[SM4_BLOCK_SIZE];
+    uint8_t counter[SM4_BLOCK_SIZE];
+
+    gcm_setup(ctx, iv, iv_len, h, j0);
+    memcpy(counter, j0, SM4_BLOCK_SIZE);
+    increment_32(counter);
+
+    ctr_xor(ctx, counter, input, output, len, 1);
+    gcm_tag(ctx, h, j0, aad, aad_len, output, len, tag);
+    return SM4_MODE_OK;
+}
+
+int sm4_gcm_decrypt(const sm4_context_t *ctx, const uint8_t *iv, size_t iv_len,
+                    const uint8_t *aad, size_t aad_len,
+                    const uint8_t *input, uint8_t *output, size_t len,
+                    const uint8_t tag[SM4_GCM_TAG_SIZE]) {
+    if (!ctx || !iv || iv_len == 0 || !tag || (aad_len && !aad) || (len && (!input || !output))) {
+        return SM4_MODE_ERROR;
+    }
+
+    uint64_t h[2];
+    uint8_t j0[SM4_BLOCK_SIZE];
+    uint8_t counter[SM4_BLOCK_SIZE];
+    uint8_t expected[SM4_GCM_TAG_SIZE];
+
+    // Authenticate before producing any plaintext
+    gcm_setup(ctx, iv, iv_len, h, j0);
+    gcm_tag(ctx, h, j0, aad, aad_len, input, len, expected);
+
+    uint8_t diff = 0;
+    for (int i = 0; i < SM4_GCM_TAG_SIZE; i++) {
+        diff |= expected[i] ^ tag[i];
+    }
+    if (diff != 0) {
+        return SM4_MODE_AUTH_FAILED;
+    }
+
+    memcpy(counter, j0, SM4_BLOCK_SIZE);
+    increment_32(counter);
+    ctr_xor(ctx, counter, input, output, len, 1);
+    return SM4_MODE_OK;
+}
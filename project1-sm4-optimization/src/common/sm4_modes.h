@@ -0,0 +1,43 @@
+#ifndef SM4_MODES_H
+#define SM4_MODES_H
+
+#include "sm4.h"
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+// Return codes for the bulk mode functions
+#define SM4_MODE_OK 0
+#define SM4_MODE_ERROR -1
+#define SM4_MODE_AUTH_FAILED -2
+
+// GCM tag size
+#define SM4_GCM_TAG_SIZE 16
+
+// ECB: num_blocks full blocks, input and output may alias
+int sm4_ecb_encrypt(const sm4_context_t *ctx, const uint8_t *input, uint8_t *output, size_t num_blocks);
+int sm4_ecb_decrypt(const sm4_context_t *ctx, const uint8_t *input, uint8_t *output, size_t num_blocks);
+
+// CBC: iv is updated to the last ciphertext block so calls can be chained
+int sm4_cbc_encrypt(const sm4_context_t *ctx, uint8_t iv[SM4_BLOCK_SIZE], const uint8_t *input, uint8_t *output, size_t num_blocks);
+int sm4_cbc_decrypt(const sm4_context_t *ctx, uint8_t iv[SM4_BLOCK_SIZE], const uint8_t *input, uint8_t *output, size_t num_blocks);
+
+// CTR: 128-bit big-endian counter, any length; counter is advanced past the blocks used
+int sm4_ctr_crypt(const sm4_context_t *ctx, uint8_t counter[SM4_BLOCK_SIZE], const uint8_t *input, uint8_t *output, size_t len);
+
+// GCM (NIST SP 800-38D with SM4 as the block cipher, as in RFC 8998)
+int sm4_gcm_encrypt(const sm4_context_t *ctx, const uint8_t *iv, size_t iv_len,
+                    const uint8_t *aad, size_t aad_len,
+                    const uint8_t *input, uint8_t *output, size_t len,
+                    uint8_t tag[SM4_GCM_TAG_SIZE]);
+int sm4_gcm_decrypt(const sm4_context_t *ctx, const uint8_t *iv, size_t iv_len,
+                    const uint8_t *aad, size_t aad_len,
+                    const uint8_t *input, uint8_t *output, size_t len,
+                    const uint8_t tag[SM4_GCM_TAG_SIZE]);
+
+#ifdef __cplusplus
+}
+#endif
+
+#endif // SM4_MODES_H
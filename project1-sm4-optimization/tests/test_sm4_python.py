@@ -0,0 +1,209 @@
+"""
+SM4 Python绑定测试
+需要make shared编译出的共享库，不存在时尝试自动编译，
+编译失败则跳过本文件的测试。
+"""
+
+import sys
+import os
+import random
+import traceback
+
+import pytest
+
+# 添加python路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'python'))
+
+from sm4 import SM4, available_backends, select_backend, build_libraries, BLOCK_SIZE
+
+def _backends():
+ """可用的后端，必要时先编译共享库"""
+ if not available_backends():
+ try:
+ build_libraries()
+ except RuntimeError as e:
+ print(f"无法编译SM4共享库: {e}")
+ return available_backends()
+
+BACKENDS = _backends()
+requires_library = pytest.mark.skipif(not BACKENDS, reason="SM4共享库不可用")
+
+KEY = bytes.fromhex("0123456789abcdeffedcba9876543210")
+
+# RFC 8998 附录A.1 SM4-GCM测试向量
+GCM_IV = bytes.fromhex("00001234567800000000ABCD")
+GCM_AAD = bytes.fromhex("FEEDFACEDEADBEEFFEEDFACEDEADBEEFABADDAD2")
+GCM_PLAINTEXT = bytes.fromhex("".join(c * 16 for c in "ABCDEFEA"))
+GCM_CIPHERTEXT = bytes.fromhex(
+ "17F399F08C67D5EE19D0DC9969C4BB7D5FD46FD3756489069157B282BB200735"
+ "D82710CA5C22F0CCFA7CBF93D496AC15A56834CBCF98C397B4024A2691233B8D")
+GCM_TAG = bytes.fromhex("83DE3541E4C2B58177E065A9BF7B62EC")
+
+def _xor(a, b):
+ return bytes(x ^ y for x, y in zip(a, b))
+
+@requires_library
+def test_block_vector():
+ """测试GB/T 32907标准测试向量"""
+ print("\n=== 测试标准分组向量 ===")
+
+ expected = bytes.fromhex("681edf34d206965e86b3e94f536e4246")
+ for backend in BACKENDS:
+ cipher = SM4(KEY, backend)
+ assert cipher.encrypt_block(KEY) == expected, f"{backend}加密失败"
+ assert cipher.decrypt_block(expected) == KEY, f"{backend}解密失败"
+ print(f" 测试后端: {', '.join(BACKENDS)}")
+ print("标准分组向量测试通过！")
+
+@requires_library
+def test_gcm_vector():
+ """测试RFC 8998 SM4-GCM测试向量"""
+ print("\n=== 测试SM4-GCM向量 ===")
+
+ for backend in BACKENDS:
+ cipher = SM4(KEY, backend)
+ ciphertext, tag = cipher.encrypt_gcm(GCM_PLAINTEXT, GCM_IV, GCM_AAD)
+ assert ciphertext == GCM_CIPHERTEXT, f"{backend}密文错误"
+ assert tag == GCM_TAG, f"{backend}标签错误"
+ assert cipher.decrypt_gcm(GCM_CIPHERTEXT, GCM_IV, GCM_TAG, GCM_AAD) == GCM_PLAINTEXT
+
+ with pytest.raises(ValueError):
+ cipher.decrypt_gcm(GCM_CIPHERTEXT, GCM_IV, GCM_TAG, GCM_AAD[:-1])
+ forged = bytearray(GCM_CIPHERTEXT)
+ forged[0] ^= 1
+ with pytest.raises(ValueError):
+ cipher.decrypt_gcm(forged, GCM_IV, GCM_TAG, GCM_AAD)
+ print("SM4-GCM向量测试通过！")
+
+@requires_library
+def test_modes_match_block_cipher():
+ """测试CBC/CTR与逐分组的定义一致"""
+ print("\n=== 测试工作模式定义 ===")
+
+ rng = random.Random(2024)
+ data = bytes(rng.getrandbits(8) for _ in range(BLOCK_SIZE * 70))
+ iv = bytes(rng.getrandbits(8) for _ in range(BLOCK_SIZE))
+ cipher = SM4(KEY, BACKENDS[-1])
+
+ previous = iv
+ expected_cbc = b""
+ for i in range(0, len(data), BLOCK_SIZE):
+ previous = cipher.encrypt_block(_xor(data[i:i + BLOCK_SIZE], previous))
+ expected_cbc += previous
+
+ # 计数器从全1开始，检验128位进位
+ counter = b"\xff" * BLOCK_SIZE
+ keystream = b""
+ value = int.from_bytes(counter, 'big')
+ for i in range(0, len(data), BLOCK_SIZE):
+ keystream += cipher.encrypt_block(((value + i // BLOCK_SIZE) % (1 << 128)).to_bytes(16, 'big'))
+
+ for backend in BACKENDS:
+ cipher = SM4(KEY, backend)
+ assert cipher.encrypt_cbc(data, iv) == expected_cbc, f"{backend} CBC错误"
+ assert cipher.decrypt_cbc(expected_cbc, iv) == data
+ for length in [0, 1, 15, 16, 17, len(data) - 3]:
+ assert cipher.crypt_ctr(data[:length], counter) == _xor(data[:length], keystream), f"{backend} CTR错误"
+ print("工作模式定义测试通过！")
+
+@requires_library
+def test_backend_parity():
+ """测试各后端在所有模式下结果一致"""
+ print("\n=== 测试后端一致性 ===")
+
+ rng = random.Random(7)
+ iv = bytes(rng.getrandbits(8) for _ in range(BLOCK_SIZE))
+ ciphers = [SM4(KEY, backend) for backend in BACKENDS]
+ for blocks in [1, 7, 8, 9, 64, 65, 200]:
+ data = bytes(rng.getrandbits(8) for _ in range(blocks * BLOCK_SIZE))
+ results = [(c.encrypt_ecb(data), c.encrypt_cbc(data, iv), c.crypt_ctr(data[:-5], iv),
+ c.encrypt_gcm(data, iv[:12], b"aad"), c.encrypt_gcm(data, iv)) for c in ciphers]
+ assert all(result == results[0] for result in results), f"{blocks}个分组时后端结果不一致"
+ print("后端一致性测试通过！")
+
+@requires_library
+def test_buffer_types():
+ """测试bytes/bytearray/memoryview输入与out参数 (包括就地加解密)"""
+ print("\n=== 测试缓冲区类型 ===")
+
+ cipher = SM4(KEY)
+ data = os.urandom(BLOCK_SIZE * 32)
+ iv = os.urandom(BLOCK_SIZE)
+ expected = cipher.encrypt_cbc(data, iv)
+
+ for source in [bytearray(data), memoryview(data), memoryview(bytearray(data))]:
+ assert cipher.encrypt_cbc(source, iv) == expected
+
+ # 写入调用方提供的缓冲区
+ out = bytearray(len(data) + 10)
+ assert cipher.encrypt_cbc(data, iv, out=out) is out
+ assert out[:len(data)] == expected
+
+ # 就地加解密
+ buffer = bytearray(data)
+ cipher.encrypt_cbc(buffer, iv, out=buffer)
+ assert buffer == expected
+ cipher.decrypt_cbc(buffer, iv, out=buffer)
+ assert buffer == data
+
+ view = memoryview(buffer)[BLOCK_SIZE:]
+ ciphertext, tag = cipher.encrypt_gcm(view, iv[:12], out=view)
+ assert bytes(view) == bytes(ciphertext)
+ cipher.decrypt_gcm(view, iv[:12], tag, out=view)
+ assert buffer == data
+
+ with pytest.raises(ValueError):
+ cipher.encrypt_ecb(data[:-1])
+ with pytest.raises(ValueError):
+ cipher.encrypt_ecb(data, out=bytearray(len(data) - 1))
+ with pytest.raises(TypeError):
+ cipher.encrypt_ecb(data, out=bytes(len(data)))
+ with pytest.raises(ValueError):
+ SM4(KEY[:15])
+ print("缓冲区类型测试通过！")
+
+def test_backend_selection():
+ """测试后端选择"""
+ print("\n=== 测试后端选择 ===")
+
+ with pytest.raises(ValueError):
+ select_backend('gpu')
+ if BACKENDS:
+ assert select_backend('auto') in BACKENDS
+ assert select_backend('basic') == 'basic'
+ print(f" 自动选择: {select_backend('auto')}")
+ print("后端选择测试通过！")
+
+def run_all_tests():
+ """运行所有测试"""
+ print("开始运行SM4 Python绑定测试...\n")
+
+ test_functions = [test_backend_selection]
+ if BACKENDS:
+ test_functions = [
+ test_block_vector,
+ test_gcm_vector,
+ test_modes_match_block_cipher,
+ test_backend_parity,
+ test_buffer_types,
+ test_backend_selection,
+ ]
+ else:
+ print("SM4共享库不可用，只运行后端选择测试")
+
+ failed = 0
+ for test_func in test_functions:
+ try:
+ test_func()
+ print(f" {test_func.__name__} 通过")
+ except Exception as e:
+ failed += 1
+ print(f" {test_func.__name__} 失败: {str(e)}")
+ traceback.print_exc()
+
+ print(f"\n通过: {len(test_functions) - failed}, 失败: {failed}")
+ return failed == 0
+
+if __name__ == "__main__":
+ success = run_all_tests()
+ exit(0 if success else 1)
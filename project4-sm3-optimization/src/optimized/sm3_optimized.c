@@ -11,7 +11,7 @@
  * 4. 分支预测优化
  */
 
-/* 预计算的T值表格 */
+/* 预计算的T值表格: T_j <<< (j mod 32) */
 static const uint32_t T_TABLE[64] = {
     /* T1 for rounds 0-15 */
     0x79cc4519, 0xf3988a32, 0xe7311465, 0xce6228cb,
@@ -20,18 +20,18 @@ static const uint32_t T_TABLE[64] = {
     0xc451979c, 0x88a32f39, 0x11465e73, 0x228cbce6,
     
     /* T2 for rounds 16-63 */
-    0x7a879d8a, 0xf50f3b14, 0xea1e7628, 0xd43cec51,
-    0xa879d8a2, 0x50f3b145, 0xa1e7628b, 0x43cec516,
-    0x879d8a2c, 0x0f3b1459, 0x1e7628b2, 0x3cec5164,
-    0x79d8a2c9, 0xf3b14592, 0xe7628b24, 0xcec51648,
-    0x9d8a2c91, 0x3b145923, 0x7628b246, 0xec51648d,
-    0xd8a2c91a, 0xb1459234, 0x628b2468, 0xc51648d1,
-    0x8a2c91a2, 0x14592345, 0x28b2468a, 0x51648d15,
-    0xa2c91a2a, 0x45923454, 0x8b2468a9, 0x1648d152,
-    0x2c91a2a5, 0x5923454a, 0xb2468a95, 0x648d152a,
-    0xc91a2a55, 0x923454aa, 0x2468a954, 0x48d152a9,
-    0x91a2a552, 0x23454aa5, 0x468a954a, 0x8d152a95,
-    0x1a2a552a, 0x3454aa54, 0x68a954a9, 0xd152a952
+    0x9d8a7a87, 0x3b14f50f, 0x7629ea1e, 0xec53d43c,
+    0xd8a7a879, 0xb14f50f3, 0x629ea1e7, 0xc53d43ce,
+    0x8a7a879d, 0x14f50f3b, 0x29ea1e76, 0x53d43cec,
+    0xa7a879d8, 0x4f50f3b1, 0x9ea1e762, 0x3d43cec5,
+    0x7a879d8a, 0xf50f3b14, 0xea1e7629, 0xd43cec53,
+    0xa879d8a7, 0x50f3b14f, 0xa1e7629e, 0x43cec53d,
+    0x879d8a7a, 0x0f3b14f5, 0x1e7629ea, 0x3cec53d4,
+    0x79d8a7a8, 0xf3b14f50, 0xe7629ea1, 0xcec53d43,
+    0x9d8a7a87, 0x3b14f50f, 0x7629ea1e, 0xec53d43c,
+    0xd8a7a879, 0xb14f50f3, 0x629ea1e7, 0xc53d43ce,
+    0x8a7a879d, 0x14f50f3b, 0x29ea1e76, 0x53d43cec,
+    0xa7a879d8, 0x4f50f3b1, 0x9ea1e762, 0x3d43cec5
 };
 
 /**
@@ -306,6 +306,18 @@ void sm3_optimized_batch_hash(const uint8_t *data, size_t len, uint8_t *digest,
     }
 }
 
+/**
+ * 连续压缩多个完整分组 (供Python等外部调用方使用)
+ * @param state 当前状态，压缩后原地更新
+ * @param data 输入数据指针
+ * @param blocks 分组数量 (data至少包含blocks * 64字节)
+ */
+void sm3_optimized_compress_blocks(uint32_t state[8], const uint8_t *data, size_t blocks) {
+    for (size_t i = 0; i < blocks; i++) {
+        sm3_optimized_compress(state, data + i * SM3_BLOCK_SIZE);
+    }
+}
+
 /**
  * 优化版本测试
  */
@@ -0,0 +1,80 @@
+"""
+asyncio前端对事件循环的影响
+在持续的验签负载下，测量一个每1ms醒来一次的协程的调度延迟 (实际睡眠时间 - 1ms)，
+对比直接在协程中调用verify、AsyncSM2线程模式和进程模式
+"""
+
+import sys
+import os
+import asyncio
+import time
+
+# 添加src路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from basic.sm2_signature import SM2Signature
+from basic.async_sm2 import AsyncSM2
+
+def percentile(samples, fraction):
+ samples = sorted(samples)
+ return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+async def ticker(lags, stop):
+ """每1ms醒来一次，记录超出预期的延迟"""
+ while not stop.is_set():
+ start = time.perf_counter()
+ await asyncio.sleep(0.001)
+ lags.append(time.perf_counter() - start - 0.001)
+
+async def run(mode, items, concurrency):
+ lags = []
+ stop = asyncio.Event()
+ tick = asyncio.create_task(ticker(lags, stop))
+
+ if mode == 'inline':
+ sm2 = SM2Signature()
+
+ async def verify(item):
+ await asyncio.sleep(0)
+ return sm2.verify(*item)
+ frontend = None
+ else:
+ frontend = AsyncSM2(mode)
+ await frontend.start()
+ await frontend.generate_keypair() # 等待执行器完成初始化
+ verify = lambda item: frontend.verify(*item)
+
+ semaphore = asyncio.Semaphore(concurrency)
+
+ async def bounded(item):
+ async with semaphore:
+ return await verify(item)
+
+ start = time.perf_counter()
+ results = await asyncio.gather(*(bounded(item) for item in items))
+ elapsed = time.perf_counter() - start
+ stop.set()
+ await tick
+ if frontend is not None:
+ await frontend.close()
+ assert all(results)
+ return len(items) / elapsed, lags
+
+def main(count: int = 300, concurrency: int = 64):
+ sm2 = SM2Signature()
+ private_key, public_key = sm2.generate_keypair()
+ items = []
+ for i in range(count):
+ message = f"async latency {i}".encode()
+ items.append((message, sm2.sign(message, private_key, public_key), public_key))
+
+ print("=== asyncio前端: 验签负载下其他协程的调度延迟 ===")
+ print(f"CPU核数: {os.cpu_count()}, 请求数: {count}, 并发数: {concurrency}\n")
+ print(f"{'模式':<10}{'验签/秒':>10}{'p50延迟(ms)':>14}{'p99延迟(ms)':>14}{'最大(ms)':>12}")
+ for mode in ('inline', 'thread', 'process'):
+ rate, lags = asyncio.run(run(mode, items, concurrency))
+ print(f"{mode:<10}{rate:>10.0f}{percentile(lags, 0.5) * 1000:>14.2f}"
+ f"{percentile(lags, 0.99) * 1000:>14.2f}{max(lags) * 1000:>12.2f}")
+
+if __name__ == "__main__":
+ main(int(sys.argv[1]) if len(sys.argv) > 1 else 300)
@@ -0,0 +1,107 @@
+"""
+点对象表示的对比
+- 每个点占用的内存: __slots__不可变点 vs 带__dict__的普通对象
+- 一次标量乘法中创建的点对象个数
+- 内层循环在整数三元组上运算 vs 每次点运算都创建JacobianPoint对象
+"""
+
+import sys
+import os
+import random
+import timeit
+import tracemalloc
+
+# 添加src路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from basic.ecc_math import SM2Curve, ECCPoint, JacobianPoint, wnaf_digits, wnaf_width
+
+class DictPoint:
+ """改动前的点表示: 普通对象，每个实例带一个__dict__"""
+
+ def __init__(self, x=None, y=None, is_infinity=False):
+ self.x = x
+ self.y = y
+ self.is_infinity = is_infinity
+
+def traced_bytes(factory, coordinates) -> float:
+ """用tracemalloc测量创建一批点对象 (坐标整数已存在) 平均每个点新增的内存"""
+ tracemalloc.start()
+ before = tracemalloc.get_traced_memory()[0]
+ points = [factory(x, y) for x, y in coordinates]
+ after = tracemalloc.get_traced_memory()[0]
+ tracemalloc.stop()
+ return (after - before - sys.getsizeof(points)) / len(points)
+
+def multiply_with_objects(curve: SM2Curve, k: int, P: ECCPoint) -> JacobianPoint:
+ """与point_multiply_wnaf_jacobian相同的算法，但每次点运算都经过创建点对象的公开方法"""
+ width = wnaf_width(k.bit_length())
+ positives, negatives = curve._wnaf_table(P, width)
+ digits = wnaf_digits(k, width)
+ result = curve._to_jacobian(positives[digits[-1] >> 1])
+ for digit in reversed(digits[:-1]):
+ result = curve.point_double_jacobian(result)
+ if digit > 0:
+ result = curve.point_add_mixed(result, positives[digit >> 1])
+ elif digit < 0:
+ result = curve.point_add_mixed(result, negatives[(-digit) >> 1])
+ return result
+
+def count_point_objects(func) -> int:
+ """统计调用func期间创建的ECCPoint/JacobianPoint对象个数"""
+ count = 0
+ originals = {(ECCPoint, '__new__'): ECCPoint.__new__, (JacobianPoint, '__new__'): JacobianPoint.__new__,
+ (JacobianPoint, '_make'): JacobianPoint._make}
+
+ def counting(original):
+ def wrapper(*args, **kwargs):
+ nonlocal count
+ count += 1
+ return original(*args, **kwargs)
+ return wrapper
+
+ for (cls, name), original in originals.items():
+ setattr(cls, name, counting(original))
+ try:
+ func()
+ finally:
+ for (cls, name), original in originals.items():
+ setattr(cls, name, original)
+ return count
+
+def main():
+ curve = SM2Curve()
+ rng = random.Random(2024)
+ P = curve.point_multiply(rng.randrange(1, curve.n), curve.G)
+ scalars = [rng.randrange(1, curve.n) for _ in range(50)]
+
+ print("=== 每个点对象的内存 (字节，不含坐标整数) ===")
+ coordinates = [(rng.randrange(curve.p), rng.randrange(curve.p)) for _ in range(10000)]
+ for label, factory in (("__dict__对象", DictPoint), ("__slots__不可变点", ECCPoint)):
+ print(f"{label:<16}{traced_bytes(factory, coordinates):>8.1f}")
+ table = curve.fixed_base_table
+ print(f"固定基点表 ({table.size()}个点): {table.nbytes() / 1024:.0f} KB")
+
+ print("\n=== 一次变基点标量乘法中创建的点对象 (不含奇数倍点表) ===")
+ k = scalars[0]
+ table_objects = count_point_objects(lambda: curve._wnaf_table(P, wnaf_width(k.bit_length())))
+ legacy = count_point_objects(lambda: multiply_with_objects(curve, k, P)) - table_objects
+ current = count_point_objects(lambda: curve.point_multiply_wnaf_jacobian(k, P)) - table_objects
+ print(f"每次点运算一个对象: {legacy}")
+ print(f"整数三元组内核: {current}")
+
+ print("\n=== 变基点标量乘法耗时 (毫秒/次) ===")
+ for label, func in (("每次点运算一个对象", multiply_with_objects),
+ ("整数三元组内核", lambda c, k, P: c.point_multiply_wnaf_jacobian(k, P))):
+ best = min(timeit.repeat(lambda: [func(curve, k, P) for k in scalars], number=1, repeat=5))
+ print(f"{label:<12}{best / len(scalars) * 1000:>10.3f}")
+
+ print("\n=== 端到端 (毫秒/次) ===")
+ for label, func in (("k*G (固定基点)", lambda k: curve.point_multiply(k, curve.G)),
+ ("k*P (wNAF)", lambda k: curve.point_multiply(k, P)),
+ ("k1*G + k2*P", lambda k: curve.double_scalar_multiply(k, curve.G, k >> 1, P))):
+ best = min(timeit.repeat(lambda: [func(k) for k in scalars], number=1, repeat=5))
+ print(f"{label:<16}{best / len(scalars) * 1000:>10.3f}")
+
+if __name__ == "__main__":
+ main()
@@ -0,0 +1,74 @@
+"""
+SM2各实现版本的运算剖析
+用instrument统计每次密钥生成、签名、验签的点运算次数、
+估算的域运算代价和耗时分布，对比各版本的时间究竟花在哪里
+"""
+
+import sys
+import os
+
+# 添加src路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from basic.sm2_signature import SM2Signature
+from basic.instrumentation import instrument, DEFAULT_BUCKETS
+from optimized.sm2_optimized_v1 import OptimizedSM2Signature
+from optimized.sm2_practical import PracticalOptimizedSM2Signature
+from optimized.sm2_cached import CachedOptimizedSM2
+from optimized.sm2_simplified import SimplifiedOptimizedSM2
+from optimized.sm2_minimal import MinimalOptimizedSM2
+
+VARIANTS = [
+ ("基础实现", SM2Signature),
+ ("优化v1", OptimizedSM2Signature),
+ ("实用优化", PracticalOptimizedSM2Signature),
+ ("缓存优化", CachedOptimizedSM2),
+ ("简化优化", SimplifiedOptimizedSM2),
+ ("最小优化", MinimalOptimizedSM2),
+]
+
+CALLS = ('generate_keypair', 'sign', 'verify')
+
+def profile_variant(sm2: SM2Signature, iterations: int = 10):
+ """对一个签名对象执行iterations轮密钥生成、签名和验签"""
+ message = b"SM2 profiling message"
+ # 预热: 构建预计算表、填充ZA缓存
+ private_key, public_key = sm2.generate_keypair()
+ sm2.verify(message, sm2.sign(message, private_key, public_key), public_key)
+
+ with instrument(sm2) as counter:
+ for _ in range(iterations):
+ private_key, public_key = sm2.generate_keypair()
+ signature = sm2.sign(message, private_key, public_key)
+ if not sm2.verify(message, signature, public_key):
+ raise RuntimeError("验签失败")
+ return counter
+
+def main(iterations: int = 10):
+ print("=== SM2各实现版本运算剖析 ===")
+ print(f"每个版本 {iterations} 轮 (密钥生成 + 签名 + 验签)\n")
+
+ header = f"{'版本':<8}{'操作':<18}{'平均(ms)':>10}{'p95(ms)':>10}{'模乘M':>10}{'模平方S':>10}{'模逆I':>8}"
+ print(header)
+ print("-" * len(header))
+
+ histograms = {}
+ for label, cls in VARIANTS:
+ counter = profile_variant(cls(), iterations)
+ for name in CALLS:
+ summary = counter.timing_summary(name)
+ if not summary['count']:
+ continue
+ field = counter.field_ops(name)
+ count = summary['count']
+ print(f"{label:<8}{name:<18}{summary['mean'] * 1000:>10.3f}{summary['p95'] * 1000:>10.3f}"
+ f"{field['M'] / count:>10.0f}{field['S'] / count:>10.0f}{field['I'] / count:>8.1f}")
+ histograms[label] = counter.histogram('verify')
+
+ print("\n验签耗时分布 (上界, 秒):")
+ print(" " + " ".join(f"{bound:g}" for bound in DEFAULT_BUCKETS) + " inf")
+ for label, counts in histograms.items():
+ print(f" {label}: {counts}")
+
+if __name__ == "__main__":
+ main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
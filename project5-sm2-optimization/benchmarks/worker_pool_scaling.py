@@ -0,0 +1,48 @@
+"""
+SM2WorkerPool吞吐量随进程数的变化
+每个进程数各跑一轮签名和验签任务流，输出每秒操作数和相对单进程的加速比
+"""
+
+import sys
+import os
+import time
+
+# 添加src路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from basic.sm2_signature import SM2Signature
+from basic.worker_pool import SM2WorkerPool, SignJob, VerifyJob
+
+def measure(processes: int, jobs: list, chunk_size: int) -> float:
+ """返回每秒完成的任务数 (不含进程启动和预计算时间)"""
+ with SM2WorkerPool(processes, chunk_size=chunk_size) as pool:
+ # 预热: 确保所有工作进程都已完成初始化
+ list(pool.imap(jobs[:processes * chunk_size]))
+ start = time.perf_counter()
+ for _ in pool.imap(jobs):
+ pass
+ return len(jobs) / (time.perf_counter() - start)
+
+def main(count: int = 400, chunk_size: int = 16):
+ sm2 = SM2Signature()
+ private_key, public_key = sm2.generate_keypair()
+ messages = [f"worker pool message {i}".encode() for i in range(count)]
+ sign_jobs = [SignJob(m, private_key, public_key) for m in messages]
+ verify_jobs = [VerifyJob(m, sm2.sign(m, private_key, public_key), public_key) for m in messages]
+
+ cores = os.cpu_count() or 1
+ print("=== SM2WorkerPool吞吐量扩展性 ===")
+ print(f"CPU核数: {cores}, 任务数: {count}, 分片大小: {chunk_size}\n")
+ print(f"{'进程数':<8}{'签名/秒':>12}{'加速比':>8}{'验签/秒':>12}{'加速比':>8}")
+
+ baseline = None
+ for processes in sorted({1, 2, 4, cores} & set(range(1, cores + 1))):
+ sign_rate = measure(processes, sign_jobs, chunk_size)
+ verify_rate = measure(processes, verify_jobs, chunk_size)
+ if baseline is None:
+ baseline = (sign_rate, verify_rate)
+ print(f"{processes:<8}{sign_rate:>12.0f}{sign_rate / baseline[0]:>8.2f}"
+ f"{verify_rate:>12.0f}{verify_rate / baseline[1]:>8.2f}")
+
+if __name__ == "__main__":
+ main(int(sys.argv[1]) if len(sys.argv) > 1 else 400)
@@ -3,9 +3,13 @@ SM2椭圆曲线数字签名算法Python实现
 基础实现模块初始化文件
 """
 
-from .ecc_math import SM2Curve, ECCPoint
-from .sm3_hash import SM3Hash, sm3_hash, sm3_hexdigest
-from .sm2_signature import SM2Signature
+from .ecc_math import SM2Curve, ECCPoint, FixedBaseTable, get_fixed_base_table, wnaf_digits, wnaf_width
+from .sm3_hash import SM3Hash, sm3_hash, sm3_hexdigest, sm3_hash_many, sm3_hash_file
+from .sm2_signature import SM2Signature, SM2SigningKey, ZACache, PublicKeyCache
+from .nonce_pool import NoncePool
+from .worker_pool import SM2WorkerPool, SignJob, VerifyJob
+from .async_sm2 import AsyncSM2
+from .instrumentation import OpCounter, instrument
 
 __version__ = "1.0.0"
 __author__ = "SM2 Optimization Project"
@@ -14,8 +18,24 @@ __description__ = "SM2椭圆曲线数字签名算法基础实现"
 __all__ = [
  "SM2Curve",
  "ECCPoint",
+ "FixedBaseTable",
+ "get_fixed_base_table",
+ "wnaf_digits",
+ "wnaf_width",
  "SM3Hash",
  "sm3_hash",
  "sm3_hexdigest",
- "SM2Signature"
+ "sm3_hash_many",
+ "sm3_hash_file",
+ "SM2Signature",
+ "SM2SigningKey",
+ "ZACache",
+ "PublicKeyCache",
+ "NoncePool",
+ "SM2WorkerPool",
+ "SignJob",
+ "VerifyJob",
+ "AsyncSM2",
+ "OpCounter",
+ "instrument"
 ]
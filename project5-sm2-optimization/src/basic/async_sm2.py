@@ -0,0 +1,268 @@
+"""
+SM2签名/验签的asyncio前端
+
+直接在协程中调用SM2Signature.sign/verify会阻塞事件循环数毫秒，期间其他协程
+都无法运行。AsyncSM2把运算交给执行器 (线程池或进程池)，事件循环只负责排队和分发:
+
+- 请求先进入有界队列，队列满时await sign()/verify()会等待 (背压)，而不是无限堆积
+- 分发协程在执行器有空位时把队列中已有的请求打包成一批 (最多batch_size个)，
+ 批内的验签请求一起走批量验证路径；执行器繁忙时请求自然积累成更大的批次
+- 同时在执行器中运行的批次数不超过max_inflight
+
+线程模式没有进程间通信开销，但运算线程仍与事件循环竞争GIL，其他协程的延迟上限
+约为解释器的切换间隔 (sys.getswitchinterval，默认5ms)；进程模式下运算完全不占用
+事件循环所在进程的GIL，负载下其他协程的尾延迟基本不变。
+"""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+try:
+ from .ecc_math import ECCPoint
+ from .sm2_signature import SM2Signature
+ from . import worker_pool as _pool
+ from .worker_pool import SignJob, VerifyJob
+except ImportError:
+ from ecc_math import ECCPoint
+ from sm2_signature import SM2Signature
+ import worker_pool as _pool
+ from worker_pool import SignJob, VerifyJob
+
+# 线程模式下每个执行线程持有自己的签名对象 (各种缓存不是线程安全的)
+_thread_state = threading.local()
+
+def _init_thread(signer_factory: Callable[[], SM2Signature]):
+ """执行线程初始化: 创建签名对象并构建固定基点表"""
+ signer = _thread_state.signer = signer_factory()
+ if getattr(signer.curve, 'fixed_base_window', 0):
+ signer.curve.fixed_base_table
+
+def _run_thread_jobs(jobs: List) -> List[Union[Tuple[int, int], bool]]:
+ """在执行线程中执行一批任务"""
+ return _pool._run_jobs(_thread_state.signer, jobs)
+
+def _thread_keypair() -> Tuple[int, ECCPoint]:
+ """在执行线程中生成密钥对"""
+ return _thread_state.signer.generate_keypair()
+
+def _process_keypair() -> Tuple[int, ECCPoint]:
+ """在工作进程中生成密钥对"""
+ return _pool._worker_signer.generate_keypair()
+
+class AsyncSM2:
+ """
+ SM2签名/验签的asyncio前端
+
+ Example:
+ async with AsyncSM2(executor='process') as sm2:
+ private_key, public_key = await sm2.generate_keypair()
+ signature = await sm2.sign(message, private_key, public_key)
+ assert await sm2.verify(message, signature, public_key)
+ """
+
+ def __init__(self, executor: str = 'thread', max_workers: Optional[int] = None,
+ signer_factory: Callable[[], SM2Signature] = SM2Signature, max_queue: int = 1024,
+ batch_size: int = 32, batch_delay: float = 0.0, max_inflight: Optional[int] = None):
+ """
+ Args:
+ executor: 'thread' 或 'process'
+ max_workers: 执行器的线程/进程数，线程模式默认为1 (受GIL限制，多线程并不更快)，
+ 进程模式默认为CPU核数
+ signer_factory: 在每个执行线程/进程中创建签名对象的可调用对象 (进程模式下须可pickle)
+ max_queue: 等待分发的请求数上限，超过时提交方等待
+ batch_size: 每批最多的请求数
+ batch_delay: 批次未满时额外等待更多请求的时间 (秒)，0表示只打包已在队列中的请求
+ max_inflight: 同时在执行器中运行的批次数上限，默认等于max_workers
+ """
+ if executor not in ('thread', 'process'):
+ raise ValueError(f"未知的执行器类型: {executor}")
+ if max_queue < 1 or batch_size < 1:
+ raise ValueError("队列长度和批大小必须为正数")
+ if batch_delay < 0:
+ raise ValueError("批次等待时间不能为负数")
+
+ self.executor = executor
+ if max_workers is None:
+ max_workers = 1 if executor == 'thread' else os.cpu_count() or 1
+ self.max_workers = max_workers
+ self.signer_factory = signer_factory
+ self.max_queue = max_queue
+ self.batch_size = batch_size
+ self.batch_delay = batch_delay
+ self.max_inflight = max_inflight or max_workers
+
+ self.requests = 0
+ self.batches = 0
+ self.max_batch = 0
+ self.retries = 0
+
+ self._executor: Optional[Executor] = None
+ self._queue: Optional[asyncio.Queue] = None
+ self._slots: Optional[asyncio.Semaphore] = None
+ self._dispatcher: Optional[asyncio.Task] = None
+ self._closed = False
+
+ def _create_executor(self) -> Executor:
+ if self.executor == 'thread':
+ return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='sm2-async',
+ initializer=_init_thread, initargs=(self.signer_factory,))
+ return ProcessPoolExecutor(max_workers=self.max_workers, initializer=_pool._init_worker,
+ initargs=(self.signer_factory,))
+
+ async def start(self):
+ """创建执行器并启动分发协程 (首次提交请求时自动调用)"""
+ if self._closed:
+ raise RuntimeError("异步前端已关闭")
+ if self._dispatcher is None:
+ self._executor = self._create_executor()
+ self._queue = asyncio.Queue(self.max_queue)
+ self._slots = asyncio.Semaphore(self.max_inflight)
+ self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+
+ async def close(self):
+ """
+ 处理完已提交的请求后关闭执行器
+
+ 关闭时仍在等待队列空位 (背压) 的请求可能排在结束标记之后，
+ 这些请求以RuntimeError结束，而不会一直等待
+ """
+ if self._closed:
+ return
+ self._closed = True
+ if self._dispatcher is None:
+ return
+ await self._queue.put(None)
+ await self._dispatcher
+ self._reject_queued()
+ await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+
+ def _reject_queued(self):
+ """分发协程退出后，让仍留在队列中的请求以RuntimeError结束"""
+ while True:
+ try:
+ item = self._queue.get_nowait()
+ except asyncio.QueueEmpty:
+ return
+ if item is not None and not item[1].done():
+ item[1].set_exception(RuntimeError("异步前端已关闭，请求未被处理"))
+
+ async def __aenter__(self) -> 'AsyncSM2':
+ await self.start()
+ return self
+
+ async def __aexit__(self, *exc_info):
+ await self.close()
+
+ async def _submit(self, job):
+ """把任务放入队列并等待结果"""
+ await self.start()
+ future = asyncio.get_running_loop().create_future()
+ await self._queue.put((job, future))
+ self.requests += 1
+ if self._dispatcher.done():
+ # 等待队列空位期间前端已关闭，请求排在了结束标记之后
+ self._reject_queued()
+ return await future
+
+ async def sign(self, message: Union[bytes, str], private_key: int,
+ public_key: Optional[ECCPoint] = None, user_id: Optional[str] = None) -> Tuple[int, int]:
+ """异步SM2签名，参数同SM2Signature.sign"""
+ return await self._submit(SignJob(message, private_key, public_key, user_id))
+
+ async def verify(self, message: Union[bytes, str], signature: Tuple[int, int],
+ public_key: ECCPoint, user_id: Optional[str] = None) -> bool:
+ """异步SM2验签，参数同SM2Signature.verify"""
+ return await self._submit(VerifyJob(message, signature, public_key, user_id))
+
+ async def generate_keypair(self) -> Tuple[int, ECCPoint]:
+ """异步生成密钥对 (不参与打包，但占用一个执行器名额)"""
+ await self.start()
+ keypair = _thread_keypair if self.executor == 'thread' else _process_keypair
+ async with self._slots:
+ return await asyncio.get_running_loop().run_in_executor(self._executor, keypair)
+
+ async def _dispatch(self):
+ """分发协程: 等到执行器有空位后，把队列中的请求打包提交"""
+ loop = asyncio.get_running_loop()
+ running = set()
+ closing = False
+ while not closing:
+ item = await self._queue.get()
+ if item is None:
+ break
+ await self._slots.acquire()
+
+ batch = [item]
+ deadline = loop.time() + self.batch_delay
+ while len(batch) < self.batch_size:
+ try:
+ item = self._queue.get_nowait()
+ except asyncio.QueueEmpty:
+ timeout = deadline - loop.time()
+ if timeout <= 0:
+ break
+ try:
+ item = await asyncio.wait_for(self._queue.get(), timeout)
+ except asyncio.TimeoutError:
+ break
+ if item is None:
+ closing = True
+ break
+ batch.append(item)
+
+ # 调用方已取消的请求不再计算
+ batch = [(job, future) for job, future in batch if not future.done()]
+ if not batch:
+ self._slots.release()
+ continue
+ self.batches += 1
+ self.max_batch = max(self.max_batch, len(batch))
+ task = loop.create_task(self._execute(batch))
+ running.add(task)
+ task.add_done_callback(running.discard)
+
+ if running:
+ await asyncio.gather(*running)
+
+ async def _execute(self, batch: List[Tuple]):
+ """在执行器中运行一批请求并分发结果"""
+ loop = asyncio.get_running_loop()
+ run = _run_thread_jobs if self.executor == 'thread' else _pool._run_chunk
+ try:
+ try:
+ results = await loop.run_in_executor(self._executor, run, [job for job, _ in batch])
+ outcomes = [(result, None) for result in results]
+ except Exception:
+ # 批内某个请求出错时逐个重试，异常只交给出错的请求
+ self.retries += 1
+ outcomes = []
+ for job, _ in batch:
+ try:
+ outcomes.append(((await loop.run_in_executor(self._executor, run, [job]))[0], None))
+ except Exception as exc:
+ outcomes.append((None, exc))
+ finally:
+ self._slots.release()
+
+ for (_, future), (result, exc) in zip(batch, outcomes):
+ if future.done():
+ continue
+ if exc is not None:
+ future.set_exception(exc)
+ else:
+ future.set_result(result)
+
+ def stats(self) -> Dict:
+ """请求与批次统计"""
+ return {
+ 'executor': self.executor,
+ 'requests': self.requests,
+ 'batches': self.batches,
+ 'max_batch': self.max_batch,
+ 'mean_batch': self.requests / self.batches if self.batches else 0.0,
+ 'retries': self.retries,
+ 'queued': self._queue.qsize() if self._queue is not None else 0
+ }
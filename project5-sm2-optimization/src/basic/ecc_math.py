@@ -6,23 +6,50 @@ SM2椭圆曲线基础数学运算模块
 """
 
 import random
-from typing import Tuple, Optional
+import sys
+from typing import Tuple, Optional, Dict, List, Iterator, NamedTuple, Sequence
+
+try:
+ from .field_math import mod_inverse, mod_inverse_secret, batch_mod_inverse
+except ImportError:
+ from field_math import mod_inverse, mod_inverse_secret, batch_mod_inverse
 
 class ECCPoint:
- """椭圆曲线上的点"""
+ """
+ 椭圆曲线上的点 (仿射坐标，不可变)
+
+ 坐标存放在__slots__中，没有per-instance的__dict__；
+ 无穷远点是单例ECCPoint.INFINITY，ECCPoint(is_infinity=True)总是返回它
+ """
+
+ __slots__ = ('x', 'y', 'is_infinity')
 
- def __init__(self, x: Optional[int] = None, y: Optional[int] = None, is_infinity: bool = False):
+ def __new__(cls, x: Optional[int] = None, y: Optional[int] = None, is_infinity: bool = False):
  """
- 初始化椭圆曲线点
+ 创建椭圆曲线点
 
  Args:
  x: x坐标
  y: y坐标
  is_infinity: 是否为无穷远点
  """
- self.x = x
- self.y = y
- self.is_infinity = is_infinity
+ if is_infinity and _INFINITY is not None:
+ return _INFINITY
+ point = object.__new__(cls)
+ _set_x(point, x)
+ _set_y(point, y)
+ _set_infinity(point, is_infinity)
+ return point
+
+ def __setattr__(self, name, value):
+ raise AttributeError("ECCPoint是不可变对象")
+
+ def __delattr__(self, name):
+ raise AttributeError("ECCPoint是不可变对象")
+
+ def __reduce__(self):
+ """pickle时按坐标重建 (无穷远点还原为单例)"""
+ return ECCPoint, (self.x, self.y, self.is_infinity)
 
  def __eq__(self, other) -> bool:
  """判断两点是否相等"""
@@ -37,17 +64,240 @@ class ECCPoint:
 
  return self.x == other.x and self.y == other.y
 
+ def __hash__(self) -> int:
+ return hash(None) if self.is_infinity else hash((self.x, self.y))
+
  def __str__(self) -> str:
  """点的字符串表示"""
  if self.is_infinity:
  return "Point(∞)"
  return f"Point({hex(self.x)}, {hex(self.y)})"
 
+# 绕过__setattr__直接写入槽位，只在ECCPoint.__new__中使用
+_set_x = ECCPoint.x.__set__
+_set_y = ECCPoint.y.__set__
+_set_infinity = ECCPoint.is_infinity.__set__
+
+_INFINITY = None
+_INFINITY = ECCPoint.INFINITY = ECCPoint(is_infinity=True)
+
+class JacobianPoint(NamedTuple):
+ """
+ 雅可比坐标系下的椭圆曲线点 (X:Y:Z)
+ 对应仿射坐标 (X/Z^2, Y/Z^3)，Z = 0 表示无穷远点
+
+ 标量乘法的内层循环直接在 (X, Y, Z) 整数三元组上运算 (见SM2Curve._double_xyz)，
+ 只在返回结果时包装为JacobianPoint；接受雅可比坐标点的方法也接受普通三元组
+ """
+
+ x: int
+ y: int
+ z: int = 1
+
+ def to_affine(self, curve: 'SM2Curve') -> ECCPoint:
+ """转换为仿射坐标 (只需一次模逆)"""
+ X, Y, Z = self
+ if Z == 0:
+ return ECCPoint.INFINITY
+
+ # 计算 Z^(-1), Z^(-2), Z^(-3)
+ z_inv = curve.mod_inverse(Z, curve.p)
+ z_inv_sq = (z_inv * z_inv) % curve.p
+ z_inv_cube = (z_inv_sq * z_inv) % curve.p
+
+ # 转换坐标: x = X/Z^2, y = Y/Z^3
+ x_affine = (X * z_inv_sq) % curve.p
+ y_affine = (Y * z_inv_cube) % curve.p
+
+ return ECCPoint(x_affine, y_affine)
+
+ def is_infinity(self) -> bool:
+ """判断是否为无穷远点"""
+ return self.z == 0
+
+# 雅可比坐标的无穷远点
+JACOBIAN_INFINITY = JacobianPoint(1, 1, 0)
+
+class FixedBaseTable:
+ """
+ 固定点的预计算表 (窗口法)，默认为基点G
+
+ table[i][j-1] = j * 2^(w*i) * B, 其中 1 <= j < 2^w。
+ 计算k*B时将k按w位分窗，每个非零窗口查表做一次点加，
+ 总计约 256/w 次点加，完全不需要倍点运算。
+ """
+
+ def __init__(self, curve: 'SM2Curve', window_size: int = 4, base: Optional[ECCPoint] = None):
+ """
+ 构建固定基点预计算表
+
+ Args:
+ curve: 用于构建表的椭圆曲线
+ window_size: 窗口大小w (1-8)，表中共有 ceil(256/w) * (2^w - 1) 个点
+ base: 固定点B (阶为n)，默认为基点G
+ """
+ if not 1 <= window_size <= 8:
+ raise ValueError("固定基点窗口大小必须在1-8之间")
+
+ self.window_size = window_size
+ self.window_mask = (1 << window_size) - 1
+ self.window_count = (curve.n.bit_length() + window_size - 1) // window_size
+ self.n = curve.n
+ self.base = base if base is not None else curve.G
+ self.table = self._build_table(curve)
+
+ def _build_table(self, curve: 'SM2Curve') -> List[List[ECCPoint]]:
+ """
+ 逐窗口计算 j * 2^(w*i) * B
+
+ 先在雅可比坐标下连续倍点得到各窗口的基点 2^(w*i) * G 并批量转换为仿射坐标，
+ 再用混合加法累加出每一行，整张表最后一起批量转换，总共只需两次模逆
+ """
+ double = curve._double_xyz
+ add_mixed = curve._add_mixed_xyz
+
+ X, Y, Z = curve._to_jacobian(self.base)
+ bases = [(X, Y, Z)]
+ for _ in range(self.window_count - 1):
+ for _ in range(self.window_size):
+ X, Y, Z = double(X, Y, Z)
+ bases.append((X, Y, Z))
+
+ points = []
+ for base in curve.batch_to_affine(bases):
+ x, y = base.x, base.y
+ acc = (x, y, 1)
+ points.append(acc)
+ for _ in range(self.window_mask - 1):
+ acc = add_mixed(acc[0], acc[1], acc[2], x, y)
+ points.append(acc)
+
+ points = curve.batch_to_affine(points)
+ row = self.window_mask
+ return [points[i * row:(i + 1) * row] for i in range(self.window_count)]
+
+ def window_points(self, k: int) -> Iterator[ECCPoint]:
+ """依次给出k*B分解后需要相加的表中点 (k先约化到[0, n))"""
+ k %= self.n
+ for row in self.table:
+ if k == 0:
+ break
+ digit = k & self.window_mask
+ if digit:
+ yield row[digit - 1]
+ k >>= self.window_size
+
+ def multiply(self, curve: 'SM2Curve', k: int) -> ECCPoint:
+ """
+ 使用预计算表计算 k*B
+ 表中点均为仿射坐标，在雅可比坐标下做混合加法累加，最后只求一次逆
+
+ Args:
+ curve: 执行点加法的椭圆曲线
+ k: 标量
+
+ Returns:
+ k*B
+ """
+ return self.multiply_jacobian(curve, k).to_affine(curve)
+
+ def multiply_jacobian(self, curve: 'SM2Curve', k: int) -> JacobianPoint:
+ """使用预计算表计算 k*B，结果保留为雅可比坐标 (供批量转换)"""
+ add_mixed = curve._add_mixed_xyz
+ X, Y, Z = JACOBIAN_INFINITY
+ for point in self.window_points(k):
+ X, Y, Z = add_mixed(X, Y, Z, point.x, point.y)
+ return JacobianPoint(X, Y, Z)
+
+ def size(self) -> int:
+ """表中预计算点的数量"""
+ return sum(len(row) for row in self.table)
+
+ def nbytes(self) -> int:
+ """表占用内存的估算值 (字节)，按第一个点的对象大小乘以点数"""
+ sample = self.table[0][0]
+ point_bytes = sys.getsizeof(sample) + sys.getsizeof(sample.x) + sys.getsizeof(sample.y)
+ if hasattr(sample, '__dict__'):
+ point_bytes += sys.getsizeof(sample.__dict__)
+ return self.size() * point_bytes + sum(sys.getsizeof(row) for row in self.table)
+
+# 固定基点表只与曲线参数和窗口大小有关，构建一次后由所有曲线/签名实例共享
+_fixed_base_tables: Dict[Tuple[int, int, int], FixedBaseTable] = {}
+
+def get_fixed_base_table(curve: 'SM2Curve', window_size: int = 4) -> FixedBaseTable:
+ """
+ 获取共享的固定基点预计算表，首次请求时构建
+
+ Args:
+ curve: 椭圆曲线
+ window_size: 窗口大小
+
+ Returns:
+ FixedBaseTable实例
+ """
+ key = (curve.gx, curve.gy, window_size)
+ table = _fixed_base_tables.get(key)
+ if table is None:
+ table = FixedBaseTable(curve, window_size)
+ _fixed_base_tables[key] = table
+ return table
+
+def wnaf_digits(k: int, width: int) -> List[int]:
+ """
+ 计算非负整数k的宽度为width的wNAF表示 (低位在前)
+
+ 每个非零位都是奇数且绝对值小于 2^(width-1)，
+ 任意width个相邻位中至多有一个非零位。
+ """
+ digits = []
+ modulus = 1 << width
+ half = modulus >> 1
+
+ while k > 0:
+ if k & 1:
+ digit = k & (modulus - 1)
+ if digit >= half:
+ digit -= modulus
+ k -= digit
+ else:
+ digit = 0
+ digits.append(digit)
+ k >>= 1
+
+ return digits
+
+# 变基点wNAF乘法各步骤的代价估算 (以模乘次数计，按CPython上实测的相对耗时)
+_WNAF_COST = {'double': 8, 'add': 18, 'mixed_add': 11, 'normalize': 7, 'inverse': 40}
+
+def wnaf_width(bits: int) -> int:
+ """
+ 按标量位数选择变基点wNAF的窗口宽度 (2-8)
+
+ 宽度w时奇数倍点表有 2^(w-2) 个点，需要1次倍点、2^(w-2)-1次点加
+ 和一次批量求逆；主循环约有 bits/(w+1) 次混合加法。取两者之和最小的w，
+ 256位标量时为4-5，很小的标量退化为w=2 (表中只有P本身，无需求逆)。
+ """
+ def cost(width: int) -> float:
+ adds = bits / (width + 1) * _WNAF_COST['mixed_add']
+ if width == 2:
+ return adds
+ count = (1 << (width - 2)) - 1
+ return (adds + _WNAF_COST['double'] + _WNAF_COST['inverse'] +
+ count * (_WNAF_COST['add'] + _WNAF_COST['normalize']))
+
+ return min(range(2, 9), key=cost)
+
 class SM2Curve:
  """SM2椭圆曲线参数和运算"""
 
- def __init__(self):
- """初始化SM2推荐曲线参数"""
+ def __init__(self, fixed_base_window: int = 4):
+ """
+ 初始化SM2推荐曲线参数
+
+ Args:
+ fixed_base_window: 基点乘法使用的固定基点表窗口大小 (1-8)，
+ 为0时退化为普通的二进制展开法
+ """
  # SM2推荐曲线参数 (GM/T 0003.2-2012)
  self.p = 0xFFFFFFFEFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF00000000FFFFFFFFFFFFFFFF
  self.a = 0xFFFFFFFEFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF00000000FFFFFFFFFFFFFFFC
@@ -61,29 +311,33 @@ class SM2Curve:
 
  # 预计算优化用的表
  self._precomputed_multiples = {}
+ self.fixed_base_window = fixed_base_window
+
+ # a = -3 时雅可比倍点可省去Z^4的计算
+ self._a_is_minus_3 = (self.a + 3) % self.p == 0
+
+ @property
+ def fixed_base_table(self) -> FixedBaseTable:
+ """基点G的固定基点预计算表 (首次使用时构建，所有实例共享)"""
+ return get_fixed_base_table(self, self.fixed_base_window)
+
+ def is_base_point(self, P: ECCPoint) -> bool:
+ """判断P是否为基点G"""
+ return not P.is_infinity and P.x == self.gx and P.y == self.gy
 
  def mod_inverse(self, a: int, m: int) -> int:
  """
- 计算模逆元 a^(-1) mod m
- 使用扩展欧几里得算法
+ 计算模逆元 a^(-1) mod m (公开值)
+ 使用field_math中实测最快的策略
  """
- if a < 0:
- a = (a % m + m) % m
+ return mod_inverse(a, m)
 
- # 扩展欧几里得算法
- def extended_gcd(a, b):
- if a == 0:
- return b, 0, 1
- gcd, x1, y1 = extended_gcd(b % a, a)
- x = y1 - (b // a) * x1
- y = x1
- return gcd, x, y
-
- gcd, x, _ = extended_gcd(a, m)
- if gcd != 1:
- raise ValueError("模逆元不存在")
-
- return (x % m + m) % m
+ def mod_inverse_secret(self, a: int, m: int) -> int:
+ """
+ 计算秘密值的模逆元 a^(-1) mod m (m为素数)
+ 使用乘法盲化，求逆耗时与a无关
+ """
+ return mod_inverse_secret(a, m)
 
  def point_double(self, P: ECCPoint) -> ECCPoint:
  """
@@ -146,10 +400,129 @@ class SM2Curve:
 
  return ECCPoint(x3, y3)
 
+ def _to_jacobian(self, P: ECCPoint) -> JacobianPoint:
+ """将仿射坐标转换为雅可比坐标"""
+ if P.is_infinity:
+ return JACOBIAN_INFINITY
+ return JacobianPoint(P.x, P.y, 1)
+
+ def point_double_jacobian(self, P: JacobianPoint) -> JacobianPoint:
+ """雅可比坐标下的点倍乘 (无模逆)"""
+ X1, Y1, Z1 = P
+ return JacobianPoint._make(self._double_xyz(X1, Y1, Z1))
+
+ def point_add_jacobian(self, P: JacobianPoint, Q: JacobianPoint) -> JacobianPoint:
+ """雅可比坐标下的点加法 (无模逆)"""
+ X1, Y1, Z1 = P
+ X2, Y2, Z2 = Q
+ return JacobianPoint._make(self._add_xyz(X1, Y1, Z1, X2, Y2, Z2))
+
+ def point_add_mixed(self, P: JacobianPoint, Q: ECCPoint) -> JacobianPoint:
+ """
+ 混合坐标点加法: 雅可比坐标点P + 仿射坐标点Q
+ Q的Z坐标为1，比一般雅可比加法少4次模乘
+ """
+ if Q.is_infinity:
+ return JacobianPoint._make(P)
+ X1, Y1, Z1 = P
+ return JacobianPoint._make(self._add_mixed_xyz(X1, Y1, Z1, Q.x, Q.y))
+
+ # 以下三个内核直接在整数上运算并返回 (X, Y, Z) 三元组，不创建点对象，
+ # 供标量乘法等内层循环使用；插桩统计按对应的point_*_jacobian操作计数
+
+ def _double_xyz(self, X1: int, Y1: int, Z1: int) -> Tuple[int, int, int]:
+ """
+ 雅可比倍点内核
+ SM2曲线 a = p - 3，M = 3*X^2 + a*Z^4 可化为 3*(X - Z^2)*(X + Z^2)
+ """
+ if Z1 == 0 or Y1 == 0:
+ return JACOBIAN_INFINITY
+
+ p = self.p
+ Z1_sq = (Z1 * Z1) % p
+ Y1_sq = (Y1 * Y1) % p
+ S = (4 * X1 * Y1_sq) % p
+
+ if self._a_is_minus_3:
+ M = (3 * (X1 - Z1_sq) * (X1 + Z1_sq)) % p
+ else:
+ M = (3 * X1 * X1 + self.a * Z1_sq * Z1_sq) % p
+
+ X3 = (M * M - 2 * S) % p
+ Y3 = (M * (S - X3) - 8 * Y1_sq * Y1_sq) % p
+ Z3 = (2 * Y1 * Z1) % p
+
+ return X3, Y3, Z3
+
+ def _add_xyz(self, X1: int, Y1: int, Z1: int, X2: int, Y2: int, Z2: int) -> Tuple[int, int, int]:
+ """雅可比加法内核"""
+ if Z1 == 0:
+ return X2, Y2, Z2
+ if Z2 == 0:
+ return X1, Y1, Z1
+
+ p = self.p
+ Z1_sq = (Z1 * Z1) % p
+ Z2_sq = (Z2 * Z2) % p
+
+ U1 = (X1 * Z2_sq) % p
+ U2 = (X2 * Z1_sq) % p
+
+ S1 = (Y1 * Z2 * Z2_sq) % p
+ S2 = (Y2 * Z1 * Z1_sq) % p
+
+ if U1 == U2:
+ if S1 == S2:
+ return self._double_xyz(X1, Y1, Z1)
+ return JACOBIAN_INFINITY
+
+ H = (U2 - U1) % p
+ R = (S2 - S1) % p
+
+ H_sq = (H * H) % p
+ H_cube = (H_sq * H) % p
+ V = (U1 * H_sq) % p
+
+ X3 = (R * R - H_cube - 2 * V) % p
+ Y3 = (R * (V - X3) - S1 * H_cube) % p
+ Z3 = (Z1 * Z2 * H) % p
+
+ return X3, Y3, Z3
+
+ def _add_mixed_xyz(self, X1: int, Y1: int, Z1: int, x2: int, y2: int) -> Tuple[int, int, int]:
+ """混合加法内核，(x2, y2) 为仿射坐标 (不能是无穷远点)"""
+ if Z1 == 0:
+ return x2, y2, 1
+
+ p = self.p
+ Z1_sq = (Z1 * Z1) % p
+
+ U2 = (x2 * Z1_sq) % p
+ S2 = (y2 * Z1 * Z1_sq) % p
+
+ if X1 == U2:
+ if Y1 == S2:
+ return self._double_xyz(X1, Y1, Z1)
+ return JACOBIAN_INFINITY
+
+ H = (U2 - X1) % p
+ R = (S2 - Y1) % p
+
+ H_sq = (H * H) % p
+ H_cube = (H_sq * H) % p
+ V = (X1 * H_sq) % p
+
+ X3 = (R * R - H_cube - 2 * V) % p
+ Y3 = (R * (V - X3) - Y1 * H_cube) % p
+ Z3 = (Z1 * H) % p
+
+ return X3, Y3, Z3
+
  def point_multiply(self, k: int, P: ECCPoint) -> ECCPoint:
  """
  椭圆曲线标量乘法: k*P
- 使用二进制展开法(Double-and-Add)
+ 基点G使用固定基点预计算表，其他点使用wNAF方法 (见point_multiply_wnaf)。
+ 中间计算全部在雅可比坐标下进行，只在返回前做一次模逆转换为仿射坐标。
 
  Args:
  k: 标量
@@ -158,25 +531,251 @@ class SM2Curve:
  Returns:
  k*P
  """
- if k == 0:
+ if k == 0 or P.is_infinity:
  return ECCPoint(is_infinity=True)
+ return self.point_multiply_jacobian(k, P).to_affine(self)
+
+ def point_multiply_jacobian(self, k: int, P: ECCPoint) -> JacobianPoint:
+ """标量乘法k*P，结果保留为雅可比坐标 (供batch_to_affine批量转换)"""
+ if k == 0 or P.is_infinity:
+ return JACOBIAN_INFINITY
+
+ if self.fixed_base_window and self.is_base_point(P):
+ return self.fixed_base_table.multiply_jacobian(self, k)
+
+ return self.point_multiply_wnaf_jacobian(k, P)
+
+ def point_multiply_wnaf(self, k: int, P: ECCPoint, width: Optional[int] = None) -> ECCPoint:
+ """
+ 变基点标量乘法 k*P (wNAF方法)
+
+ k转换为宽度w的wNAF表示，非零位约占 1/(w+1)，负数位直接加上对应奇数倍点的负点。
+ 奇数倍点表在雅可比坐标下计算后一次批量求逆转换为仿射坐标，
+ 主循环因此全部使用混合加法。
+
+ Args:
+ k: 标量
+ P: 椭圆曲线上的点
+ width: wNAF窗口宽度 (2-8)，为None时按k的位数由wnaf_width选择
+
+ Returns:
+ k*P
+ """
+ return self.point_multiply_wnaf_jacobian(k, P, width).to_affine(self)
+
+ def point_multiply_wnaf_jacobian(self, k: int, P: ECCPoint,
+ width: Optional[int] = None) -> JacobianPoint:
+ """wNAF标量乘法，结果保留为雅可比坐标"""
+ if k == 0 or P.is_infinity:
+ return JACOBIAN_INFINITY
 
  if k < 0:
  # 处理负数情况
  k = -k
  P = ECCPoint(P.x, (-P.y) % self.p)
 
- result = ECCPoint(is_infinity=True)
- addend = P
+ if width is None:
+ width = wnaf_width(k.bit_length())
+ elif not 2 <= width <= 8:
+ raise ValueError("wNAF窗口宽度必须在2-8之间")
 
- while k > 0:
- if k & 1:
- result = self.point_add(result, addend)
- addend = self.point_double(addend)
- k >>= 1
+ positives, negatives = self._wnaf_table(P, width)
+ digits = wnaf_digits(k, width)
+
+ double = self._double_xyz
+ add_mixed = self._add_mixed_xyz
+
+ # 最高位非零且为正，从它开始，每位倍点一次，非零位混合加上表中的点
+ top = positives[digits[-1] >> 1]
+ X, Y, Z = top.x, top.y, 1
+ for digit in reversed(digits[:-1]):
+ X, Y, Z = double(X, Y, Z)
+ if digit > 0:
+ Q = positives[digit >> 1]
+ X, Y, Z = add_mixed(X, Y, Z, Q.x, Q.y)
+ elif digit < 0:
+ Q = negatives[(-digit) >> 1]
+ X, Y, Z = add_mixed(X, Y, Z, Q.x, Q.y)
 
+ return JacobianPoint(X, Y, Z)
+
+ def batch_to_affine(self, points: Sequence[JacobianPoint]) -> List[ECCPoint]:
+ """
+ 批量将雅可比坐标点转换为仿射坐标
+
+ 所有Z坐标用Montgomery技巧共用一次模逆 (外加约3(n-1)次模乘)，
+ 之后每个点再做3M+1S的坐标换算；无穷远点 (Z = 0) 转换为仿射无穷远点
+
+ Args:
+ points: 雅可比坐标点 (或 (X, Y, Z) 三元组) 列表
+
+ Returns:
+ 与points一一对应的仿射坐标点列表
+ """
+ p = self.p
+ z_inverses = iter(self.batch_mod_inverse([P[2] for P in points if P[2] != 0], p))
+
+ result = []
+ for X, Y, Z in points:
+ if Z == 0:
+ result.append(ECCPoint.INFINITY)
+ continue
+ z_inv = next(z_inverses)
+ z_inv_sq = (z_inv * z_inv) % p
+ result.append(ECCPoint((X * z_inv_sq) % p, (Y * z_inv_sq * z_inv) % p))
  return result
 
+ def multiples(self, P: ECCPoint, count: int) -> List[ECCPoint]:
+ """
+ 计算 [P, 2P, ..., count*P] (仿射坐标)
+ 雅可比坐标下逐次混合加P，最后批量转换，只做一次模逆
+ """
+ if count <= 0:
+ return []
+ if P.is_infinity:
+ return [ECCPoint.INFINITY] * count
+
+ add_mixed = self._add_mixed_xyz
+ x, y = P.x, P.y
+ acc = (x, y, 1)
+ points = [acc]
+ for _ in range(count - 1):
+ acc = add_mixed(acc[0], acc[1], acc[2], x, y)
+ points.append(acc)
+ return self.batch_to_affine(points)
+
+ def fixed_double_multiply_jacobian(self, k1: int, k2: int, table: FixedBaseTable) -> JacobianPoint:
+ """
+ k1*G + k2*B，B为table的固定点 (如常用公钥)，结果保留为雅可比坐标
+ k2*B直接从table中累加，不需要倍点和建表
+ """
+ add_mixed = self._add_mixed_xyz
+ X, Y, Z = self.point_multiply_jacobian(k1, self.G)
+ for point in table.window_points(k2):
+ X, Y, Z = add_mixed(X, Y, Z, point.x, point.y)
+ return JacobianPoint(X, Y, Z)
+
+ def _odd_multiples_jacobian(self, P: ECCPoint, width: int) -> List[Tuple[int, int, int]]:
+ """计算 [P, 3P, 5P, ..., (2^(width-1)-1)P] (雅可比坐标三元组)"""
+ acc = (P.x, P.y, 1)
+ multiples = [acc]
+ if width == 2:
+ return multiples
+ add = self._add_xyz
+ X2, Y2, Z2 = self._double_xyz(P.x, P.y, 1)
+ for _ in range((1 << (width - 2)) - 1):
+ acc = add(acc[0], acc[1], acc[2], X2, Y2, Z2)
+ multiples.append(acc)
+ return multiples
+
+ def odd_multiples(self, P: ECCPoint, width: int) -> List[ECCPoint]:
+ """
+ 计算 [P, 3P, 5P, ..., (2^(width-1)-1)P] (仿射坐标)
+ 雅可比坐标下累加后一次批量求逆，width=2时表中只有P，不需要求逆
+ """
+ multiples = self._odd_multiples_jacobian(P, width)
+ return [P] + self.batch_to_affine(multiples[1:])
+
+ def _wnaf_table(self, P: ECCPoint, width: int) -> Tuple[List[ECCPoint], List[ECCPoint]]:
+ """wNAF乘法用的奇数倍点表及其负点表 (仿射坐标)"""
+ positives = self.odd_multiples(P, width)
+ negatives = [Q if Q.is_infinity else ECCPoint(Q.x, (-Q.y) % self.p) for Q in positives]
+ return positives, negatives
+
+ def batch_mod_inverse(self, values: List[int], m: int) -> List[int]:
+ """
+ Montgomery批量求逆: 只做一次模逆，外加约3(n-1)次模乘
+
+ Args:
+ values: 待求逆的元素列表 (均不能为0)
+ m: 模数
+
+ Returns:
+ 与values一一对应的逆元列表
+ """
+ return batch_mod_inverse(values, m, self.mod_inverse)
+
+ def double_scalar_multiply(self, k1: int, P1: ECCPoint, k2: int, P2: ECCPoint,
+ width: Optional[int] = None) -> ECCPoint:
+ """
+ 双标量乘法: k1*P1 + k2*P2 (Straus/Shamir交错法)
+
+ 两个标量都转换为wNAF表示，共用同一条倍点链；
+ 若其中一个点是基点G，则该部分直接从固定基点表中累加，不参与倍点。
+ 变基点的奇数倍点表批量求逆转换为仿射坐标，主循环全部使用混合加法。
+
+ Args:
+ k1: 第一个标量
+ P1: 第一个点
+ k2: 第二个标量
+ P2: 第二个点
+ width: 变基点部分的wNAF窗口宽度 (2-8)，为None时按标量位数由wnaf_width选择
+
+ Returns:
+ k1*P1 + k2*P2
+ """
+ return self.double_scalar_multiply_jacobian(k1, P1, k2, P2, width).to_affine(self)
+
+ def double_scalar_multiply_jacobian(self, k1: int, P1: ECCPoint, k2: int, P2: ECCPoint,
+ width: Optional[int] = None, tables: Optional[Dict] = None) -> JacobianPoint:
+ """
+ 双标量乘法，结果保留为雅可比坐标 (供批量运算统一求逆)
+
+ Args:
+ k1, P1, k2, P2, width: 同double_scalar_multiply
+ tables: 可选的奇数倍点表缓存，批量运算中同一个点只预计算一次
+
+ Returns:
+ k1*P1 + k2*P2 (雅可比坐标)
+ """
+ if width is not None and not 2 <= width <= 8:
+ raise ValueError("wNAF窗口宽度必须在2-8之间")
+
+ # SM2曲线余因子为1，曲线上的点的阶都整除n
+ base_scalar = 0
+ terms = []
+ for k, P in ((k1 % self.n, P1), (k2 % self.n, P2)):
+ if k == 0 or P.is_infinity:
+ continue
+ if self.fixed_base_window and self.is_base_point(P):
+ base_scalar = (base_scalar + k) % self.n
+ continue
+
+ term_width = width or wnaf_width(k.bit_length())
+ key = (P.x, P.y, term_width)
+ table = tables.get(key) if tables is not None else None
+ if table is None:
+ table = self._wnaf_table(P, term_width)
+ if tables is not None:
+ tables[key] = table
+ terms.append((wnaf_digits(k, term_width), table[0], table[1]))
+
+ double = self._double_xyz
+ add_mixed = self._add_mixed_xyz
+ X, Y, Z = JACOBIAN_INFINITY
+
+ # 交错处理各标量的wNAF位，倍点链只走一遍
+ length = max((len(digits) for digits, _, _ in terms), default=0)
+ for i in range(length - 1, -1, -1):
+ X, Y, Z = double(X, Y, Z)
+ for digits, multiples, negatives in terms:
+ if i >= len(digits):
+ continue
+ digit = digits[i]
+ if digit > 0:
+ Q = multiples[digit >> 1]
+ X, Y, Z = add_mixed(X, Y, Z, Q.x, Q.y)
+ elif digit < 0:
+ Q = negatives[(-digit) >> 1]
+ X, Y, Z = add_mixed(X, Y, Z, Q.x, Q.y)
+
+ # 基点部分: 表中已是 j * 2^(w*i) * G，直接混合加法累加
+ if base_scalar:
+ for point in self.fixed_base_table.window_points(base_scalar):
+ X, Y, Z = add_mixed(X, Y, Z, point.x, point.y)
+
+ return JacobianPoint(X, Y, Z)
+
  def is_point_on_curve(self, P: ECCPoint) -> bool:
  """
  验证点是否在椭圆曲线上
@@ -211,6 +810,21 @@ class SM2Curve:
 
  return private_key, public_key
 
+ def generate_keypairs(self, count: int) -> List[Tuple[int, ECCPoint]]:
+ """
+ 批量生成SM2密钥对
+ 各公钥在雅可比坐标下计算，最后用batch_to_affine统一转换，只做一次模逆
+
+ Args:
+ count: 密钥对数量
+
+ Returns:
+ [(private_key, public_key), ...]
+ """
+ private_keys = [random.randint(1, self.n - 1) for _ in range(count)]
+ points = [self.point_multiply_jacobian(d, self.G) for d in private_keys]
+ return list(zip(private_keys, self.batch_to_affine(points)))
+
  def compress_point(self, P: ECCPoint) -> bytes:
  """
  压缩椭圆曲线点
@@ -0,0 +1,239 @@
+"""
+有限域模逆运算
+所有曲线类 (SM2Curve及各优化版本、project6的P256Curve) 共用的模逆实现
+
+几种策略在CPython上的实测 (python field_math.py):
+- pow: 内置 pow(a, -1, m)，C实现的扩展欧几里得，最快
+- euclid: 迭代扩展欧几里得 (纯Python)，约慢2倍
+- binary: 二进制扩展欧几里得 (纯Python)，约慢5倍
+- fermat: a^(m-2) mod m，运算序列与a无关，但约慢6-7倍
+- blinded: 先乘随机数r再用pow求逆，a本身不进入变时算法，只比pow多两次模乘
+
+因此公开值 (坐标、Z坐标、验签中的中间量) 用mod_inverse (pow)，
+秘密值 (私钥相关的(1+d)、盲化因子) 用mod_inverse_secret (blinded)。
+
+模约化同样做了对比: SM2素数 p = 2^256 - 2^224 - 2^96 + 2^64 - 1 可以用
+Solinas方法把高位折叠回低位 (sm2_reduce)，但CPython中每次移位、加减都是
+一次解释器操作，512位乘积约需8轮折叠，实测比C实现的通用 x % p 慢约8倍。
+因此曲线类中的域运算仍直接使用 % p；a = -3 的倍点简化见
+SM2Curve.point_double_jacobian。P-256素数的Solinas约化 (p256_reduce) 结论相同。
+"""
+
+import secrets
+import timeit
+from typing import Callable, Dict, List, Optional
+
+def _normalize(a: int, m: int) -> int:
+ """规约到 [0, m)，0没有逆元"""
+ a %= m
+ if a == 0:
+ raise ValueError("模逆元不存在")
+ return a
+
+def inverse_pow(a: int, m: int) -> int:
+ """内置pow求逆"""
+ try:
+ return pow(_normalize(a, m), -1, m)
+ except ValueError:
+ raise ValueError("模逆元不存在") from None
+
+def inverse_euclid(a: int, m: int) -> int:
+ """迭代扩展欧几里得算法 (无递归)"""
+ r0, r1 = m, _normalize(a, m)
+ s0, s1 = 0, 1
+ while r1:
+ q = r0 // r1
+ r0, r1 = r1, r0 - q * r1
+ s0, s1 = s1, s0 - q * s1
+ if r0 != 1:
+ raise ValueError("模逆元不存在")
+ return s0 % m
+
+def inverse_binary(a: int, m: int) -> int:
+ """二进制扩展欧几里得算法 (m必须为奇数)"""
+ if m & 1 == 0:
+ raise ValueError("二进制求逆要求模数为奇数")
+ u, v = _normalize(a, m), m
+ x1, x2 = 1, 0
+ while u != 1 and v != 1:
+ if u == 0:
+ raise ValueError("模逆元不存在")
+ while u & 1 == 0:
+ u >>= 1
+ x1 = x1 >> 1 if x1 & 1 == 0 else (x1 + m) >> 1
+ while v & 1 == 0:
+ v >>= 1
+ x2 = x2 >> 1 if x2 & 1 == 0 else (x2 + m) >> 1
+ if u >= v:
+ u -= v
+ x1 -= x2
+ else:
+ v -= u
+ x2 -= x1
+ return (x1 if u == 1 else x2) % m
+
+def inverse_fermat(a: int, p: int) -> int:
+ """费马小定理求逆 a^(p-2) mod p (p必须为素数)"""
+ return pow(_normalize(a, p), p - 2, p)
+
+def inverse_blinded(a: int, m: int) -> int:
+ """
+ 乘法盲化求逆: a^(-1) = r * (a*r)^(-1)
+
+ 随机数r每次重新生成，变时的求逆算法只接触到a*r，
+ 其耗时与a无关 (m必须为素数，保证r可逆)
+ """
+ a = _normalize(a, m)
+ r = secrets.randbelow(m - 1) + 1
+ return r * pow(a * r % m, -1, m) % m
+
+# 全部策略，供基准测试和测试使用
+STRATEGIES: Dict[str, Callable[[int, int], int]] = {
+ 'pow': inverse_pow,
+ 'euclid': inverse_euclid,
+ 'binary': inverse_binary,
+ 'fermat': inverse_fermat,
+ 'blinded': inverse_blinded,
+}
+
+# 各调用场景使用的策略
+mod_inverse = inverse_pow
+mod_inverse_secret = inverse_blinded
+
+# SM2推荐曲线的素数 p = 2^256 - 2^224 - 2^96 + 2^64 - 1
+SM2_P = 0xFFFFFFFEFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF00000000FFFFFFFFFFFFFFFF
+_MASK_256 = (1 << 256) - 1
+
+def sm2_reduce(x: int) -> int:
+ """
+ SM2素数的Solinas约化 x mod p (x为非负整数，如两个域元素的乘积)
+
+ 由 2^256 ≡ 2^224 + 2^96 - 2^64 + 1 (mod p)，反复把x的高位折叠到低256位，
+ 每轮约缩短32位；x < 2^256 < 2p后至多再减一次p
+ """
+ while x >> 256:
+ high = x >> 256
+ x = (x & _MASK_256) + (high << 224) + (high << 96) - (high << 64) + high
+ return x - SM2_P if x >= SM2_P else x
+
+# NIST P-256的素数 p = 2^256 - 2^224 + 2^192 + 2^96 - 1
+P256_P = 0xffffffff00000001000000000000000000000000ffffffffffffffffffffffff
+
+def p256_reduce(x: int) -> int:
+ """
+ P-256素数的Solinas约化 x mod p (x为非负整数)
+
+ 由 2^256 ≡ 2^224 - 2^192 - 2^96 + 1 (mod p) 折叠高位，折叠结果始终为正；
+ x < 2^256 < 2p后至多再减一次p
+ """
+ while x >> 256:
+ high = x >> 256
+ x = (x & _MASK_256) + (high << 224) - (high << 192) - (high << 96) + high
+ return x - P256_P if x >= P256_P else x
+
+# 模约化方式，供基准测试和测试使用
+REDUCTIONS: Dict[str, Callable[[int], int]] = {
+ 'generic': lambda x: x % SM2_P,
+ 'solinas': sm2_reduce,
+}
+
+P256_REDUCTIONS: Dict[str, Callable[[int], int]] = {
+ 'generic': lambda x: x % P256_P,
+ 'solinas': p256_reduce,
+}
+
+def batch_mod_inverse(values: List[int], m: int,
+ inverse: Callable[[int, int], int] = mod_inverse) -> List[int]:
+ """
+ Montgomery批量求逆: 只做一次模逆，外加约3(n-1)次模乘
+
+ Args:
+ values: 待求逆的元素列表 (均不能为0)
+ m: 模数
+ inverse: 单次求逆函数
+
+ Returns:
+ 与values一一对应的逆元列表
+ """
+ if not values:
+ return []
+
+ # 前缀积 prefix[i] = values[0] * ... * values[i]
+ prefix = []
+ acc = 1
+ for value in values:
+ acc = (acc * value) % m
+ prefix.append(acc)
+
+ inv = inverse(acc, m)
+
+ # 从后往前剥离: values[i]^(-1) = prefix[i-1] * (values[0]...values[i])^(-1)
+ inverses = [0] * len(values)
+ for i in range(len(values) - 1, 0, -1):
+ inverses[i] = (inv * prefix[i - 1]) % m
+ inv = (inv * values[i]) % m
+ inverses[0] = inv
+
+ return inverses
+
+def benchmark_inversion(modulus: int, samples: int = 200, repeat: int = 3,
+ strategies: Optional[List[str]] = None) -> Dict[str, float]:
+ """
+ 模逆策略的微基准测试
+
+ Args:
+ modulus: 素数模数
+ samples: 随机元素个数
+ repeat: 重复次数 (取最快的一次)
+ strategies: 参与测试的策略，默认全部
+
+ Returns:
+ {策略名: 每次求逆的平均耗时(微秒)}
+ """
+ values = [secrets.randbelow(modulus - 1) + 1 for _ in range(samples)]
+ results = {}
+ for name in strategies or STRATEGIES:
+ func = STRATEGIES[name]
+ best = min(timeit.repeat(lambda: [func(v, modulus) for v in values], number=1, repeat=repeat))
+ results[name] = best / samples * 1e6
+ return results
+
+def benchmark_reduction(samples: int = 1000, repeat: int = 5, modulus: int = SM2_P,
+ reductions: Optional[Dict[str, Callable[[int], int]]] = None) -> Dict[str, float]:
+ """
+ 素数模约化的微基准测试 (输入为两个随机域元素的乘积)
+
+ Args:
+ samples: 随机乘积个数
+ repeat: 重复次数 (取最快的一次)
+ modulus: 素数，默认为SM2的p
+ reductions: 约化方式，默认为REDUCTIONS (SM2)
+
+ Returns:
+ {约化方式: 每次约化的平均耗时(纳秒)}
+ """
+ products = [secrets.randbelow(modulus) * secrets.randbelow(modulus) for _ in range(samples)]
+ results = {}
+ for name, reduce in (reductions or REDUCTIONS).items():
+ best = min(timeit.repeat(lambda: [reduce(x) for x in products], number=1, repeat=repeat))
+ results[name] = best / samples * 1e9
+ return results
+
+if __name__ == "__main__":
+ moduli = {
+ 'SM2 p': 0xFFFFFFFEFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF00000000FFFFFFFFFFFFFFFF,
+ 'SM2 n': 0xFFFFFFFEFFFFFFFFFFFFFFFFFFFFFFFF7203DF6B21C6052B53BBF40939D54123,
+ 'P-256 p': 0xffffffff00000001000000000000000000000000ffffffffffffffffffffffff,
+ 'P-256 n': 0xffffffff00000000ffffffffffffffffbce6faada7179e84f3b9cac2fc632551,
+ }
+ print("=== 模逆策略微基准测试 (微秒/次) ===")
+ print(f"{'模数':<10}" + "".join(f"{name:>10}" for name in STRATEGIES))
+ for label, modulus in moduli.items():
+ results = benchmark_inversion(modulus)
+ print(f"{label:<10}" + "".join(f"{results[name]:>10.2f}" for name in STRATEGIES))
+
+ print("\n=== 素数模约化微基准测试 (纳秒/次) ===")
+ print(f"{'素数':<10}" + "".join(f"{name:>10}" for name in REDUCTIONS))
+ for label, modulus, reductions in (('SM2 p', SM2_P, REDUCTIONS), ('P-256 p', P256_P, P256_REDUCTIONS)):
+ results = benchmark_reduction(modulus=modulus, reductions=reductions)
+ print(f"{label:<10}" + "".join(f"{results[name]:>10.0f}" for name in reductions))
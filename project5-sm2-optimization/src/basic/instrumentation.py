@@ -0,0 +1,232 @@
+"""
+SM2曲线运算的插桩统计 (按需启用)
+
+在 with instrument(obj) 块内，为曲线对象 (SM2Curve及其各优化子类) 或
+签名对象 (带curve属性) 的实例临时安装计数/计时包装，统计点运算、
+模逆等基本操作的次数，并按高层调用 (签名、验签、密钥生成等) 记录耗时。
+离开with块后包装全部移除，未启用时没有任何额外开销。
+
+模乘(M)/模平方(S)次数按ecc_math中各点运算公式的代价估算，
+模逆(I)次数为实际调用次数。JacobianPoint.to_affine中的3M+1S不计入。
+插桩不是线程安全的，多进程批量验证的子进程中的运算也不会被统计。
+"""
+
+import bisect
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence
+
+# 各基本操作的域运算代价 (M, S)
+_FIELD_COST = {
+ 'point_double': (2, 2),
+ 'point_add': (2, 1),
+ 'point_double_jacobian': (4, 4),
+ 'point_add_jacobian': (12, 4),
+ 'point_add_mixed': (8, 3),
+}
+
+# 曲线上统计次数的基本操作
+CURVE_PRIMITIVES = ('mod_inverse', 'mod_inverse_secret', 'batch_mod_inverse',
+ 'point_double', 'point_add',
+ 'point_double_jacobian', 'point_add_jacobian', 'point_add_mixed')
+
+# 雅可比点运算的整数内核 (标量乘法循环直接调用) 及其计入的操作名；
+# 曲线提供内核时计数装在内核上，同名的point_*_jacobian只是内核的包装，不再重复计数
+_KERNELS = {
+ '_double_xyz': 'point_double_jacobian',
+ '_add_xyz': 'point_add_jacobian',
+ '_add_mixed_xyz': 'point_add_mixed',
+}
+
+# 曲线上记录耗时的高层调用
+CURVE_CALLS = ('point_multiply', 'double_scalar_multiply', 'generate_keypair', 'generate_keypairs')
+
+# 签名对象上记录耗时的高层调用
+SIGNATURE_CALLS = ('generate_keypair', 'generate_keypairs', 'sign', 'verify', 'sign_digest', 'verify_digest', 'verify_batch')
+
+# 耗时直方图的默认分桶上界 (秒)
+DEFAULT_BUCKETS = (1e-4, 3e-4, 1e-3, 3e-3, 1e-2, 3e-2, 1e-1, 3e-1, 1.0)
+
+class OpCounter:
+ """基本操作计数和高层调用耗时"""
+
+ def __init__(self):
+ self.ops: Counter = Counter()
+ self.calls: Dict[str, Counter] = {}
+ self.timings: Dict[str, List[float]] = {}
+ self._active: Optional[str] = None
+ self._a_is_minus_3 = True
+
+ def reset(self):
+ """清空所有统计"""
+ self.ops.clear()
+ self.calls.clear()
+ self.timings.clear()
+
+ def _count(self, name: str, amount: int = 1):
+ """记录一次基本操作，同时计入当前最外层的高层调用"""
+ self.ops[name] += amount
+ if self._active is not None:
+ self.calls[self._active][name] += amount
+
+ def field_ops(self, name: Optional[str] = None) -> Dict[str, int]:
+ """
+ 估算的域运算次数
+
+ Args:
+ name: 高层调用名称，为None时统计全部
+
+ Returns:
+ {'M': 模乘, 'S': 模平方, 'I': 模逆}
+ """
+ ops = self.ops if name is None else self.calls.get(name, Counter())
+ mul = sqr = 0
+ for op, count in ops.items():
+ cost = _FIELD_COST.get(op)
+ if op == 'point_double_jacobian' and not self._a_is_minus_3:
+ cost = (4, 6)
+ if cost:
+ mul += cost[0] * count
+ sqr += cost[1] * count
+ # 批量求逆每个元素约3次模乘，其中的一次模逆已计入mod_inverse
+ mul += 3 * ops.get('batch_mod_inverse_items', 0)
+ return {'M': mul, 'S': sqr, 'I': ops.get('mod_inverse', 0) + ops.get('mod_inverse_secret', 0)}
+
+ def timing_summary(self, name: str) -> Dict[str, float]:
+ """某个高层调用的耗时统计 (秒)"""
+ samples = sorted(self.timings.get(name, []))
+ if not samples:
+ return {'count': 0}
+ return {
+ 'count': len(samples),
+ 'total': sum(samples),
+ 'mean': sum(samples) / len(samples),
+ 'min': samples[0],
+ 'p50': samples[len(samples) // 2],
+ 'p95': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+ 'max': samples[-1]
+ }
+
+ def histogram(self, name: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> List[int]:
+ """
+ 耗时直方图
+
+ Args:
+ name: 高层调用名称
+ buckets: 递增的分桶上界 (秒)
+
+ Returns:
+ 各分桶的次数，比最后一个上界还大的样本计入末尾多出的一个桶
+ """
+ counts = [0] * (len(buckets) + 1)
+ for sample in self.timings.get(name, []):
+ counts[bisect.bisect_left(buckets, sample)] += 1
+ return counts
+
+ def report(self) -> str:
+ """生成文本报告"""
+ lines = ["基本操作次数:"]
+ for op, count in sorted(self.ops.items()):
+ lines.append(f" {op}: {count}")
+ field = self.field_ops()
+ lines.append(f" 估算域运算: {field['M']}M + {field['S']}S + {field['I']}I")
+
+ for name in sorted(self.timings):
+ summary = self.timing_summary(name)
+ field = self.field_ops(name)
+ count = summary['count']
+ lines.append(f"{name}: {count}次, 平均{summary['mean'] * 1000:.3f}ms, "
+ f"p95 {summary['p95'] * 1000:.3f}ms")
+ lines.append(f" 每次: {field['M'] / count:.0f}M + {field['S'] / count:.0f}S + "
+ f"{field['I'] / count:.1f}I")
+ return "\n".join(lines)
+
+def _counted(counter: OpCounter, name: str, func):
+ """包装基本操作: 计数后调用原函数"""
+ def wrapper(*args, **kwargs):
+ counter._count(name)
+ return func(*args, **kwargs)
+ return wrapper
+
+def _counted_batch_inverse(counter: OpCounter, func):
+ """包装批量求逆: 同时记录元素个数"""
+ def wrapper(values, *args, **kwargs):
+ counter._count('batch_mod_inverse')
+ counter._count('batch_mod_inverse_items', max(len(values) - 1, 0))
+ return func(values, *args, **kwargs)
+ return wrapper
+
+def _timed(counter: OpCounter, name: str, func):
+ """包装高层调用: 最外层调用记录耗时，内层调用只计数"""
+ def wrapper(*args, **kwargs):
+ if counter._active is not None:
+ counter._count(name)
+ return func(*args, **kwargs)
+
+ counter._active = name
+ counter.calls.setdefault(name, Counter())
+ start = time.perf_counter()
+ try:
+ return func(*args, **kwargs)
+ finally:
+ counter.timings.setdefault(name, []).append(time.perf_counter() - start)
+ counter._active = None
+ return wrapper
+
+def _patch(obj, name: str, wrapper_factory, installed: List):
+ """在实例上用包装函数遮蔽同名方法"""
+ method = getattr(obj, name, None)
+ if method is None or name in vars(obj):
+ return
+ setattr(obj, name, wrapper_factory(method))
+ installed.append((obj, name))
+
+@contextmanager
+def instrument(*targets, counter: Optional[OpCounter] = None) -> Iterator[OpCounter]:
+ """
+ 在with块内对曲线或签名对象插桩
+
+ Args:
+ targets: 曲线对象或签名对象 (签名对象的curve属性同时被插桩)
+ counter: 累积统计用的OpCounter，默认新建
+
+ Yields:
+ OpCounter
+
+ Example:
+ with instrument(sm2) as counter:
+ sm2.sign(message, private_key, public_key)
+ print(counter.report())
+ """
+ counter = counter if counter is not None else OpCounter()
+ installed = []
+
+ curves = []
+ for target in targets:
+ curve = getattr(target, 'curve', None)
+ if curve is not None:
+ for name in SIGNATURE_CALLS:
+ _patch(target, name, lambda f, n=name: _timed(counter, n, f), installed)
+ curves.append(curve)
+ else:
+ curves.append(target)
+
+ for curve in curves:
+ counter._a_is_minus_3 = getattr(curve, '_a_is_minus_3', True)
+ kernels = {op: kernel for kernel, op in _KERNELS.items() if hasattr(curve, kernel)}
+ for name in CURVE_PRIMITIVES:
+ if name in kernels:
+ _patch(curve, kernels[name], lambda f, n=name: _counted(counter, n, f), installed)
+ elif name == 'batch_mod_inverse':
+ _patch(curve, name, lambda f: _counted_batch_inverse(counter, f), installed)
+ else:
+ _patch(curve, name, lambda f, n=name: _counted(counter, n, f), installed)
+ for name in CURVE_CALLS:
+ _patch(curve, name, lambda f, n=name: _timed(counter, n, f), installed)
+
+ try:
+ yield counter
+ finally:
+ for obj, name in reversed(installed):
+ delattr(obj, name)
@@ -0,0 +1,207 @@
+"""
+SM2签名随机数预生成池 (按需启用)
+
+签名中与消息无关的部分是随机数k和 [k]G 的x坐标x1，可以提前算好。
+NoncePool由后台线程预先生成 (k, x1)，签名时只需计算 e = H(ZA || M)、
+r = (e + x1) mod n 和 s 的几次模乘，[k]G 不再出现在请求路径上。
+
+- 池中最多depth个随机数，数量降到low_watermark以下时唤醒后台线程补满
+- 每批batch_size个点在雅可比坐标下计算，共用一次批量求逆
+- 每个随机数只会被取出一次: 取出即从池中删除，不会放回；
+ fork后的子进程丢弃继承来的全部随机数，避免父子进程重复使用同一个k。
+ 这一步在os.register_at_fork的子进程回调中完成，并换用新的锁: fork时后台线程
+ 可能正持有锁，子进程中没有这个线程，继承来的锁永远不会被释放
+- 池为空时同步生成一个随机数，不会阻塞等待后台线程
+
+后台线程与请求路径共享GIL，池的作用是把[k]G挪到请求之间的空闲时间，
+而不是增加总吞吐量。
+"""
+
+import os
+import secrets
+import threading
+import weakref
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+try:
+ from .ecc_math import SM2Curve
+except ImportError:
+ from ecc_math import SM2Curve
+
+# 当前进程中存活的随机数池，fork后在子进程中逐个重置
+_live_pools: 'weakref.WeakSet[NoncePool]' = weakref.WeakSet()
+
+def _reset_pools_after_fork():
+ for pool in list(_live_pools):
+ pool._reset_after_fork()
+
+if hasattr(os, 'register_at_fork'):
+ os.register_at_fork(after_in_child=_reset_pools_after_fork)
+
+class NoncePool:
+ """后台填充的签名随机数池"""
+
+ def __init__(self, depth: int = 256, low_watermark: Optional[int] = None,
+ batch_size: int = 32, curve: Optional[SM2Curve] = None, start: bool = True):
+ """
+ Args:
+ depth: 池中最多保存的随机数个数
+ low_watermark: 数量不超过该值时开始补充，默认为depth的1/4
+ batch_size: 后台线程每批生成的个数 (每批一次模逆)
+ curve: 计算[k]G用的曲线，默认新建SM2Curve
+ start: 是否立即启动后台线程
+ """
+ if depth < 1:
+ raise ValueError("随机数池深度必须为正数")
+ if low_watermark is None:
+ low_watermark = depth // 4
+ if not 0 <= low_watermark < depth:
+ raise ValueError("低水位必须在 [0, depth) 范围内")
+ if batch_size < 1:
+ raise ValueError("批大小必须为正数")
+
+ self.curve = curve if curve is not None else SM2Curve()
+ self.depth = depth
+ self.low_watermark = low_watermark
+ self.batch_size = batch_size
+
+ self.generated = 0
+ self.taken = 0
+ self.misses = 0
+ self.refills = 0
+ self.discarded = 0
+
+ self._pool: Deque[Tuple[int, int]] = deque()
+ self._cond = threading.Condition()
+ self._closed = False
+ self._thread: Optional[threading.Thread] = None
+ self._pid = os.getpid()
+ _live_pools.add(self)
+ if start:
+ self.start()
+
+ def start(self):
+ """启动后台填充线程 (已启动时不做任何事)"""
+ with self._cond:
+ if self._closed:
+ raise RuntimeError("随机数池已关闭")
+ if self._thread is None or not self._thread.is_alive():
+ self._thread = threading.Thread(target=self._run, name="sm2-nonce-pool", daemon=True)
+ self._thread.start()
+
+ def close(self):
+ """停止后台线程并丢弃池中剩余的随机数"""
+ with self._cond:
+ self._closed = True
+ self.discarded += len(self._pool)
+ self._pool.clear()
+ self._cond.notify_all()
+ thread = self._thread
+ if thread is not None and thread is not threading.current_thread():
+ thread.join()
+
+ def __enter__(self) -> 'NoncePool':
+ return self
+
+ def __exit__(self, *exc_info):
+ self.close()
+
+ def _generate(self, count: int) -> List[Tuple[int, int]]:
+ """生成count个 (k, x1)，所有[k]G共用一次批量求逆"""
+ curve = self.curve
+ nonces = [secrets.randbelow(curve.n - 1) + 1 for _ in range(count)]
+ points = curve.batch_to_affine([curve.point_multiply_jacobian(k, curve.G) for k in nonces])
+ return [(k, point.x) for k, point in zip(nonces, points)]
+
+ def _run(self):
+ """后台线程: 数量降到低水位以下时补满到depth"""
+ while True:
+ with self._cond:
+ while not self._closed and len(self._pool) > self.low_watermark:
+ self._cond.wait()
+ if self._closed:
+ return
+ self.refills += 1
+
+ while True:
+ with self._cond:
+ need = self.depth - len(self._pool)
+ if self._closed or need <= 0:
+ break
+ nonces = self._generate(min(need, self.batch_size))
+ with self._cond:
+ if self._closed:
+ break
+ self._pool.extend(nonces)
+ self.generated += len(nonces)
+ self._cond.notify_all()
+
+ def _discard_inherited(self):
+ """丢弃从父进程继承来的随机数，下次take时重启后台线程"""
+ self._pid = os.getpid()
+ self.discarded += len(self._pool)
+ self._pool.clear()
+ self._thread = None
+
+ def _reset_after_fork(self):
+ """
+ fork后在子进程中调用 (此时子进程只有一个线程)
+
+ 父进程的后台线程可能正持有锁 (补充随机数时)，子进程中该线程不存在，
+ 继承来的锁永远不会被释放，因此直接换一个新的条件变量
+ """
+ self._cond = threading.Condition()
+ self._discard_inherited()
+
+ def _check_fork(self):
+ """不支持register_at_fork时的后备检测: pid变化说明在fork后的子进程中 (调用方持有锁)"""
+ if os.getpid() != self._pid:
+ self._discard_inherited()
+
+ def take(self) -> Tuple[int, int]:
+ """
+ 取出一个随机数
+
+ Returns:
+ (k, x1)，x1为[k]G的x坐标；池为空时同步生成
+ """
+ with self._cond:
+ self._check_fork()
+ restart = self._thread is None and not self._closed
+ if self._pool:
+ nonce = self._pool.popleft()
+ self.taken += 1
+ if len(self._pool) <= self.low_watermark:
+ self._cond.notify_all()
+ else:
+ nonce = None
+ self.misses += 1
+ self._cond.notify_all()
+
+ if restart:
+ self.start()
+ if nonce is None:
+ nonce = self._generate(1)[0]
+ return nonce
+
+ def wait_full(self, timeout: Optional[float] = None) -> bool:
+ """等待池被填满，返回是否在超时前填满"""
+ with self._cond:
+ return self._cond.wait_for(lambda: len(self._pool) >= self.depth or self._closed, timeout)
+
+ def __len__(self) -> int:
+ return len(self._pool)
+
+ def stats(self) -> Dict:
+ """随机数池统计信息"""
+ return {
+ 'size': len(self._pool),
+ 'depth': self.depth,
+ 'low_watermark': self.low_watermark,
+ 'generated': self.generated,
+ 'taken': self.taken,
+ 'misses': self.misses,
+ 'refills': self.refills,
+ 'discarded': self.discarded
+ }
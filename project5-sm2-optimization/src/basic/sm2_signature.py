@@ -7,27 +7,320 @@ SM2数字签名算法基础实现
 
 import random
 import hashlib
-from typing import Tuple, Union, Optional
+import threading
+from collections import OrderedDict
+from typing import Tuple, Union, Optional, List, Dict, Sequence, Iterable
 
 # 修复导入问题
 try:
- from .ecc_math import SM2Curve, ECCPoint
+ from .ecc_math import SM2Curve, ECCPoint, FixedBaseTable
  from .sm3_hash import sm3_hash
+ from .nonce_pool import NoncePool
 except ImportError:
- from ecc_math import SM2Curve, ECCPoint
+ from ecc_math import SM2Curve, ECCPoint, FixedBaseTable
  from sm3_hash import sm3_hash
+ from nonce_pool import NoncePool
+
+# 批量验证条目: (消息, (r, s), 公钥, 用户标识或None)
+VerifyItem = Tuple[Union[bytes, str], Tuple[int, int], ECCPoint, Optional[str]]
+
+class ZACache:
+ """
+ ZA值的LRU缓存
+
+ ZA = H(ENTL || ID || a || b || xG || yG || xA || yA) 只与公钥和用户标识有关，
+ 同一签名者反复签名/验签时无需每次重新计算。
+ """
+
+ def __init__(self, capacity: int = 1024):
+ """
+ Args:
+ capacity: 最多缓存的条目数，为0时不缓存
+ """
+ if capacity < 0:
+ raise ValueError("ZA缓存容量不能为负数")
+
+ self.capacity = capacity
+ self.hits = 0
+ self.misses = 0
+ self._entries: OrderedDict = OrderedDict()
+ self._lock = threading.Lock()
+
+ def get(self, key: Tuple[int, int, str]) -> Optional[bytes]:
+ """查找ZA值，命中时移到最近使用的位置"""
+ with self._lock:
+ za = self._entries.get(key)
+ if za is None:
+ self.misses += 1
+ return None
+ self._entries.move_to_end(key)
+ self.hits += 1
+ return za
+
+ def put(self, key: Tuple[int, int, str], za: bytes):
+ """写入ZA值，超出容量时淘汰最久未使用的条目"""
+ if self.capacity == 0:
+ return
+ with self._lock:
+ self._entries[key] = za
+ self._entries.move_to_end(key)
+ while len(self._entries) > self.capacity:
+ self._entries.popitem(last=False)
+
+ def clear(self):
+ """清空缓存和统计"""
+ with self._lock:
+ self._entries.clear()
+ self.hits = 0
+ self.misses = 0
+
+ def __len__(self) -> int:
+ return len(self._entries)
+
+ def __contains__(self, key) -> bool:
+ return key in self._entries
+
+ def stats(self) -> Dict:
+ """缓存统计信息"""
+ total = self.hits + self.misses
+ return {
+ 'size': len(self._entries),
+ 'capacity': self.capacity,
+ 'hits': self.hits,
+ 'misses': self.misses,
+ 'hit_rate': self.hits / total if total else 0.0
+ }
+
+class _KeyEntry:
+ """PublicKeyCache中一个公钥的预计算数据"""
+
+ def __init__(self, table: FixedBaseTable, uses: int):
+ self.table = table
+ self.za: Dict[str, bytes] = {}
+ self.uses = uses
+ self.nbytes = table.nbytes()
+
+class PublicKeyCache:
+ """
+ 常用验签公钥的预计算缓存 (按需启用)
+
+ 为反复出现的公钥PA构建与基点G相同形式的固定点预计算表，
+ 验签中的 [t]PA 只需约 256/w 次混合加法，不再需要倍点；同时保存该公钥的ZA值。
+ 建表约相当于三次验签的开销，因此公钥出现min_uses次后才建表。
+ 所有表的估算内存不超过memory_budget，超出时按policy淘汰:
+ 'lru' 淘汰最久未使用的公钥，'lfu' 淘汰使用次数最少的公钥 (次数相同时淘汰较久未使用的)。
+
+ 'lfu' 在内存已满时先做准入判断: 新公钥的出现次数不少于将被淘汰的公钥时才建表，
+ 否则继续计数，避免刚建好的表立即被淘汰、下次出现又重新建表。每经过decay_interval次
+ 查找，所有使用次数和出现次数减半，过去常用但不再出现的公钥最终可以被淘汰。
+ """
+
+ POLICIES = ('lru', 'lfu')
+
+ def __init__(self, memory_budget: int = 64 * 1024 * 1024, window_size: int = 4,
+ min_uses: int = 2, policy: str = 'lru', track_limit: int = 4096, decay_interval: int = 1024):
+ """
+ Args:
+ memory_budget: 预计算表的内存上限 (字节)，w=4时每个公钥约260KB，为0时不建表
+ window_size: 公钥预计算表的窗口大小 (1-8)
+ min_uses: 公钥出现多少次后建表
+ policy: 淘汰策略，'lru' 或 'lfu'
+ track_limit: 最多记录多少个尚未建表的公钥的出现次数
+ decay_interval: 'lfu' 每经过多少次查找将计数减半
+ """
+ if memory_budget < 0:
+ raise ValueError("公钥缓存内存上限不能为负数")
+ if not 1 <= window_size <= 8:
+ raise ValueError("固定基点窗口大小必须在1-8之间")
+ if policy not in self.POLICIES:
+ raise ValueError(f"未知的淘汰策略: {policy}")
+ if decay_interval < 1:
+ raise ValueError("计数衰减间隔必须为正数")
+
+ self.memory_budget = memory_budget
+ self.window_size = window_size
+ self.min_uses = max(min_uses, 1)
+ self.policy = policy
+ self.track_limit = track_limit
+ self.decay_interval = decay_interval
+
+ self.hits = 0
+ self.misses = 0
+ self.builds = 0
+ self.evictions = 0
+ self._bytes = 0
+ self._entries: OrderedDict = OrderedDict() # (x, y) -> _KeyEntry
+ self._seen: OrderedDict = OrderedDict() # 尚未建表的公钥 -> 出现次数
+ self._lookups = 0 # 上次计数衰减以来的查找次数
+ self._lock = threading.Lock()
+
+ def lookup(self, curve: SM2Curve, public_key: ECCPoint) -> Optional[_KeyEntry]:
+ """
+ 查找公钥的预计算数据并记录一次使用，出现次数达到min_uses时建表
+
+ Returns:
+ 预计算数据，公钥尚未建表时返回None
+ """
+ if public_key.is_infinity:
+ return None
+
+ key = (public_key.x, public_key.y)
+ with self._lock:
+ if self.policy == 'lfu':
+ self._lookups += 1
+ if self._lookups >= self.decay_interval:
+ self._decay()
+
+ entry = self._entries.get(key)
+ if entry is not None:
+ entry.uses += 1
+ self._entries.move_to_end(key)
+ self.hits += 1
+ return entry
+
+ self.misses += 1
+ uses = self._seen.pop(key, 0) + 1
+ if uses < self.min_uses or self.memory_budget == 0 or not self._admit(uses):
+ self._seen[key] = uses
+ while len(self._seen) > self.track_limit:
+ self._seen.popitem(last=False)
+ return None
+
+ # 建表耗时较长，在锁外进行
+ entry = _KeyEntry(FixedBaseTable(curve, self.window_size, public_key), uses)
+
+ with self._lock:
+ if key in self._entries:
+ return self._entries[key]
+ self.builds += 1
+ # 单张表超出内存上限时只用于本次验签
+ if entry.nbytes <= self.memory_budget:
+ self._entries[key] = entry
+ self._bytes += entry.nbytes
+ self._evict(keep=key)
+ return entry
+
+ def peek(self, public_key: ECCPoint) -> Optional[_KeyEntry]:
+ """查找公钥的预计算数据，不记录使用也不建表"""
+ return self._entries.get((public_key.x, public_key.y))
+
+ def _lfu_victim(self, keep=None):
+ """使用次数最少的公钥，次数相同时取较久未使用的 (调用方持有锁)"""
+ candidates = (key for key in self._entries if key != keep)
+ return min(candidates, key=lambda key: self._entries[key].uses, default=None)
+
+ def _admit(self, uses: int) -> bool:
+ """
+ 'lfu' 的准入判断: 内存已满时，新公钥的出现次数不少于淘汰对象的使用次数才建表
+ (调用方持有锁)
+ """
+ if self.policy != 'lfu' or not self._entries:
+ return True
+ # 同一缓存中所有表的窗口大小相同，大小也相同
+ nbytes = next(iter(self._entries.values())).nbytes
+ if self._bytes + nbytes <= self.memory_budget:
+ return True
+ return uses >= self._entries[self._lfu_victim()].uses
+
+ def _decay(self):
+ """所有使用次数和出现次数减半，丢弃减为0的出现记录 (调用方持有锁)"""
+ self._lookups = 0
+ for entry in self._entries.values():
+ entry.uses //= 2
+ for key in list(self._seen):
+ self._seen[key] //= 2
+ if not self._seen[key]:
+ del self._seen[key]
+
+ def _evict(self, keep=None):
+ """淘汰条目直到内存不超过上限，不淘汰刚加入的keep (调用方持有锁)"""
+ while self._bytes > self.memory_budget:
+ if self.policy == 'lfu':
+ victim = self._lfu_victim(keep)
+ else:
+ victim = next(key for key in self._entries if key != keep)
+ entry = self._entries.pop(victim)
+ self._bytes -= entry.nbytes
+ self.evictions += 1
+
+ def clear(self):
+ """清空缓存和统计"""
+ with self._lock:
+ self._entries.clear()
+ self._seen.clear()
+ self._lookups = 0
+ self._bytes = 0
+ self.hits = 0
+ self.misses = 0
+ self.builds = 0
+ self.evictions = 0
+
+ def __len__(self) -> int:
+ return len(self._entries)
+
+ def __contains__(self, public_key: ECCPoint) -> bool:
+ return (public_key.x, public_key.y) in self._entries
+
+ def stats(self) -> Dict:
+ """缓存统计信息"""
+ total = self.hits + self.misses
+ return {
+ 'size': len(self._entries),
+ 'bytes': self._bytes,
+ 'memory_budget': self.memory_budget,
+ 'policy': self.policy,
+ 'hits': self.hits,
+ 'misses': self.misses,
+ 'builds': self.builds,
+ 'evictions': self.evictions,
+ 'hit_rate': self.hits / total if total else 0.0
+ }
 
 class SM2Signature:
  """SM2数字签名算法实现"""
 
- def __init__(self):
- """初始化SM2签名对象"""
- self.curve = SM2Curve()
+ # 默认所有签名对象共享同一个ZA缓存
+ za_cache = ZACache()
+
+ # 公钥预计算缓存默认不启用
+ key_cache: Optional[PublicKeyCache] = None
+
+ # 签名随机数池默认不启用
+ nonce_pool: Optional[NoncePool] = None
+
+ # verify_batch的进程池，首次以processes > 1调用时创建
+ _worker_pool = None
+
+ def __init__(self, fixed_base_window: int = 4, za_cache: Optional[ZACache] = None,
+ key_cache: Optional[PublicKeyCache] = None, nonce_pool: Optional[NoncePool] = None):
+ """
+ 初始化SM2签名对象
+
+ Args:
+ fixed_base_window: 固定基点预计算表窗口大小 (签名和密钥生成中的k*G)
+ za_cache: 独立的ZA缓存，默认使用共享缓存
+ key_cache: 常用公钥的预计算缓存，默认不启用
+ nonce_pool: 预生成的签名随机数池，默认不启用
+ """
+ self.curve = SM2Curve(fixed_base_window)
  self.user_id = "31323334353637383132333435363738" # 默认用户标识
+ if za_cache is not None:
+ self.za_cache = za_cache
+ if key_cache is not None:
+ self.key_cache = key_cache
+ if nonce_pool is not None:
+ self.nonce_pool = nonce_pool
+
+ def cache_stats(self) -> Dict:
+ """ZA缓存和公钥预计算缓存的统计信息"""
+ return {
+ 'za': self.za_cache.stats(),
+ 'keys': self.key_cache.stats() if self.key_cache is not None else None
+ }
 
  def _za_value(self, public_key: ECCPoint, user_id: str = None) -> bytes:
  """
- 计算ZA值 (用户身份标识的杂凑值)
+ 计算ZA值 (用户身份标识的杂凑值)，结果缓存在za_cache中
 
  Args:
  public_key: 用户公钥
@@ -39,6 +332,24 @@ class SM2Signature:
  if user_id is None:
  user_id = self.user_id
 
+ # 已建表的常用公钥同时保存了ZA值
+ entry = self.key_cache.peek(public_key) if self.key_cache is not None else None
+ if entry is not None:
+ za = entry.za.get(user_id)
+ if za is not None:
+ return za
+
+ key = (public_key.x, public_key.y, user_id)
+ za = self.za_cache.get(key)
+ if za is None:
+ za = self._compute_za(public_key, user_id)
+ self.za_cache.put(key, za)
+ if entry is not None:
+ entry.za[user_id] = za
+ return za
+
+ def _compute_za(self, public_key: ECCPoint, user_id: str) -> bytes:
+ """按GM/T 0003.2计算ZA值 (不经过缓存)"""
  # 用户标识长度 (位)
  id_len = len(user_id) * 4
 
@@ -67,6 +378,31 @@ class SM2Signature:
  za_input = b''.join(za_data)
  return sm3_hash(za_input)
 
+ def warm_za_cache(self, key_directory: Iterable) -> int:
+ """
+ 用已知签名者预热ZA缓存
+
+ Args:
+ key_directory: 公钥或 (公钥, 用户标识) 的序列，用户标识为None时使用默认标识
+
+ Returns:
+ 新计算的ZA数量
+ """
+ added = 0
+ for entry in key_directory:
+ if isinstance(entry, ECCPoint):
+ public_key, user_id = entry, None
+ else:
+ public_key, user_id = entry
+ if user_id is None:
+ user_id = self.user_id
+
+ key = (public_key.x, public_key.y, user_id)
+ if key not in self.za_cache:
+ self.za_cache.put(key, self._compute_za(public_key, user_id))
+ added += 1
+ return added
+
  def _message_hash(self, message: Union[bytes, str], public_key: ECCPoint,
  user_id: str = None) -> int:
  """
@@ -103,6 +439,43 @@ class SM2Signature:
  """
  return self.curve.generate_keypair()
 
+ def generate_keypairs(self, count: int) -> List[Tuple[int, ECCPoint]]:
+ """
+ 批量生成SM2密钥对 (所有公钥共用一次模逆)
+
+ Args:
+ count: 密钥对数量
+
+ Returns:
+ [(private_key, public_key), ...]
+ """
+ return self.curve.generate_keypairs(count)
+
+ def signing_key(self, private_key: int, public_key: ECCPoint = None,
+ user_id: str = None) -> 'SM2SigningKey':
+ """
+ 创建使用本签名对象 (曲线、缓存、随机数池) 的签名私钥对象
+
+ Args:
+ private_key: 签名私钥
+ public_key: 签名公钥 (如果为None则从私钥计算)
+ user_id: 用户标识
+
+ Returns:
+ SM2SigningKey
+ """
+ return SM2SigningKey(private_key, public_key, user_id, signer=self)
+
+ def _nonce(self) -> Tuple[int, int]:
+ """
+ 生成签名随机数 k ∈ [1, n-1] 及 [k]G 的x坐标
+ 启用nonce_pool时直接从池中取出，每个随机数只使用一次
+ """
+ if self.nonce_pool is not None:
+ return self.nonce_pool.take()
+ k = random.randint(1, self.curve.n - 1)
+ return k, self.curve.point_multiply(k, self.curve.G).x
+
  def sign(self, message: Union[bytes, str], private_key: int,
  public_key: ECCPoint = None, user_id: str = None) -> Tuple[int, int]:
  """
@@ -123,25 +496,37 @@ class SM2Signature:
  # 计算消息杂凑值
  e = self._message_hash(message, public_key, user_id)
 
- while True:
- # 生成随机数 k ∈ [1, n-1]
- k = random.randint(1, self.curve.n - 1)
+ return self._sign_hash(e, private_key)
+
+ def _sign_hash(self, e: int, private_key: int, inverse: Optional[int] = None) -> Tuple[int, int]:
+ """
+ 由杂凑值e计算签名 (r, s)
 
- # 计算椭圆曲线点 (x1, y1) = [k]G
- point = self.curve.point_multiply(k, self.curve.G)
+ Args:
+ e: 消息杂凑值 (整数)
+ private_key: 签名私钥
+ inverse: 预先算好的 (1 + dA)^(-1) mod n，为None时现场计算
+
+ Returns:
+ (r, s) 签名值对
+ """
+ n = self.curve.n
+ if inverse is None:
+ inverse = self.curve.mod_inverse_secret((1 + private_key) % n, n)
+
+ while True:
+ # 生成随机数 k ∈ [1, n-1]，计算椭圆曲线点 (x1, y1) = [k]G
+ k, x1 = self._nonce()
 
  # 计算 r = (e + x1) mod n
- r = (e + point.x) % self.curve.n
+ r = (e + x1) % n
 
  # 如果 r = 0 或 r + k = n，则重新生成k
- if r == 0 or (r + k) % self.curve.n == 0:
+ if r == 0 or (r + k) % n == 0:
  continue
 
  # 计算 s = (1 + dA)^(-1) * (k - r * dA) mod n
- temp1 = (1 + private_key) % self.curve.n
- temp1_inv = self.curve.mod_inverse(temp1, self.curve.n)
- temp2 = (k - r * private_key) % self.curve.n
- s = (temp1_inv * temp2) % self.curve.n
+ s = (inverse * (k - r * private_key)) % n
 
  # 如果 s = 0，则重新生成k
  if s == 0:
@@ -169,9 +554,6 @@ class SM2Signature:
  if not (1 <= r < self.curve.n and 1 <= s < self.curve.n):
  return False
 
- # 计算消息杂凑值
- e = self._message_hash(message, public_key, user_id)
-
  # 计算 t = (r + s) mod n
  t = (r + s) % self.curve.n
 
@@ -179,10 +561,14 @@ class SM2Signature:
  if t == 0:
  return False
 
+ # 查找常用公钥的预计算表 (先于ZA，使新建的表同时缓存ZA)
+ entry = self.key_cache.lookup(self.curve, public_key) if self.key_cache is not None else None
+
+ # 计算消息杂凑值
+ e = self._message_hash(message, public_key, user_id)
+
  # 计算椭圆曲线点 (x1', y1') = [s]G + [t]PA
- point1 = self.curve.point_multiply(s, self.curve.G)
- point2 = self.curve.point_multiply(t, public_key)
- point_sum = self.curve.point_add(point1, point2)
+ point_sum = self._verify_point(s, t, public_key, entry)
 
  # 如果点为无穷远点，则验证失败
  if point_sum.is_infinity:
@@ -194,6 +580,107 @@ class SM2Signature:
  # 验证 R == r
  return R == r
 
+ def _verify_point(self, s: int, t: int, public_key: ECCPoint,
+ entry: Optional[_KeyEntry]) -> ECCPoint:
+ """
+ 计算 [s]G + [t]PA
+ 公钥已有预计算表时两部分都直接查表累加，否则两次标量乘法共用一条倍点链
+ """
+ if entry is None:
+ return self.curve.double_scalar_multiply(s, self.curve.G, t, public_key)
+ return self.curve.fixed_double_multiply_jacobian(s, t, entry.table).to_affine(self.curve)
+
+ def verify_batch(self, items: Sequence[VerifyItem], processes: Optional[int] = None,
+ chunk_size: int = 64, pool=None) -> List[bool]:
+ """
+ 批量SM2签名验证
+
+ 与逐条调用verify结果相同，但在批次内共享计算:
+ 重复签名者的ZA值由ZA缓存提供，同一公钥的wNAF奇数倍点表只构建一次，
+ 所有 [s]G + [t]PA 保留为雅可比坐标，最后用batch_to_affine统一转换 (只做一次模逆)。
+
+ 进程池模式下每个工作进程持有本签名对象的一个副本 (同样的类和曲线)，
+ ZA缓存和公钥预计算缓存按进程各自维护，不与当前进程的缓存共享。
+
+ Args:
+ items: (message, signature, public_key, user_id) 元组序列，user_id为None时使用默认标识
+ processes: 进程数，大于1时把批次分片后交给进程池并行验证；进程池在首次使用时
+ 创建并保留在签名对象上，之后的调用复用，由close()关闭
+ chunk_size: 进程池模式下每个分片的条目数
+ pool: 已有的SM2WorkerPool，指定时总是交给它验证 (忽略processes)
+
+ Returns:
+ 与items一一对应的验证结果列表
+ """
+ items = list(items)
+
+ if pool is None and processes and processes > 1 and len(items) > chunk_size:
+ pool = self._process_pool(processes)
+ if pool is not None:
+ return pool.verify_many(items, chunk_size)
+
+ return self._verify_batch_local(items)
+
+ def _process_pool(self, processes: int):
+ """verify_batch使用的进程池，首次使用时创建，进程数变化时重建"""
+ try:
+ from .worker_pool import SM2WorkerPool
+ except ImportError:
+ from worker_pool import SM2WorkerPool
+
+ pool = self._worker_pool
+ if pool is None or pool.processes != processes:
+ if pool is not None:
+ pool.close()
+ pool = SM2WorkerPool(processes, signer_factory=_SignerReplica(self))
+ self._worker_pool = pool
+ return pool
+
+ def close(self):
+ """关闭verify_batch创建的进程池 (没有创建时什么也不做)"""
+ pool, self._worker_pool = self._worker_pool, None
+ if pool is not None:
+ pool.close()
+
+ def _verify_batch_local(self, items: List[VerifyItem]) -> List[bool]:
+ """在当前进程内批量验证"""
+ curve = self.curve
+ n = curve.n
+
+ results = [False] * len(items)
+ pending = [] # (序号, e, r, 雅可比坐标点)
+ tables: Dict = {}
+
+ for index, (message, signature, public_key, user_id) in enumerate(items):
+ r, s = signature
+
+ # 检验 r, s ∈ [1, n-1]，且 t = (r + s) mod n != 0
+ if not (1 <= r < n and 1 <= s < n):
+ continue
+ t = (r + s) % n
+ if t == 0:
+ continue
+
+ entry = self.key_cache.lookup(curve, public_key) if self.key_cache is not None else None
+
+ # 计算 e = H(ZA || M)，重复的签名者由ZA缓存命中
+ e = self._message_hash(message, public_key, user_id)
+
+ if entry is not None:
+ point = curve.fixed_double_multiply_jacobian(s, t, entry.table)
+ else:
+ point = curve.double_scalar_multiply_jacobian(s, curve.G, t, public_key, tables=tables)
+ if point.is_infinity():
+ continue
+ pending.append((index, e, r, point))
+
+ # 所有结果点一起转换为仿射坐标，只做一次模逆
+ points = curve.batch_to_affine([point for _, _, _, point in pending])
+ for (index, e, r, _), point in zip(pending, points):
+ results[index] = (e + point.x) % n == r
+
+ return results
+
  def sign_digest(self, digest: bytes, private_key: int) -> Tuple[int, int]:
  """
  对已有的摘要进行签名 (用于兼容其他哈希算法)
@@ -211,29 +698,7 @@ class SM2Signature:
  # 将摘要转换为整数
  e = int.from_bytes(digest, byteorder='big')
 
- while True:
- # 生成随机数 k
- k = random.randint(1, self.curve.n - 1)
-
- # 计算椭圆曲线点
- point = self.curve.point_multiply(k, self.curve.G)
-
- # 计算 r
- r = (e + point.x) % self.curve.n
-
- if r == 0 or (r + k) % self.curve.n == 0:
- continue
-
- # 计算 s
- temp1 = (1 + private_key) % self.curve.n
- temp1_inv = self.curve.mod_inverse(temp1, self.curve.n)
- temp2 = (k - r * private_key) % self.curve.n
- s = (temp1_inv * temp2) % self.curve.n
-
- if s == 0:
- continue
-
- return (r, s)
+ return self._sign_hash(e, private_key)
 
  def verify_digest(self, digest: bytes, signature: Tuple[int, int],
  public_key: ECCPoint) -> bool:
@@ -265,9 +730,8 @@ class SM2Signature:
  if t == 0:
  return False
 
- point1 = self.curve.point_multiply(s, self.curve.G)
- point2 = self.curve.point_multiply(t, public_key)
- point_sum = self.curve.point_add(point1, point2)
+ entry = self.key_cache.lookup(self.curve, public_key) if self.key_cache is not None else None
+ point_sum = self._verify_point(s, t, public_key, entry)
 
  if point_sum.is_infinity:
  return False
@@ -275,6 +739,111 @@ class SM2Signature:
  R = (e + point_sum.x) % self.curve.n
  return R == r
 
+class SM2SigningKey:
+ """
+ SM2签名私钥
+
+ 构造时一次性计算公钥、(1 + dA)^(-1) mod n 和ZA，
+ 之后每次签名只需计算 e = H(ZA || M)、取随机数和几次模乘，不再有任何与私钥相关的预处理。
+ 曲线、随机数池等由关联的SM2Signature对象提供，SM2Signature.sign 等函数式接口保持不变。
+ """
+
+ def __init__(self, private_key: int, public_key: ECCPoint = None, user_id: str = None,
+ signer: Optional[SM2Signature] = None):
+ """
+ Args:
+ private_key: 签名私钥 dA ∈ [1, n-2]
+ public_key: 签名公钥 (如果为None则从私钥计算)
+ user_id: 用户标识，默认使用签名对象的默认标识
+ signer: 执行运算的签名对象，默认新建SM2Signature
+ """
+ self.signer = signer if signer is not None else SM2Signature()
+ curve = self.signer.curve
+ n = curve.n
+
+ # 1 + dA 必须可逆
+ if not 1 <= private_key <= n - 2:
+ raise ValueError("私钥必须在 [1, n-2] 范围内")
+
+ self.private_key = private_key
+ self.public_key = public_key if public_key is not None else curve.point_multiply(private_key, curve.G)
+ self.user_id = user_id if user_id is not None else self.signer.user_id
+ self.za = self.signer._za_value(self.public_key, self.user_id)
+ self._inverse = curve.mod_inverse_secret(1 + private_key, n)
+
+ @classmethod
+ def generate(cls, signer: Optional[SM2Signature] = None, user_id: str = None) -> 'SM2SigningKey':
+ """生成新的密钥对并创建签名私钥对象"""
+ signer = signer if signer is not None else SM2Signature()
+ while True:
+ private_key, public_key = signer.generate_keypair()
+ if private_key <= signer.curve.n - 2:
+ return cls(private_key, public_key, user_id, signer)
+
+ def sign(self, message: Union[bytes, str]) -> Tuple[int, int]:
+ """
+ SM2数字签名 (与SM2Signature.sign结果可互相验证)
+
+ Args:
+ message: 待签名消息
+
+ Returns:
+ (r, s) 签名值对
+ """
+ if isinstance(message, str):
+ message = message.encode('utf-8')
+ e = int.from_bytes(sm3_hash(self.za + message), byteorder='big')
+ return self.signer._sign_hash(e, self.private_key, self._inverse)
+
+ def sign_digest(self, digest: bytes) -> Tuple[int, int]:
+ """
+ 对已有的摘要进行签名
+
+ Args:
+ digest: 消息摘要 (32字节)
+
+ Returns:
+ (r, s) 签名值对
+ """
+ if len(digest) != 32:
+ raise ValueError("摘要长度必须为32字节")
+ return self.signer._sign_hash(int.from_bytes(digest, byteorder='big'), self.private_key, self._inverse)
+
+ def verify(self, message: Union[bytes, str], signature: Tuple[int, int]) -> bool:
+ """用本私钥对应的公钥验证签名"""
+ return self.signer.verify(message, signature, self.public_key, self.user_id)
+
+class _SignerReplica:
+ """
+ 在工作进程中复制签名对象 (可pickle，用作SM2WorkerPool的signer_factory)
+
+ 保留签名对象的类和曲线、用户标识等属性；缓存不跨进程共享，每个工作进程
+ 创建配置相同的新ZA缓存和公钥预计算缓存，随机数池不复制 (验签不需要)
+ """
+
+ def __init__(self, signer: SM2Signature):
+ self.cls = type(signer)
+ self.state = {name: value for name, value in vars(signer).items()
+ if name not in ('za_cache', 'key_cache', 'nonce_pool', '_worker_pool')}
+ self.za_capacity = signer.za_cache.capacity
+ key_cache = signer.key_cache
+ self.key_cache_options = None if key_cache is None else {
+ 'memory_budget': key_cache.memory_budget,
+ 'window_size': key_cache.window_size,
+ 'min_uses': key_cache.min_uses,
+ 'policy': key_cache.policy,
+ 'track_limit': key_cache.track_limit,
+ 'decay_interval': key_cache.decay_interval
+ }
+
+ def __call__(self) -> SM2Signature:
+ signer = self.cls.__new__(self.cls)
+ signer.__dict__.update(self.state)
+ signer.za_cache = ZACache(self.za_capacity)
+ if self.key_cache_options is not None:
+ signer.key_cache = PublicKeyCache(**self.key_cache_options)
+ return signer
+
 def test_sm2_signature():
  """测试SM2数字签名算法"""
  print("测试SM2数字签名算法...")
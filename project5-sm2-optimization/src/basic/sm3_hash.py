@@ -5,8 +5,266 @@ SM3密码杂凑算法实现
 为SM2数字签名算法提供哈希函数支持
 """
 
+import mmap
+import os
 import struct
-from typing import Union
+from typing import BinaryIO, Union, List, Sequence, Dict, Optional
+
+# NumPy为可选依赖，仅用于多消息并行杂凑
+try:
+ import numpy as np
+ NUMPY_AVAILABLE = True
+except ImportError:
+ np = None
+ NUMPY_AVAILABLE = False
+
+# 可选的原生(C)后端 (project4共享库)
+try:
+ from . import sm3_native
+except ImportError:
+ import sm3_native
+
+_MASK32 = 0xFFFFFFFF
+
+# SM3初始值 (GM/T 0004-2012)
+_SM3_IV = (
+ 0x7380166F, 0x4914B2B9, 0x172442D7, 0xDA8A0600,
+ 0xA96F30BC, 0x163138AA, 0xE38DEE4D, 0xB0FB0E4E
+)
+
+# 预计算的轮常量 T_j <<< (j mod 32)
+_T_ROTATED = tuple(
+ ((t << (j % 32)) | (t >> (32 - j % 32))) & _MASK32
+ for j, t in enumerate([0x79CC4519] * 16 + [0x7A879D8A] * 48)
+)
+
+_BLOCK_STRUCT = struct.Struct('>16I')
+_DIGEST_STRUCT = struct.Struct('>8I')
+
+def _sm3_compress(state: Sequence[int], block: bytes, offset: int = 0) -> List[int]:
+ """
+ SM3压缩函数 CF(V, B)
+
+ 轮常量已预先循环移位，布尔函数按 j < 16 和 j >= 16 拆成两段循环，
+ 循环移位和置换函数全部内联为局部变量运算，每段循环体展开4轮。
+
+ Args:
+ state: 当前8个字的状态V
+ block: 包含消息块的缓冲区
+ offset: 消息块在block中的起始位置
+
+ Returns:
+ 新的状态
+ """
+ M = _MASK32
+ T = _T_ROTATED
+
+ # 消息扩展: W0..W67 (W'j = Wj ^ Wj+4 在轮函数中直接计算)
+ w = list(_BLOCK_STRUCT.unpack_from(block, offset))
+ for i in range(16, 68):
+ x = w[i - 3]
+ x = w[i - 16] ^ w[i - 9] ^ (((x << 15) | (x >> 17)) & M)
+ y = w[i - 13]
+ w.append(x ^ (((x << 15) | (x >> 17)) & M) ^ (((x << 23) | (x >> 9)) & M)
+ ^ (((y << 7) | (y >> 25)) & M) ^ w[i - 6])
+
+ A, B, C, D, E, F, G, H = state
+
+ # 每轮只写回D(TT1)、H(P0(TT2))和循环移位后的B、F，
+ # 下一轮把 (D, A, B, C, H, E, F, G) 当作 (A, B, C, D, E, F, G, H) 使用，
+ # 4轮后变量名回到原位，因此循环体展开4轮即可省去寄存器轮换的赋值。
+
+ # 第0-15轮: FF = GG = X ^ Y ^ Z
+ for j in range(0, 16, 4):
+ a12 = ((A << 12) | (A >> 20)) & M
+ ss1 = (a12 + E + T[j]) & M
+ ss1 = ((ss1 << 7) | (ss1 >> 25)) & M
+ D = ((A ^ B ^ C) + D + (ss1 ^ a12) + (w[j] ^ w[j + 4])) & M
+ H = ((E ^ F ^ G) + H + ss1 + w[j]) & M
+ B = ((B << 9) | (B >> 23)) & M
+ F = ((F << 19) | (F >> 13)) & M
+ H = H ^ (((H << 9) | (H >> 23)) & M) ^ (((H << 17) | (H >> 15)) & M)
+
+ a12 = ((D << 12) | (D >> 20)) & M
+ ss1 = (a12 + H + T[j + 1]) & M
+ ss1 = ((ss1 << 7) | (ss1 >> 25)) & M
+ C = ((D ^ A ^ B) + C + (ss1 ^ a12) + (w[j + 1] ^ w[j + 5])) & M
+ G = ((H ^ E ^ F) + G + ss1 + w[j + 1]) & M
+ A = ((A << 9) | (A >> 23)) & M
+ E = ((E << 19) | (E >> 13)) & M
+ G = G ^ (((G << 9) | (G >> 23)) & M) ^ (((G << 17) | (G >> 15)) & M)
+
+ a12 = ((C << 12) | (C >> 20)) & M
+ ss1 = (a12 + G + T[j + 2]) & M
+ ss1 = ((ss1 << 7) | (ss1 >> 25)) & M
+ B = ((C ^ D ^ A) + B + (ss1 ^ a12) + (w[j + 2] ^ w[j + 6])) & M
+ F = ((G ^ H ^ E) + F + ss1 + w[j + 2]) & M
+ D = ((D << 9) | (D >> 23)) & M
+ H = ((H << 19) | (H >> 13)) & M
+ F = F ^ (((F << 9) | (F >> 23)) & M) ^ (((F << 17) | (F >> 15)) & M)
+
+ a12 = ((B << 12) | (B >> 20)) & M
+ ss1 = (a12 + F + T[j + 3]) & M
+ ss1 = ((ss1 << 7) | (ss1 >> 25)) & M
+ A = ((B ^ C ^ D) + A + (ss1 ^ a12) + (w[j + 3] ^ w[j + 7])) & M
+ E = ((F ^ G ^ H) + E + ss1 + w[j + 3]) & M
+ C = ((C << 9) | (C >> 23)) & M
+ G = ((G << 19) | (G >> 13)) & M
+ E = E ^ (((E << 9) | (E >> 23)) & M) ^ (((E << 17) | (E >> 15)) & M)
+
+ # 第16-63轮: FF为多数函数，GG为选择函数
+ for j in range(16, 64, 4):
+ a12 = ((A << 12) | (A >> 20)) & M
+ ss1 = (a12 + E + T[j]) & M
+ ss1 = ((ss1 << 7) | (ss1 >> 25)) & M
+ D = (((A & B) | (C & (A | B))) + D + (ss1 ^ a12) + (w[j] ^ w[j + 4])) & M
+ H = ((G ^ (E & (F ^ G))) + H + ss1 + w[j]) & M
+ B = ((B << 9) | (B >> 23)) & M
+ F = ((F << 19) | (F >> 13)) & M
+ H = H ^ (((H << 9) | (H >> 23)) & M) ^ (((H << 17) | (H >> 15)) & M)
+
+ a12 = ((D << 12) | (D >> 20)) & M
+ ss1 = (a12 + H + T[j + 1]) & M
+ ss1 = ((ss1 << 7) | (ss1 >> 25)) & M
+ C = (((D & A) | (B & (D | A))) + C + (ss1 ^ a12) + (w[j + 1] ^ w[j + 5])) & M
+ G = ((F ^ (H & (E ^ F))) + G + ss1 + w[j + 1]) & M
+ A = ((A << 9) | (A >> 23)) & M
+ E = ((E << 19) | (E >> 13)) & M
+ G = G ^ (((G << 9) | (G >> 23)) & M) ^ (((G << 17) | (G >> 15)) & M)
+
+ a12 = ((C << 12) | (C >> 20)) & M
+ ss1 = (a12 + G + T[j + 2]) & M
+ ss1 = ((ss1 << 7) | (ss1 >> 25)) & M
+ B = (((C & D) | (A & (C | D))) + B + (ss1 ^ a12) + (w[j + 2] ^ w[j + 6])) & M
+ F = ((E ^ (G & (H ^ E))) + F + ss1 + w[j + 2]) & M
+ D = ((D << 9) | (D >> 23)) & M
+ H = ((H << 19) | (H >> 13)) & M
+ F = F ^ (((F << 9) | (F >> 23)) & M) ^ (((F << 17) | (F >> 15)) & M)
+
+ a12 = ((B << 12) | (B >> 20)) & M
+ ss1 = (a12 + F + T[j + 3]) & M
+ ss1 = ((ss1 << 7) | (ss1 >> 25)) & M
+ A = (((B & C) | (D & (B | C))) + A + (ss1 ^ a12) + (w[j + 3] ^ w[j + 7])) & M
+ E = ((H ^ (F & (G ^ H))) + E + ss1 + w[j + 3]) & M
+ C = ((C << 9) | (C >> 23)) & M
+ G = ((G << 19) | (G >> 13)) & M
+ E = E ^ (((E << 9) | (E >> 23)) & M) ^ (((E << 17) | (E >> 15)) & M)
+
+ return [state[0] ^ A, state[1] ^ B, state[2] ^ C, state[3] ^ D,
+ state[4] ^ E, state[5] ^ F, state[6] ^ G, state[7] ^ H]
+
+def _python_compress_blocks(state: Sequence[int], data, offset: int, count: int) -> List[int]:
+ """纯Python后端: 从data[offset:]开始连续压缩count个分组"""
+ for block_offset in range(offset, offset + count * 64, 64):
+ state = _sm3_compress(state, data, block_offset)
+ return list(state)
+
+# 当前使用的分组压缩函数，由set_backend切换
+_compress_blocks = _python_compress_blocks
+_native_backend = None
+
+def set_backend(name: str = 'auto') -> str:
+ """
+ 选择SM3分组压缩后端
+
+ Args:
+ name: 'auto' 原生后端可用时使用原生后端，否则使用纯Python；
+ 'native' 强制使用原生后端；'python' 强制使用纯Python
+
+ Returns:
+ 实际使用的后端名称 ('native' 或 'python')
+ """
+ global _compress_blocks, _native_backend
+
+ if name not in ('auto', 'native', 'python'):
+ raise ValueError(f"未知的SM3后端: {name}")
+
+ if name != 'python':
+ if _native_backend is None:
+ _native_backend = sm3_native.load()
+ if _native_backend is not None:
+ _compress_blocks = _native_backend.compress_blocks
+ return 'native'
+ if name == 'native':
+ raise RuntimeError("SM3原生后端不可用，请先在project4-sm3-optimization中执行make shared")
+
+ _compress_blocks = _python_compress_blocks
+ return 'python'
+
+def get_backend() -> str:
+ """当前使用的SM3后端名称"""
+ return 'python' if _compress_blocks is _python_compress_blocks else 'native'
+
+# 同长度消息数达到该值时sm3_hash_many才使用NumPy并行计算 (条数少时逐条计算更快)
+NUMPY_MIN_LANES = 16
+
+def _sm3_padding(length: int) -> bytes:
+ """长度为length字节的消息的填充: 0x80 || 0...0 || 64位消息比特长度"""
+ zeros = (55 - length) % 64
+ return b'\x80' + b'\x00' * zeros + struct.pack('>Q', length * 8)
+
+def _rotl_lanes(x, n: int):
+ """uint32数组逐元素循环左移 (移出的高位由uint32自动截断)"""
+ return (x << n) | (x >> (32 - n))
+
+def _sm3_compress_lanes(state: List, block: List) -> List:
+ """
+ NumPy多路并行压缩函数
+
+ Args:
+ state: 8个形状为(N,)的uint32数组，第i个数组是N条消息状态的第i个字
+ block: 16个形状为(N,)的uint32数组，即N个消息块按字排成的列
+
+ Returns:
+ 新的状态 (8个uint32数组)
+ """
+ rotl = _rotl_lanes
+ w = list(block)
+ for i in range(16, 68):
+ x = w[i - 16] ^ w[i - 9] ^ rotl(w[i - 3], 15)
+ w.append(x ^ rotl(x, 15) ^ rotl(x, 23) ^ rotl(w[i - 13], 7) ^ w[i - 6])
+
+ A, B, C, D, E, F, G, H = state
+ for j in range(64):
+ a12 = rotl(A, 12)
+ ss1 = rotl(a12 + E + _T_LANES[j], 7)
+ if j < 16:
+ ff = A ^ B ^ C
+ gg = E ^ F ^ G
+ else:
+ ff = (A & B) | (C & (A | B))
+ gg = G ^ (E & (F ^ G))
+ tt1 = ff + D + (ss1 ^ a12) + (w[j] ^ w[j + 4])
+ tt2 = gg + H + ss1 + w[j]
+ D = C
+ C = rotl(B, 9)
+ B = A
+ A = tt1
+ H = G
+ G = rotl(F, 19)
+ F = E
+ E = tt2 ^ rotl(tt2, 9) ^ rotl(tt2, 17)
+
+ return [v ^ x for v, x in zip(state, (A, B, C, D, E, F, G, H))]
+
+def _sm3_hash_lanes(messages: List[bytes]) -> List[bytes]:
+ """用NumPy同时计算多条等长消息的SM3杂凑值，每条消息占一列(lane)"""
+ count = len(messages)
+ padding = _sm3_padding(len(messages[0]))
+ padded = b''.join(message + padding for message in messages)
+
+ # (消息数, 字数) 的大端字矩阵转置为 (字数, 消息数)，每个字是一列连续的uint32
+ words = np.frombuffer(padded, dtype='>u4').reshape(count, -1).T.astype(np.uint32)
+
+ state = [np.full(count, v, dtype=np.uint32) for v in _SM3_IV]
+ for offset in range(0, words.shape[0], 16):
+ state = _sm3_compress_lanes(state, [words[offset + i] for i in range(16)])
+
+ raw = np.stack(state, axis=1).astype('>u4').tobytes()
+ return [raw[i * 32:(i + 1) * 32] for i in range(count)]
+
+if np is not None:
+ _T_LANES = [np.uint32(t) for t in _T_ROTATED]
 
 class SM3Hash:
  """SM3哈希算法实现"""
@@ -14,10 +272,7 @@ class SM3Hash:
  def __init__(self):
  """初始化SM3哈希对象"""
  # SM3初始值 (GM/T 0004-2012)
- self.iv = [
- 0x7380166F, 0x4914B2B9, 0x172442D7, 0xDA8A0600,
- 0xA96F30BC, 0x163138AA, 0xE38DEE4D, 0xB0FB0E4E
- ]
+ self.iv = list(_SM3_IV)
 
  # 常数T
  self.T = [
@@ -61,110 +316,93 @@ class SM3Hash:
 
  def _compress(self, block: bytes):
  """压缩函数"""
- # 消息扩展
- w = [0] * 68
- w1 = [0] * 64
-
- # 前16个字从消息块直接获得
- for i in range(16):
- w[i] = struct.unpack('>I', block[i*4:(i+1)*4])[0]
+ self.state = _compress_blocks(self.state, block, 0, 1)
 
- # 扩展为68个字
- for i in range(16, 68):
- temp = w[i-16] ^ w[i-9] ^ self._rotl(w[i-3], 15)
- w[i] = self._p1(temp) ^ self._rotl(w[i-13], 7) ^ w[i-6]
-
- # 生成W1
- for i in range(64):
- w1[i] = w[i] ^ w[i+4]
+ def update(self, data: Union[bytes, bytearray, memoryview, str]):
+ """
+ 更新哈希数据
 
- # 压缩
- A, B, C, D, E, F, G, H = self.state
-
- for j in range(64):
- # SS1 = ROL((ROL(A, 12) + E + ROL(T[j], j % 32)), 7)
- temp1 = (self._rotl(A, 12) + E + self._rotl(self.T[j], j % 32)) & 0xFFFFFFFF
- SS1 = self._rotl(temp1, 7)
-
- # SS2 = SS1 ⊕ ROL(A, 12)
- SS2 = SS1 ^ self._rotl(A, 12)
-
- # TT1 = FF(A,B,C) + D + SS2 + W1[j]
- TT1 = (self._ff(A, B, C, j) + D + SS2 + w1[j]) & 0xFFFFFFFF
-
- # TT2 = GG(E,F,G) + H + SS1 + W[j]
- TT2 = (self._gg(E, F, G, j) + H + SS1 + w[j]) & 0xFFFFFFFF
-
- D = C
- C = self._rotl(B, 9)
- B = A
- A = TT1
- H = G
- G = self._rotl(F, 19)
- F = E
- E = self._p0(TT2)
-
- # 确保所有值都在32位范围内
- A, B, C, D, E, F, G, H = [x & 0xFFFFFFFF for x in [A, B, C, D, E, F, G, H]]
-
- # 更新状态
- self.state[0] = (self.state[0] ^ A) & 0xFFFFFFFF
- self.state[1] = (self.state[1] ^ B) & 0xFFFFFFFF
- self.state[2] = (self.state[2] ^ C) & 0xFFFFFFFF
- self.state[3] = (self.state[3] ^ D) & 0xFFFFFFFF
- self.state[4] = (self.state[4] ^ E) & 0xFFFFFFFF
- self.state[5] = (self.state[5] ^ F) & 0xFFFFFFFF
- self.state[6] = (self.state[6] ^ G) & 0xFFFFFFFF
- self.state[7] = (self.state[7] ^ H) & 0xFFFFFFFF
-
- def update(self, data: Union[bytes, str]):
- """更新哈希数据"""
+ 完整的64字节块直接从输入缓冲区按偏移量压缩，不做切片复制；
+ self.buffer只保存不足一块的尾部 (< 64字节)，总耗时与输入长度成线性关系。
+ """
  if isinstance(data, str):
  data = data.encode('utf-8')
 
- self.buffer += data
- self.counter += len(data)
+ view = memoryview(data).cast('B')
+ length = len(view)
+ self.counter += length
+
+ offset = 0
+ state = self.state
+
+ # 先补齐上次剩下的不完整块
+ if self.buffer:
+ need = 64 - len(self.buffer)
+ if length < need:
+ self.buffer += view.tobytes()
+ return
+ state = _compress_blocks(state, self.buffer + view[:need].tobytes(), 0, 1)
+ offset = need
+
+ # 处理完整的64字节块 (bytes直接传给后端，原生后端可以免复制)
+ end = length - (length - offset) % 64
+ if end > offset:
+ source = data if isinstance(data, bytes) else view
+ state = _compress_blocks(state, source, offset, (end - offset) // 64)
+
+ self.state = state
+ self.buffer = view[end:].tobytes()
+
+ def update_from_stream(self, fp: BinaryIO, chunk_size: int = 1 << 20) -> int:
+ """
+ 从二进制文件对象中分块读取数据并更新哈希
+
+ 复用同一个chunk_size大小的缓冲区，内存占用与输入大小无关。
+
+ Args:
+ fp: 以二进制模式打开的文件对象
+ chunk_size: 每次读取的字节数 (最好是64的倍数)
+
+ Returns:
+ 读取的总字节数
+ """
+ if chunk_size <= 0:
+ raise ValueError("chunk_size必须大于0")
+
+ chunk = bytearray(chunk_size)
+ view = memoryview(chunk)
+ total = 0
+
+ readinto = getattr(fp, 'readinto', None)
+ while True:
+ if readinto is not None:
+ count = readinto(chunk)
+ data = view[:count] if count else b''
+ else:
+ data = fp.read(chunk_size)
+ count = len(data)
+ if not count:
+ break
+ self.update(data)
+ total += count
 
- # 处理完整的64字节块
- while len(self.buffer) >= 64:
- self._compress(self.buffer[:64])
- self.buffer = self.buffer[64:]
+ return total
 
  def digest(self) -> bytes:
- """获取哈希摘要"""
- # 填充
- msg_len = self.counter
- msg = self.buffer
-
- # 添加'1'位 (0x80字节)
- msg += b'\x80'
-
- # 填充0直到长度≡56 (mod 64)
- while (len(msg) % 64) != 56:
- msg += b'\x00'
-
- # 添加原始消息长度(位)
- msg += struct.pack('>Q', msg_len * 8)
+ """获取哈希摘要 (不改变当前状态，之后仍可继续update)"""
+ # 剩余数据 || 0x80 || 0...0 || 64位消息比特长度
+ tail = self.buffer + _sm3_padding(self.counter)
 
- # 处理最后的块
- temp_state = self.state.copy()
- for i in range(0, len(msg), 64):
- self._compress(msg[i:i+64])
-
- # 生成摘要
- digest = b''
- for word in self.state:
- digest += struct.pack('>I', word)
-
- # 恢复状态 (保持对象可重用)
- self.state = temp_state
-
- return digest
+ state = _compress_blocks(self.state, tail, 0, len(tail) // 64)
+ return _DIGEST_STRUCT.pack(*state)
 
  def hexdigest(self) -> str:
  """获取十六进制哈希摘要"""
  return self.digest().hex()
 
+# 导入时自动选择后端，设置环境变量SM3_BACKEND=python可禁用原生后端
+set_backend(os.environ.get('SM3_BACKEND', 'auto'))
+
 def sm3_hash(data: Union[bytes, str]) -> bytes:
  """SM3哈希函数(便捷接口)"""
  hasher = SM3Hash()
@@ -175,6 +413,70 @@ def sm3_hexdigest(data: Union[bytes, str]) -> str:
  """SM3哈希函数十六进制输出(便捷接口)"""
  return sm3_hash(data).hex()
 
+def sm3_hash_file(path: str, chunk_size: int = 1 << 20, use_mmap: bool = False) -> bytes:
+ """
+ 计算文件的SM3杂凑值
+
+ Args:
+ path: 文件路径
+ chunk_size: 分块读取时每块的字节数
+ use_mmap: 使用内存映射直接按偏移量压缩 (空文件自动退回分块读取)
+
+ Returns:
+ 32字节杂凑值
+ """
+ hasher = SM3Hash()
+ with open(path, 'rb') as fp:
+ if use_mmap:
+ try:
+ mapped = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+ except ValueError:
+ # 空文件无法映射
+ mapped = None
+ if mapped is not None:
+ with mapped:
+ hasher.update(mapped)
+ return hasher.digest()
+ hasher.update_from_stream(fp, chunk_size)
+ return hasher.digest()
+
+def sm3_hash_many(messages: Sequence[Union[bytes, str]], use_numpy: Optional[bool] = None) -> List[bytes]:
+ """
+ 批量计算多条消息的SM3杂凑值
+
+ 长度相同的消息分为一组，组内消息数达到NUMPY_MIN_LANES且NumPy可用时
+ 按列并行压缩，否则逐条计算。已启用原生后端时自动模式直接逐条计算。
+ 结果与逐条调用sm3_hash完全相同。
+
+ Args:
+ messages: 消息序列
+ use_numpy: True强制使用NumPy，False禁用，None自动选择
+
+ Returns:
+ 与messages一一对应的32字节杂凑值列表
+ """
+ if use_numpy and np is None:
+ raise ImportError("sm3_hash_many(use_numpy=True)需要安装NumPy")
+
+ data = [m.encode('utf-8') if isinstance(m, str) else bytes(m) for m in messages]
+
+ groups: Dict[int, List[int]] = {}
+ for index, message in enumerate(data):
+ groups.setdefault(len(message), []).append(index)
+
+ results: List[bytes] = [b''] * len(data)
+ auto_numpy = use_numpy is None and np is not None and get_backend() == 'python'
+
+ for indices in groups.values():
+ if use_numpy or (auto_numpy and len(indices) >= NUMPY_MIN_LANES):
+ digests = _sm3_hash_lanes([data[i] for i in indices])
+ else:
+ digests = [sm3_hash(data[i]) for i in indices]
+ for index, digest in zip(indices, digests):
+ results[index] = digest
+
+ return results
+
 def test_sm3():
  """测试SM3哈希函数"""
  print("测试SM3哈希算法...")
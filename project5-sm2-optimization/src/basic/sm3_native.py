@@ -0,0 +1,120 @@
+"""
+SM3原生(C)后端
+通过ctypes加载project4-sm3-optimization编译出的共享库 (make shared)，
+为sm3_hash.py提供分组压缩函数。共享库不存在或加载失败时返回None，
+由调用方回退到纯Python实现。
+"""
+
+import ctypes
+import os
+import subprocess
+from typing import List, Optional, Sequence, Union
+
+# project4的源码目录 (与project5同级)
+PROJECT4_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..',
+ 'project4-sm3-optimization'))
+
+_LIB_NAME = 'libsm3.so'
+
+# 只读缓冲区 (如mmap) 需要复制后再传给C函数，每次最多复制的字节数
+_COPY_CHUNK = 1 << 20
+
+def default_library_path() -> str:
+ """共享库路径: 环境变量SM3_NATIVE_LIB，否则为project4的build目录"""
+ return os.environ.get('SM3_NATIVE_LIB') or os.path.join(PROJECT4_DIR, 'build', _LIB_NAME)
+
+class NativeSM3:
+ """对共享库中SM3压缩函数的封装"""
+
+ def __init__(self, path: str):
+ """
+ 加载共享库
+
+ Args:
+ path: 共享库路径
+
+ Raises:
+ OSError: 共享库无法加载或缺少所需符号
+ """
+ self.path = path
+ self._lib = ctypes.CDLL(path)
+ self._compress_blocks = self._lib.sm3_optimized_compress_blocks
+ self._compress_blocks.argtypes = [ctypes.POINTER(ctypes.c_uint32), ctypes.c_void_p, ctypes.c_size_t]
+ self._compress_blocks.restype = None
+
+ def compress_blocks(self, state: Sequence[int], data: Union[bytes, bytearray, memoryview],
+ offset: int, count: int) -> List[int]:
+ """
+ 从data[offset:]开始连续压缩count个64字节分组
+
+ bytes和可写缓冲区直接传递内存地址，不复制数据；
+ 只读的非bytes缓冲区按 _COPY_CHUNK 分段复制。
+
+ Returns:
+ 新的状态
+ """
+ words = (ctypes.c_uint32 * 8)(*state)
+ if count <= 0:
+ return list(words)
+
+ if isinstance(data, bytes):
+ address = ctypes.cast(ctypes.c_char_p(data), ctypes.c_void_p).value
+ self._compress_blocks(words, address + offset, count)
+ return list(words)
+
+ view = memoryview(data).cast('B')
+ if not view.readonly:
+ buffer = (ctypes.c_char * len(view)).from_buffer(view)
+ self._compress_blocks(words, ctypes.addressof(buffer) + offset, count)
+ del buffer
+ return list(words)
+
+ blocks_per_copy = _COPY_CHUNK // 64
+ end = offset + count * 64
+ while offset < end:
+ chunk = view[offset:min(end, offset + blocks_per_copy * 64)].tobytes()
+ self._compress_blocks(words, chunk, len(chunk) // 64)
+ offset += len(chunk)
+ return list(words)
+
+def load(path: Optional[str] = None) -> Optional[NativeSM3]:
+ """
+ 加载原生SM3后端
+
+ Args:
+ path: 共享库路径，默认使用default_library_path()
+
+ Returns:
+ NativeSM3实例，共享库不存在或无法加载时返回None
+ """
+ path = path or default_library_path()
+ if not os.path.exists(path):
+ return None
+ try:
+ return NativeSM3(path)
+ except (OSError, AttributeError):
+ return None
+
+def build_library() -> str:
+ """
+ 调用project4的Makefile编译共享库 (make shared)
+
+ Returns:
+ 共享库路径
+
+ Raises:
+ RuntimeError: 编译失败
+ """
+ try:
+ result = subprocess.run(['make', '-C', PROJECT4_DIR, 'shared'],
+ capture_output=True, text=True)
+ except OSError as e:
+ raise RuntimeError(f"无法执行make: {e}")
+
+ path = os.path.join(PROJECT4_DIR, 'build', _LIB_NAME)
+ if result.returncode != 0 or not os.path.exists(path):
+ raise RuntimeError(f"SM3共享库编译失败:\n{result.stderr}")
+ return path
+
+if __name__ == "__main__":
+ print(f"SM3共享库已编译: {build_library()}")
@@ -0,0 +1,200 @@
+"""
+SM2签名/验签多进程工作池
+
+Python大整数运算持有GIL，单个进程只能用满一个核。SM2WorkerPool在每个
+工作进程中只创建一次签名对象 (固定基点表等预计算在进程初始化时构建，
+之后所有任务共用)，把任务流按chunk_size分片提交，以摊薄进程间通信开销。
+
+- 任务为SignJob或VerifyJob，结果分别为 (r, s) 和 bool
+- imap按提交顺序给出结果，imap_unordered按完成顺序给出 (序号, 结果)
+- 输入可以是任意迭代器，同时在途的分片数有上限，不会一次性读完整个输入
+- 分片中的VerifyJob一起走签名对象的批量验证路径 (共用批量求逆)
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+try:
+ from .ecc_math import SM2Curve, ECCPoint
+ from .sm2_signature import SM2Signature
+except ImportError:
+ from ecc_math import SM2Curve, ECCPoint
+ from sm2_signature import SM2Signature
+
+class SignJob(NamedTuple):
+ """签名任务"""
+ message: Union[bytes, str]
+ private_key: int
+ public_key: Optional[ECCPoint] = None
+ user_id: Optional[str] = None
+
+class VerifyJob(NamedTuple):
+ """验签任务"""
+ message: Union[bytes, str]
+ signature: Tuple[int, int]
+ public_key: ECCPoint
+ user_id: Optional[str] = None
+
+Job = Union[SignJob, VerifyJob]
+
+# 每个工作进程持有一个签名对象
+_worker_signer: Optional[SM2Signature] = None
+
+def _init_worker(signer_factory: Callable[[], SM2Signature]):
+ """工作进程初始化: 创建签名对象并构建固定基点表"""
+ global _worker_signer
+ _worker_signer = signer_factory()
+ curve = _worker_signer.curve
+ if getattr(curve, 'fixed_base_window', 0):
+ curve.fixed_base_table
+
+def _run_jobs(signer: SM2Signature, jobs: List[Job]) -> List[Union[Tuple[int, int], bool]]:
+ """用给定的签名对象执行一组任务，其中的验签任务一起走批量验证路径"""
+ results = [None] * len(jobs)
+ verify_indices = []
+ for index, job in enumerate(jobs):
+ if isinstance(job, SignJob):
+ results[index] = signer.sign(job.message, job.private_key, job.public_key, job.user_id)
+ else:
+ verify_indices.append(index)
+
+ if verify_indices:
+ verified = signer._verify_batch_local([tuple(jobs[index]) for index in verify_indices])
+ for index, valid in zip(verify_indices, verified):
+ results[index] = valid
+ return results
+
+def _run_chunk(jobs: List[Job]) -> List[Union[Tuple[int, int], bool]]:
+ """在工作进程中执行一个分片"""
+ return _run_jobs(_worker_signer, jobs)
+
+class SM2WorkerPool:
+ """
+ SM2签名/验签多进程工作池
+
+ Example:
+ with SM2WorkerPool(processes=4) as pool:
+ for valid in pool.imap(VerifyJob(m, sig, pk) for m, sig, pk in requests):
+ ...
+ """
+
+ def __init__(self, processes: Optional[int] = None,
+ signer_factory: Callable[[], SM2Signature] = SM2Signature,
+ chunk_size: int = 32, max_pending: Optional[int] = None):
+ """
+ Args:
+ processes: 工作进程数，默认为CPU核数
+ signer_factory: 在工作进程中创建签名对象的可调用对象 (须可pickle)，
+ 如SM2Signature、各优化版本的签名类或functools.partial(SM2Signature, 6)
+ chunk_size: 每个分片的任务数
+ max_pending: 同时在途的分片数上限，默认为进程数的2倍
+ """
+ if chunk_size < 1:
+ raise ValueError("分片大小必须为正数")
+
+ self.processes = processes or os.cpu_count() or 1
+ self.chunk_size = chunk_size
+ self.max_pending = max_pending or 2 * self.processes
+ self._executor = ProcessPoolExecutor(max_workers=self.processes, initializer=_init_worker,
+ initargs=(signer_factory,))
+
+ def close(self):
+ """等待在途任务完成并关闭工作进程"""
+ self._executor.shutdown(wait=True)
+
+ def __enter__(self) -> 'SM2WorkerPool':
+ return self
+
+ def __exit__(self, *exc_info):
+ self.close()
+
+ def _chunks(self, jobs: Iterable[Job], chunk_size: Optional[int]) -> Iterator[List[Job]]:
+ """把任务流切分为分片，并检查任务类型"""
+ size = chunk_size or self.chunk_size
+ iterator = iter(jobs)
+ while True:
+ chunk = list(islice(iterator, size))
+ if not chunk:
+ return
+ for job in chunk:
+ if not isinstance(job, (SignJob, VerifyJob)):
+ raise TypeError(f"未知的任务类型: {type(job).__name__}")
+ yield chunk
+
+ def imap(self, jobs: Iterable[Job], chunk_size: Optional[int] = None) -> Iterator[Union[Tuple[int, int], bool]]:
+ """
+ 执行任务流，按提交顺序给出结果
+
+ Args:
+ jobs: SignJob / VerifyJob 的迭代器
+ chunk_size: 本次调用的分片大小，默认使用构造时的设置
+
+ Yields:
+ 签名任务为 (r, s)，验签任务为 bool
+ """
+ pending = deque()
+ chunks = self._chunks(jobs, chunk_size)
+ for chunk in chunks:
+ pending.append(self._executor.submit(_run_chunk, chunk))
+ if len(pending) >= self.max_pending:
+ yield from pending.popleft().result()
+ while pending:
+ yield from pending.popleft().result()
+
+ def imap_unordered(self, jobs: Iterable[Job],
+ chunk_size: Optional[int] = None) -> Iterator[Tuple[int, Union[Tuple[int, int], bool]]]:
+ """
+ 执行任务流，按完成顺序给出结果
+
+ Args:
+ jobs: SignJob / VerifyJob 的迭代器
+ chunk_size: 本次调用的分片大小，默认使用构造时的设置
+
+ Yields:
+ (任务在输入中的序号, 结果)
+ """
+ pending = {}
+ start = 0
+ chunks = self._chunks(jobs, chunk_size)
+ exhausted = False
+ while pending or not exhausted:
+ while not exhausted and len(pending) < self.max_pending:
+ chunk = next(chunks, None)
+ if chunk is None:
+ exhausted = True
+ break
+ pending[self._executor.submit(_run_chunk, chunk)] = start
+ start += len(chunk)
+ if not pending:
+ break
+
+ done, _ = wait(pending, return_when=FIRST_COMPLETED)
+ for future in done:
+ offset = pending.pop(future)
+ for i, result in enumerate(future.result()):
+ yield offset + i, result
+
+ def sign_many(self, messages: Iterable[Union[bytes, str]], private_key: int,
+ public_key: Optional[ECCPoint] = None, user_id: Optional[str] = None) -> List[Tuple[int, int]]:
+ """用同一私钥签名多条消息，按输入顺序返回签名"""
+ if public_key is None:
+ # 公钥只在主进程计算一次，而不是每个任务各算一次
+ curve = SM2Curve()
+ public_key = curve.point_multiply(private_key, curve.G)
+ return list(self.imap(SignJob(message, private_key, public_key, user_id) for message in messages))
+
+ def verify_many(self, items: Iterable[Tuple], chunk_size: Optional[int] = None) -> List[bool]:
+ """
+ 批量验签
+
+ Args:
+ items: (message, signature, public_key[, user_id]) 元组序列
+ chunk_size: 本次调用的分片大小，默认使用构造时的设置
+
+ Returns:
+ 与items一一对应的验证结果列表
+ """
+ return list(self.imap((VerifyJob(*item) for item in items), chunk_size))
@@ -10,8 +10,13 @@ import os
 # 导入基础模块
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'basic'))
 
-from ecc_math import SM2Curve, ECCPoint
-from sm2_signature import SM2Signature
+# 能按包导入时与basic包共用同一份模块，否则两份ecc_math中的ECCPoint是不同的类型
+try:
+ from basic.ecc_math import SM2Curve, ECCPoint
+ from basic.sm2_signature import SM2Signature
+except ImportError:
+ from ecc_math import SM2Curve, ECCPoint
+ from sm2_signature import SM2Signature
 
 class CachedOptimizedCurve(SM2Curve):
  """带缓存的SM2椭圆曲线"""
@@ -25,20 +30,16 @@ class CachedOptimizedCurve(SM2Curve):
 
  def _precompute_small_multiples(self):
  """预计算小倍数点"""
- # 预计算2G, 3G, ..., 16G
- current = self.G
- self._point_cache[1] = current
-
- for i in range(2, 17):
- current = self.point_add(current, self.G)
- self._point_cache[i] = current
+ # 预计算G, 2G, ..., 16G (雅可比坐标累加，只做一次批量求逆)
+ for i, point in enumerate(self.multiples(self.G, 16), 1):
+ self._point_cache[i] = point
 
  def point_multiply(self, k: int, P: ECCPoint) -> ECCPoint:
  """
  标量乘法 k*P，使用缓存加速小倍数
  """
  if k == 0:
- return ECCPoint() # 无穷远点
+ return ECCPoint.INFINITY
  if k == 1:
  return P
 
@@ -1,6 +1,7 @@
 """
 SM2数字签名算法最小优化版本
-只优化模逆算法，确保正确性的前提下提升性能
+原先只替换了模逆算法；模逆现已统一由field_math提供，
+此版本与基础实现相同，保留作为对照
 """
 
 import time
@@ -10,52 +11,21 @@ import os
 # 导入基础模块
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'basic'))
 
-from ecc_math import SM2Curve, ECCPoint
-from sm2_signature import SM2Signature
+# 能按包导入时与basic包共用同一份模块，否则两份ecc_math中的ECCPoint是不同的类型
+try:
+ from basic.ecc_math import SM2Curve, ECCPoint
+ from basic.sm2_signature import SM2Signature
+except ImportError:
+ from ecc_math import SM2Curve, ECCPoint
+ from sm2_signature import SM2Signature
 
 class MinimalOptimizedCurve(SM2Curve):
- """最小优化的SM2椭圆曲线 - 只优化模逆算法"""
+ """最小优化的SM2椭圆曲线 (模逆由基类的共享实现提供)"""
 
  def __init__(self):
  super().__init__()
  print("最小优化SM2曲线初始化完成")
 
- def mod_inverse_binary_gcd(self, a: int, m: int) -> int:
- """
- 二进制GCD模逆算法
- 比标准扩展欧几里得算法快约15-25%
- """
- if a < 0:
- a = (a % m + m) % m
-
- if a == 0:
- raise ValueError("0没有模逆")
- if a == 1:
- return 1
-
- # 保存原始模数
- orig_m = m
-
- # 扩展欧几里得算法
- old_a, old_m = a, m
- x, old_x = 0, 1
-
- while a != 0:
- quotient = m // a
- m, a = a, m % a
- x, old_x = old_x - quotient * x, x
-
- if m != 1:
- raise ValueError("模逆不存在")
-
- # 确保结果为正
- return (old_x % orig_m + orig_m) % orig_m
-
- # 重写基类的模逆方法
- def mod_inverse(self, a: int, m: int) -> int:
- """使用优化的模逆算法"""
- return self.mod_inverse_binary_gcd(a, m)
-
 class MinimalOptimizedSM2(SM2Signature):
  """最小优化的SM2数字签名"""
 
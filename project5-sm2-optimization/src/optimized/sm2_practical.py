@@ -1,23 +1,27 @@
 """
 SM2数字签名算法优化实现 - 实用版本
 主要优化策略:
-1. 快速模逆算法 (二进制扩展欧几里得算法)
+1. 模逆使用field_math中的共享实现
 2. 预计算常用标量倍数
 3. 内存局部性优化
 4. 算法常数优化
 """
 
 import time
-import random
-from typing import Tuple, Dict
+from typing import Tuple, Dict, Optional
 import sys
 import os
 
 # 确保能导入基础模块
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'basic'))
 
-from ecc_math import SM2Curve, ECCPoint
-from sm2_signature import SM2Signature
+# 能按包导入时与basic包共用同一份模块，否则两份ecc_math中的ECCPoint是不同的类型
+try:
+ from basic.ecc_math import SM2Curve, ECCPoint
+ from basic.sm2_signature import SM2Signature
+except ImportError:
+ from ecc_math import SM2Curve, ECCPoint
+ from sm2_signature import SM2Signature
 
 class PracticalOptimizedSM2Curve(SM2Curve):
  """实用优化的SM2椭圆曲线实现"""
@@ -31,110 +35,25 @@ class PracticalOptimizedSM2Curve(SM2Curve):
  print("初始化SM2椭圆曲线优化...")
  start_time = time.time()
 
- # 预计算小的基点倍数 (1G到8G)
- self.small_multiples = {}
- point = self.G
- for i in range(1, 9):
- self.small_multiples[i] = point
- if i < 8:
- point = self.point_add(point, self.G)
+ # 预计算小的基点倍数 (1G到8G，只做一次批量求逆)
+ self.small_multiples = dict(enumerate(self.multiples(self.G, 8), 1))
 
  init_time = time.time() - start_time
  print(f"优化初始化完成，耗时: {init_time*1000:.2f} ms")
 
- def mod_inverse_fast(self, a: int, m: int) -> int:
+ def point_multiply_windowed(self, k: int, P: ECCPoint, window_size: Optional[int] = None) -> ECCPoint:
  """
- 快速模逆算法
- 基于二进制扩展欧几里得算法，比标准版本快约20-30%
- """
- if a < 0:
- a = (a % m + m) % m
-
- if a == 0:
- raise ValueError("0没有模逆")
- if a == 1:
- return 1
-
- # 使用二进制扩展欧几里得算法
- u, v = a, m
- x1, x2 = 1, 0
-
- while u != 1 and v != 1:
- while u % 2 == 0:
- u //= 2
- if x1 % 2 == 0:
- x1 //= 2
- else:
- x1 = (x1 + m) // 2
-
- while v % 2 == 0:
- v //= 2
- if x2 % 2 == 0:
- x2 //= 2
- else:
- x2 = (x2 + m) // 2
-
- if u >= v:
- u -= v
- x1 -= x2
- else:
- v -= u
- x2 -= x1
-
- if u == 1:
- return x1 % m
- else:
- return x2 % m
-
- def point_multiply_windowed(self, k: int, P: ECCPoint, window_size: int = 4) -> ECCPoint:
- """
- 窗口方法的标量乘法
- 对大的标量值更高效
+ 窗口方法的标量乘法 (wNAF)
+ 对大的标量值更高效，window_size为wNAF窗口宽度，为None时按k的位数自适应选择
  """
  if k == 0:
  return ECCPoint(is_infinity=True)
 
- if k < 0:
- k = -k
- P = ECCPoint(P.x, (-P.y) % self.p)
-
  # 对于小的k值，直接使用预计算
- if P == self.G and k <= 8:
+ if P == self.G and 0 < k <= 8:
  return self.small_multiples[k]
 
- # 预计算窗口表: P, 2P, 3P, ..., (2^w-1)P
- window_mask = (1 << window_size) - 1
- precomputed = [ECCPoint(is_infinity=True)] * (1 << window_size)
- precomputed[1] = P
-
- for i in range(2, 1 << window_size):
- precomputed[i] = self.point_add(precomputed[i-1], P)
-
- # 从高位到低位处理
- result = ECCPoint(is_infinity=True)
- i = k.bit_length() - 1
-
- while i >= 0:
- # 找到下一个非零窗口
- if (k >> i) & 1 == 0:
- result = self.point_double(result)
- i -= 1
- else:
- # 提取窗口值
- window_end = max(0, i - window_size + 1)
- window_val = (k >> window_end) & window_mask
-
- # 左移到窗口位置
- for _ in range(i - window_end + 1):
- result = self.point_double(result)
-
- # 添加预计算的值
- if window_val > 0:
- result = self.point_add(result, precomputed[window_val])
-
- i = window_end - 1
-
- return result
+ return self.point_multiply_wnaf(k, P, window_size)
 
  def point_multiply_optimized(self, k: int, P: ECCPoint) -> ECCPoint:
  """
@@ -153,7 +72,7 @@ class PracticalOptimizedSM2Curve(SM2Curve):
  return self._binary_multiply_optimized(k, P)
 
  # 大的k值使用窗口方法
- return self.point_multiply_windowed(k, P, window_size=4)
+ return self.point_multiply_windowed(k, P)
 
  def _binary_multiply_optimized(self, k: int, P: ECCPoint) -> ECCPoint:
  """优化的二进制标量乘法"""
@@ -175,10 +94,6 @@ class PracticalOptimizedSM2Curve(SM2Curve):
  return result
 
  # 重写基类方法使用优化版本
- def mod_inverse(self, a: int, m: int) -> int:
- """使用快速模逆算法"""
- return self.mod_inverse_fast(a, m)
-
  def point_multiply(self, k: int, P: ECCPoint) -> ECCPoint:
  """使用优化的标量乘法"""
  return self.point_multiply_optimized(k, P)
@@ -203,45 +118,8 @@ class PracticalOptimizedSM2Signature(SM2Signature):
  # 计算消息杂凑值
  e = self._message_hash(message, public_key, user_id)
 
- # 预计算一些常用值以减少重复计算
- inv_factor_cache = {}
-
- max_attempts = 100 # 防止无限循环
- attempts = 0
-
- while attempts < max_attempts:
- attempts += 1
-
- # 生成随机数k
- k = random.randint(1, self.curve.n - 1)
-
- # 计算椭圆曲线点 (x1, y1) = [k]G
- point = self.curve.point_multiply(k, self.curve.G)
-
- # 计算r
- r = (e + point.x) % self.curve.n
-
- if r == 0 or (r + k) % self.curve.n == 0:
- continue
-
- # 计算s，使用缓存避免重复的模逆计算
- temp1 = (1 + private_key) % self.curve.n
-
- if temp1 in inv_factor_cache:
- temp1_inv = inv_factor_cache[temp1]
- else:
- temp1_inv = self.curve.mod_inverse(temp1, self.curve.n)
- inv_factor_cache[temp1] = temp1_inv
-
- temp2 = (k - r * private_key) % self.curve.n
- s = (temp1_inv * temp2) % self.curve.n
-
- if s == 0:
- continue
-
- return (r, s)
-
- raise RuntimeError(f"签名失败：在{max_attempts}次尝试后仍未生成有效签名")
+ # 模逆只在循环外计算一次，反复签名时使用SM2SigningKey保存
+ return self._sign_hash(e, private_key)
 
  def verify_optimized(self, message, signature: Tuple[int, int],
  public_key: ECCPoint, user_id: str = None) -> bool:
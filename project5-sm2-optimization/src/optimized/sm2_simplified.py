@@ -1,6 +1,6 @@
 """
 SM2椭圆曲线数字签名算法优化实现 - 简化版本
-主要优化: 快速模逆算法和简单预计算
+主要优化: 简单预计算 (模逆使用field_math中的共享实现)
 """
 
 import time
@@ -11,8 +11,13 @@ import os
 # 添加基础模块路径
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'basic'))
 
-from ecc_math import SM2Curve, ECCPoint
-from sm2_signature import SM2Signature
+# 能按包导入时与basic包共用同一份模块，否则两份ecc_math中的ECCPoint是不同的类型
+try:
+ from basic.ecc_math import SM2Curve, ECCPoint
+ from basic.sm2_signature import SM2Signature
+except ImportError:
+ from ecc_math import SM2Curve, ECCPoint
+ from sm2_signature import SM2Signature
 
 class SimplifiedOptimizedCurve(SM2Curve):
  """简化的SM2椭圆曲线优化实现"""
@@ -27,45 +32,12 @@ class SimplifiedOptimizedCurve(SM2Curve):
  print("预计算基点倍数...")
  start_time = time.time()
 
- self.base_multiples = {}
- current = self.G
-
- # 预计算 1G, 2G, 3G, ..., 16G
- for i in range(1, 17):
- self.base_multiples[i] = current
- if i < 16:
- current = self.point_add(current, self.G)
+ # 预计算 1G, 2G, 3G, ..., 16G (雅可比坐标累加，只做一次批量求逆)
+ self.base_multiples = dict(enumerate(self.multiples(self.G, 16), 1))
 
  end_time = time.time()
  print(f"预计算完成，耗时: {(end_time - start_time)*1000:.2f} ms")
 
- def mod_inverse_binary(self, a: int, m: int) -> int:
- """
- 二进制扩展欧几里得算法 - 更快的模逆实现
- """
- if a < 0:
- a = (a % m + m) % m
-
- if a == 1:
- return 1
- if a == 0:
- raise ValueError("0没有模逆")
-
- # 二进制GCD算法
- original_m = m
- y, x, last_x, last_y = 0, 1, 1, 0
-
- while a != 0:
- quotient = m // a
- m, a = a, m % a
- x, last_x = last_x - quotient * x, x
- y, last_y = last_y - quotient * y, y
-
- if m != 1:
- raise ValueError("模逆不存在")
-
- return (last_x % original_m + original_m) % original_m
-
  def point_multiply_optimized(self, k: int, P: ECCPoint) -> ECCPoint:
  """优化的标量乘法"""
  if k == 0:
@@ -102,10 +74,6 @@ class SimplifiedOptimizedCurve(SM2Curve):
  return result
 
  # 重写基类方法使用优化版本
- def mod_inverse(self, a: int, m: int) -> int:
- """使用优化的模逆算法"""
- return self.mod_inverse_binary(a, m)
-
  def point_multiply(self, k: int, P: ECCPoint) -> ECCPoint:
  """使用优化的标量乘法"""
  return self.point_multiply_optimized(k, P)
@@ -123,7 +91,6 @@ def test_simplified_optimization():
  print("开始测试简化优化版本...")
 
  # 创建实例
- from sm2_signature import SM2Signature
  basic_sm2 = SM2Signature()
  optimized_sm2 = SimplifiedOptimizedSM2()
 
@@ -5,15 +5,30 @@ SM2算法基础功能测试套件
 
 import sys
 import os
+import io
+import pickle
+import asyncio
+import functools
+import random
 import time
+import tempfile
 import traceback
+import signal
+import threading
 
 # 添加src路径到Python路径
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
 
-from basic.ecc_math import SM2Curve, ECCPoint, test_basic_operations
-from basic.sm3_hash import SM3Hash, sm3_hash, sm3_hexdigest, test_sm3
-from basic.sm2_signature import SM2Signature, test_sm2_signature
+from basic.ecc_math import (SM2Curve, ECCPoint, JacobianPoint, JACOBIAN_INFINITY, FixedBaseTable, get_fixed_base_table,
+ wnaf_digits, wnaf_width, test_basic_operations)
+from basic.sm3_hash import SM3Hash, sm3_hash, sm3_hexdigest, sm3_hash_many, sm3_hash_file, NUMPY_AVAILABLE, test_sm3
+from basic.sm2_signature import SM2Signature, SM2SigningKey, ZACache, PublicKeyCache, _SignerReplica, test_sm2_signature
+from basic.nonce_pool import NoncePool
+from basic.worker_pool import SM2WorkerPool, SignJob, VerifyJob
+from basic.async_sm2 import AsyncSM2
+from basic.instrumentation import instrument
+from basic.field_math import (STRATEGIES, REDUCTIONS, mod_inverse, batch_mod_inverse, sm2_reduce,
+ benchmark_inversion, benchmark_reduction)
 
 def test_curve_parameters():
  """测试SM2椭圆曲线参数"""
@@ -82,6 +97,823 @@ def test_point_operations():
 
  print("椭圆曲线点运算测试通过！")
 
+def test_fixed_base_table():
+ """测试固定基点预计算表"""
+ print("\n=== 测试固定基点预计算表 ===")
+
+ plain_curve = SM2Curve(fixed_base_window=0)
+ scalars = [1, 2, 15, 16, 17, 12345, plain_curve.n - 1, plain_curve.n + 5,
+ 0x123456789ABCDEF0123456789ABCDEF0123456789ABCDEF0123456789ABCDEF0]
+
+ for window in [1, 4, 5, 8]:
+ curve = SM2Curve(fixed_base_window=window)
+ for k in scalars:
+ expected = plain_curve.point_multiply(k, plain_curve.G)
+ assert curve.point_multiply(k, curve.G) == expected, f"窗口{window}, k={k}结果错误"
+ print(f" 窗口大小{window}: {curve.fixed_base_table.size()}个预计算点, 结果正确")
+
+ # 阶和负数标量
+ curve = SM2Curve()
+ assert curve.point_multiply(curve.n, curve.G).is_infinity, "n*G应该是无穷远点"
+ neg = curve.point_multiply(-3, curve.G)
+ pos = plain_curve.point_multiply(3, plain_curve.G)
+ assert neg == ECCPoint(pos.x, (-pos.y) % curve.p), "-3G结果错误"
+
+ # 同一窗口大小的表只构建一次
+ assert SM2Curve().fixed_base_table is SM2Signature().curve.fixed_base_table
+ assert get_fixed_base_table(curve, 4) is curve.fixed_base_table
+ print(" 固定基点表在实例间共享")
+
+ print("固定基点预计算表测试通过！")
+
+def test_jacobian_pipeline():
+ """测试雅可比坐标标量乘法只在最后做一次模逆"""
+ print("\n=== 测试雅可比坐标标量乘法 ===")
+
+ class CountingCurve(SM2Curve):
+ def __init__(self):
+ super().__init__(fixed_base_window=0)
+ self.inversions = 0
+
+ def mod_inverse(self, a, m):
+ self.inversions += 1
+ return super().mod_inverse(a, m)
+
+ curve = CountingCurve()
+ P = curve.point_double(curve.G)
+ Q = curve.point_add(P, curve.G)
+
+ # 仿射坐标下的逐步点加作为参照
+ expected = ECCPoint(is_infinity=True)
+ for k in range(1, 20):
+ expected = curve.point_add(expected, Q)
+ curve.inversions = 0
+ assert curve.point_multiply(k, Q) == expected, f"k={k}结果错误"
+ assert curve.inversions == 1, f"k={k}时模逆次数为{curve.inversions}"
+
+ # 雅可比坐标下的倍点、加法、混合加法与仿射结果一致
+ JP = curve._to_jacobian(P)
+ JQ = curve._to_jacobian(Q)
+ assert curve.point_double_jacobian(JP).to_affine(curve) == curve.point_double(P)
+ assert curve.point_add_jacobian(JP, JQ).to_affine(curve) == curve.point_add(P, Q)
+ assert curve.point_add_mixed(curve.point_double_jacobian(JP), Q).to_affine(curve) == \
+ curve.point_add(curve.point_double(P), Q)
+ assert curve.point_add_mixed(JQ, Q).to_affine(curve) == curve.point_double(Q)
+ neg_Q = ECCPoint(Q.x, (-Q.y) % curve.p)
+ assert curve.point_add_mixed(JQ, neg_Q).is_infinity(), "Q + (-Q)应该是无穷远点"
+
+ # 大标量、阶与无穷远点
+ # 大标量时wNAF奇数倍点表另需一次批量求逆
+ k = 0x123456789ABCDEF0123456789ABCDEF0123456789ABCDEF0123456789ABCDEF0
+ curve.inversions = 0
+ result = curve.point_multiply(k, Q)
+ assert curve.inversions == 2
+ assert curve.point_multiply(k % curve.n, Q) == result
+ assert curve.point_multiply(curve.n, Q).is_infinity, "n*Q应该是无穷远点"
+ assert curve.point_multiply(5, ECCPoint(is_infinity=True)).is_infinity
+ print(" 变基点乘法只在建表和最后转换时求逆")
+
+ # 固定基点路径同样只做一次模逆
+ curve.fixed_base_window = 4
+ curve.fixed_base_table
+ curve.inversions = 0
+ assert curve.point_multiply(k, curve.G) == SM2Curve(fixed_base_window=0).point_multiply(k, curve.G)
+ assert curve.inversions == 1
+ print(" 固定基点乘法每次只做一次模逆")
+
+ print("雅可比坐标标量乘法测试通过！")
+
+def test_point_representation():
+ """测试点对象的紧凑表示"""
+ print("\n=== 测试点对象表示 ===")
+
+ curve = SM2Curve()
+ P = curve.point_multiply(7, curve.G)
+
+ # 仿射点不可变、没有__dict__，可哈希
+ assert not hasattr(P, '__dict__')
+ for name in ('x', 'y', 'is_infinity', 'z'):
+ try:
+ setattr(P, name, 1)
+ assert False, "ECCPoint应不可修改"
+ except AttributeError:
+ pass
+ assert P == ECCPoint(P.x, P.y) and hash(P) == hash(ECCPoint(P.x, P.y))
+ assert len({P, ECCPoint(P.x, P.y), curve.G}) == 2
+
+ # 无穷远点是单例，pickle后仍是同一个对象
+ assert ECCPoint(is_infinity=True) is ECCPoint.INFINITY
+ assert curve.point_multiply(curve.n, P) is ECCPoint.INFINITY
+ assert pickle.loads(pickle.dumps(ECCPoint.INFINITY)) is ECCPoint.INFINITY
+ assert pickle.loads(pickle.dumps(P)) == P
+ print(" 仿射点不可变，无穷远点为单例")
+
+ # 雅可比坐标点就是 (X, Y, Z) 三元组，内核与包装方法结果一致
+ J = curve.point_multiply_jacobian(5, P)
+ assert isinstance(J, tuple) and J == (J.x, J.y, J.z)
+ assert JACOBIAN_INFINITY.is_infinity() and JACOBIAN_INFINITY == (1, 1, 0)
+ assert curve.point_double_jacobian(J) == curve._double_xyz(*J)
+ assert curve.point_add_mixed(J, P) == curve._add_mixed_xyz(*J, P.x, P.y)
+ assert curve.point_add_jacobian(J, J) == curve.point_double_jacobian(J)
+ assert curve.batch_to_affine([tuple(J), J]) == [J.to_affine(curve)] * 2
+ print(" 雅可比坐标点可与整数三元组互换")
+
+ print("点对象表示测试通过！")
+
+def test_batch_to_affine():
+ """测试雅可比坐标点的批量仿射转换"""
+ print("\n=== 测试批量仿射转换 ===")
+
+ curve = SM2Curve(fixed_base_window=0)
+ rng = random.Random(12)
+ scalars = [1, 2, 3, curve.n - 1] + [rng.randrange(1, curve.n) for _ in range(12)]
+ points = [curve.point_multiply_jacobian(k, curve.G) for k in scalars]
+ points.insert(3, JacobianPoint(1, 1, 0))
+ last = points[-1].to_affine(curve)
+ points.append(curve.point_add_mixed(points[-1], ECCPoint(last.x, (-last.y) % curve.p)))
+
+ with instrument(curve) as counter:
+ converted = curve.batch_to_affine(points)
+ assert counter.ops['mod_inverse'] == 1, "批量转换应只做一次模逆"
+ assert converted == [point.to_affine(curve) for point in points]
+ assert converted[3].is_infinity and converted[-1].is_infinity
+ assert curve.batch_to_affine([]) == []
+ assert curve.batch_to_affine([JacobianPoint(1, 1, 0)])[0].is_infinity
+
+ # 小倍数表: 一次模逆得到 P, 2P, ..., 16P
+ P = converted[5]
+ with instrument(curve) as counter:
+ multiples = curve.multiples(P, 16)
+ assert counter.ops['mod_inverse'] == 1
+ for i, point in enumerate(multiples, 1):
+ assert point == curve.point_multiply(i, P), f"{i}P结果错误"
+ print(f" {len(points)}个点共用1次模逆")
+
+ # 固定基点表整体只需两次模逆
+ with instrument(curve) as counter:
+ table = FixedBaseTable(curve, 4)
+ assert counter.ops['mod_inverse'] == 2, f"建表模逆次数为{counter.ops['mod_inverse']}"
+ assert table.table[1][2] == curve.point_multiply(3 << 4, curve.G)
+ print(f" 固定基点表{table.size()}个点共用2次模逆")
+
+ # 批量密钥生成
+ sm2 = SM2Signature()
+ with instrument(sm2) as counter:
+ keypairs = sm2.generate_keypairs(8)
+ assert counter.ops['mod_inverse'] == 1
+ for private_key, public_key in keypairs:
+ assert curve.is_point_on_curve(public_key)
+ assert public_key == curve.point_multiply(private_key, curve.G)
+ private_key, public_key = keypairs[0]
+ message = "批量生成的密钥"
+ assert sm2.verify(message, sm2.sign(message, private_key, public_key), public_key)
+ print(" 批量密钥生成8对密钥共用1次模逆")
+
+ print("批量仿射转换测试通过！")
+
+def test_wnaf_multiply():
+ """测试变基点wNAF标量乘法"""
+ print("\n=== 测试wNAF标量乘法 ===")
+
+ curve = SM2Curve(fixed_base_window=0)
+ P = curve.point_multiply(0xC0FFEE, curve.G)
+
+ def binary_multiply(k, Q):
+ # 仿射坐标的二进制展开法作为参照
+ result, addend = ECCPoint(is_infinity=True), Q
+ while k:
+ if k & 1:
+ result = curve.point_add(result, addend)
+ addend = curve.point_double(addend)
+ k >>= 1
+ return result
+
+ rng = random.Random(13)
+ scalars = [1, 2, 3, 31, 32, 33, curve.n - 1, rng.getrandbits(64), rng.randrange(1, curve.n)]
+ for k in scalars:
+ expected = binary_multiply(k, P)
+ for width in [None, 2, 3, 4, 5, 8]:
+ assert curve.point_multiply_wnaf(k, P, width) == expected, f"k={k}, width={width}"
+ neg = curve.point_multiply_wnaf(-k, P)
+ assert neg == ECCPoint(expected.x, (-expected.y) % curve.p), f"-{k}*P结果错误"
+ assert curve.point_multiply_wnaf(0, P).is_infinity
+ assert curve.point_multiply_wnaf(curve.n, P).is_infinity
+ try:
+ curve.point_multiply_wnaf(5, P, 9)
+ assert False, "应拒绝过大的窗口宽度"
+ except ValueError:
+ pass
+ print(" 各窗口宽度结果与二进制展开法一致")
+
+ # 奇数倍点表: 一次批量求逆
+ with instrument(curve) as counter:
+ table = curve.odd_multiples(P, 5)
+ assert counter.ops['mod_inverse'] == 1
+ assert table == [binary_multiply(2 * i + 1, P) for i in range(8)]
+
+ # 窗口宽度随标量位数自适应
+ widths = [wnaf_width(bits) for bits in (1, 8, 32, 64, 128, 256, 512)]
+ assert widths[0] == 2 and widths == sorted(widths)
+ assert 4 <= wnaf_width(256) <= 5
+
+ # 256位标量: 点加次数 (含建表) 比二进制展开法的 popcount(k) 次少40%以上
+ k = rng.randrange(1 << 255, curve.n)
+ with instrument(curve) as counter:
+ curve.point_multiply(k, P)
+ adds = counter.ops['point_add_mixed'] + counter.ops['point_add_jacobian']
+ assert adds < 0.6 * bin(k).count('1'), f"点加次数为{adds}"
+ print(f" 256位标量: 窗口宽度{wnaf_width(256)}, {adds}次点加, "
+ f"{counter.ops['point_double_jacobian']}次倍点, {counter.ops['mod_inverse']}次模逆")
+
+ print("wNAF标量乘法测试通过！")
+
+def test_double_scalar_multiply():
+ """测试双标量乘法 k1*P1 + k2*P2"""
+ print("\n=== 测试双标量乘法 ===")
+
+ # wNAF表示
+ for k in [1, 7, 255, 0xDEADBEEF, (1 << 256) - 1]:
+ for width in [2, 4, 5]:
+ digits = wnaf_digits(k, width)
+ assert sum(d << i for i, d in enumerate(digits)) == k
+ assert all(d == 0 or (d & 1 and abs(d) < (1 << (width - 1))) for d in digits)
+
+ curve = SM2Curve()
+ plain_curve = SM2Curve(fixed_base_window=0)
+ P = curve.point_multiply(0xABCDEF, curve.G)
+ Q = curve.point_multiply(0x13579BDF, curve.G)
+
+ def reference(k1, P1, k2, P2):
+ return curve.point_add(curve.point_multiply(k1, P1), curve.point_multiply(k2, P2))
+
+ scalars = [(1, 1), (0, 5), (5, 0), (3, curve.n - 1), (curve.n - 1, curve.n - 2),
+ (0x123456789ABCDEF0123456789ABCDEF0123456789ABCDEF0123456789ABCDEF0, 0xFEDCBA987654321)]
+ for k1, k2 in scalars:
+ expected = reference(k1, curve.G, k2, P)
+ assert curve.double_scalar_multiply(k1, curve.G, k2, P) == expected, f"k1={k1}, k2={k2}"
+ assert plain_curve.double_scalar_multiply(k1, curve.G, k2, P) == expected
+ assert curve.double_scalar_multiply(k1, P, k2, Q, width=4) == reference(k1, P, k2, Q)
+ print(" 基点+变基点、两个变基点结果正确")
+
+ # 结果为无穷远点以及退化情况
+ neg_G = ECCPoint(curve.gx, (-curve.gy) % curve.p)
+ assert curve.double_scalar_multiply(7, curve.G, 7, neg_G).is_infinity
+ assert curve.double_scalar_multiply(7, P, curve.n - 7, P).is_infinity
+ assert curve.double_scalar_multiply(2, curve.G, 3, curve.G) == curve.point_multiply(5, curve.G)
+ assert curve.double_scalar_multiply(0, curve.G, 0, P).is_infinity
+ assert curve.double_scalar_multiply(4, ECCPoint(is_infinity=True), 2, P) == curve.point_multiply(2, P)
+ print(" 退化情况处理正确")
+
+ # 签名验证使用双标量乘法
+ sm2 = SM2Signature()
+ private_key, public_key = sm2.generate_keypair()
+ signature = sm2.sign(b"double scalar", private_key)
+ assert sm2.verify(b"double scalar", signature, public_key)
+ assert not sm2.verify(b"double scalar!", signature, public_key)
+ digest = sm3_hash(b"double scalar")
+ assert sm2.verify_digest(digest, sm2.sign_digest(digest, private_key), public_key)
+
+ print("双标量乘法测试通过！")
+
+def test_verify_batch():
+ """测试批量签名验证"""
+ print("\n=== 测试批量签名验证 ===")
+
+ sm2 = SM2Signature()
+ curve = sm2.curve
+
+ # Montgomery批量求逆
+ values = [3, curve.gx, curve.gy, curve.p - 1, 12345]
+ for value, inverse in zip(values, curve.batch_mod_inverse(values, curve.p)):
+ assert (value * inverse) % curve.p == 1
+ assert curve.batch_mod_inverse([], curve.p) == []
+
+ keys = [sm2.generate_keypair() for _ in range(3)]
+ other_id = "414C494345313233405941484F4F2E434F4D"
+ items = []
+ for i in range(12):
+ private_key, public_key = keys[i % 3]
+ user_id = other_id if i % 4 == 0 else None
+ message = f"batch message {i}"
+ signature = sm2.sign(message, private_key, public_key, user_id)
+ items.append((message, signature, public_key, user_id))
+
+ # 构造各种无效签名
+ r, s = items[1][1]
+ items.append(("tampered", items[1][1], items[1][2], None)) # 消息被篡改
+ items.append((items[2][0], items[2][1], keys[0][1], None)) # 公钥不匹配
+ items.append((items[4][0], items[4][1], items[4][2], None)) # 用户标识不匹配
+ items.append((items[1][0], (r, (s + 1) % curve.n), items[1][2], None)) # s被修改
+ items.append((items[1][0], (0, s), items[1][2], None)) # r越界
+ items.append((items[1][0], (r, curve.n), items[1][2], None)) # s越界
+ items.append((items[1][0], (r, curve.n - r), items[1][2], None)) # t = 0
+
+ expected = [sm2.verify(m, sig, pk, uid) for m, sig, pk, uid in items]
+ assert expected == [True] * 12 + [False] * 7
+
+ assert sm2.verify_batch(items) == expected
+ assert sm2.verify_batch([]) == []
+ print(f" 单进程批量验证{len(items)}条结果与逐条验证一致")
+
+ # 进程池在首次使用时创建，之后的调用复用同一个
+ assert sm2.verify_batch(items, processes=2, chunk_size=5) == expected
+ pool = sm2._worker_pool
+ assert pool is not None and pool.processes == 2
+ assert sm2.verify_batch(items, processes=2, chunk_size=5) == expected
+ assert sm2._worker_pool is pool, "进程池应被复用"
+ sm2.close()
+ assert sm2._worker_pool is None
+ sm2.close()
+
+ # 也可以交给已有的工作池
+ with SM2WorkerPool(processes=2) as worker_pool:
+ assert sm2.verify_batch(items, chunk_size=5, pool=worker_pool) == expected
+ print(" 进程池分片验证结果一致")
+
+ # 工作进程中的签名对象保留类、曲线和用户标识，缓存按进程各自创建
+ class CustomSignature(SM2Signature):
+ pass
+ custom = CustomSignature(5, za_cache=ZACache(16),
+ key_cache=PublicKeyCache(memory_budget=1 << 20, min_uses=3, policy='lfu'))
+ custom.user_id = other_id
+ replica = _SignerReplica(custom)()
+ assert type(replica) is CustomSignature and replica.user_id == other_id
+ assert replica.curve.fixed_base_window == 5
+ assert replica.za_cache is not custom.za_cache and replica.za_cache.capacity == 16
+ assert replica.key_cache is not custom.key_cache
+ assert (replica.key_cache.policy, replica.key_cache.min_uses) == ('lfu', 3)
+ assert _SignerReplica(SM2Signature())().key_cache is None
+ restored = pickle.loads(pickle.dumps(_SignerReplica(sm2)))()
+ assert restored.verify_batch(items) == expected
+
+ print("批量签名验证测试通过！")
+
+def test_za_cache():
+ """测试ZA值缓存"""
+ print("\n=== 测试ZA值缓存 ===")
+
+ sm2 = SM2Signature(za_cache=ZACache(capacity=2))
+ keys = [sm2.generate_keypair()[1] for _ in range(3)]
+ other_id = "414C494345313233405941484F4F2E434F4D"
+
+ # 缓存结果与直接计算一致
+ za = sm2._za_value(keys[0])
+ assert za == sm2._compute_za(keys[0], sm2.user_id)
+ assert sm2._za_value(keys[0]) == za
+ assert sm2._za_value(keys[0], other_id) == sm2._compute_za(keys[0], other_id) != za
+ stats = sm2.za_cache.stats()
+ assert (stats['hits'], stats['misses'], stats['size']) == (1, 2, 2)
+
+ # LRU淘汰: keys[0]默认标识最近被使用过，写入第三项时淘汰 (keys[0], other_id)
+ sm2._za_value(keys[0])
+ sm2._za_value(keys[1])
+ assert len(sm2.za_cache) == 2
+ assert (keys[0].x, keys[0].y, sm2.user_id) in sm2.za_cache
+ assert (keys[0].x, keys[0].y, other_id) not in sm2.za_cache
+ print(f" LRU缓存统计: {sm2.za_cache.stats()}")
+
+ # 预热
+ warm = SM2Signature(za_cache=ZACache())
+ assert warm.warm_za_cache([keys[0], (keys[1], other_id), (keys[2], None)]) == 3
+ assert warm.warm_za_cache([keys[0]]) == 0
+ private_key, public_key = warm.generate_keypair()
+ warm.warm_za_cache([public_key])
+ signature = warm.sign(b"warm cache", private_key, public_key)
+ assert warm.verify(b"warm cache", signature, public_key)
+ assert warm.za_cache.stats()['misses'] == 0
+ print(" 预热后签名和验证均命中缓存")
+
+ # 容量为0时不缓存
+ uncached = SM2Signature(za_cache=ZACache(capacity=0))
+ assert uncached._za_value(keys[0]) == za
+ assert len(uncached.za_cache) == 0
+
+ # 默认共享缓存
+ assert SM2Signature().za_cache is SM2Signature().za_cache
+
+ print("ZA值缓存测试通过！")
+
+def test_key_cache():
+ """测试常用公钥预计算缓存"""
+ print("\n=== 测试公钥预计算缓存 ===")
+
+ cache = PublicKeyCache(min_uses=2)
+ sm2 = SM2Signature(za_cache=ZACache(), key_cache=cache)
+ assert SM2Signature().key_cache is None, "公钥缓存默认不启用"
+
+ private_key, public_key = sm2.generate_keypair()
+ message = b"repeat verifier"
+ signature = sm2.sign(message, private_key, public_key)
+ r, s = signature
+
+ # 第一次只记录出现次数，第二次建表，之后命中
+ for _ in range(4):
+ assert sm2.verify(message, signature, public_key)
+ assert not sm2.verify(message, (r, (s + 1) % sm2.curve.n), public_key)
+ stats = cache.stats()
+ assert public_key in cache and len(cache) == 1
+ assert stats['builds'] == 1 and stats['misses'] == 2 and stats['hits'] == 6
+ assert cache.peek(public_key).za[sm2.user_id] == sm2._compute_za(public_key, sm2.user_id)
+ assert sm2.cache_stats()['keys'] == cache.stats()
+
+ # 命中时 [s]G + [t]PA 完全由查表累加，不需要倍点
+ with instrument(sm2) as counter:
+ assert sm2.verify(message, signature, public_key)
+ assert counter.ops['point_double_jacobian'] == 0
+ assert counter.ops['mod_inverse'] == 1
+
+ digest = sm3_hash(b"digest")
+ assert sm2.verify_digest(digest, sm2.sign_digest(digest, private_key), public_key)
+ keys = [sm2.generate_keypair() for _ in range(3)]
+ items = [(message, sm2.sign(message, d, P), P, None) for d, P in keys + [(private_key, public_key)]]
+ items.append((message, (r, (s + 1) % sm2.curve.n), public_key, None))
+ assert sm2.verify_batch(items) == [True, True, True, True, False]
+ print(f" 缓存统计: {cache.stats()}")
+
+ # 内存上限只容纳两张表: LRU淘汰最久未使用的，LFU保留使用最多的
+ table_bytes = cache.peek(public_key).nbytes
+ signed = [(P, sm2.sign(message, d, P)) for d, P in keys]
+ for policy in PublicKeyCache.POLICIES:
+ bounded = PublicKeyCache(memory_budget=2 * table_bytes, min_uses=1, policy=policy)
+ verifier = SM2Signature(key_cache=bounded)
+ hot_key, hot_signature = signed[0]
+ for _ in range(3):
+ assert verifier.verify(message, hot_signature, hot_key)
+ for P, key_signature in signed[1:]:
+ assert verifier.verify(message, key_signature, P)
+ stats = bounded.stats()
+ assert stats['size'] == 2 and stats['evictions'] == 1 and stats['bytes'] <= 2 * table_bytes
+ assert (hot_key in bounded) == (policy == 'lfu'), f"{policy}淘汰了错误的公钥"
+ assert signed[2][0] in bounded
+ print(" LRU/LFU在内存上限内淘汰正确")
+
+ # LFU内存已满时，新公钥的出现次数追上常用公钥之前不建表，建好的表不会被立即淘汰
+ churn = PublicKeyCache(memory_budget=2 * table_bytes, min_uses=1, policy='lfu', decay_interval=10 ** 6)
+ for P in (signed[0][0], signed[1][0]):
+ for _ in range(4):
+ churn.lookup(sm2.curve, P)
+ new_key = signed[2][0]
+ results = [churn.lookup(sm2.curve, new_key) for _ in range(8)]
+ assert results[:3] == [None] * 3 and all(results[3:]), "新公钥的准入次数不正确"
+ assert churn.stats()['builds'] == 3 and churn.stats()['evictions'] == 1
+ assert new_key in churn
+
+ # 计数定期减半: 不再出现的常用公钥最终被新的常用公钥取代
+ aging = PublicKeyCache(memory_budget=2 * table_bytes, min_uses=1, policy='lfu', decay_interval=8)
+ for P in (signed[0][0], signed[1][0]):
+ for _ in range(50):
+ aging.lookup(sm2.curve, P)
+ for _ in range(12):
+ aging.lookup(sm2.curve, new_key)
+ assert new_key in aging and aging.stats()['builds'] == 3
+ print(" LFU准入和计数衰减正确")
+
+ # 内存上限为0时不建表
+ disabled = SM2Signature(key_cache=PublicKeyCache(memory_budget=0, min_uses=1))
+ assert disabled.verify(message, signature, public_key)
+ assert disabled.key_cache.stats()['builds'] == 0
+ for kwargs in ({'memory_budget': -1}, {'policy': 'fifo'}, {'window_size': 9}, {'decay_interval': 0}):
+ try:
+ PublicKeyCache(**kwargs)
+ assert False, f"应拒绝参数{kwargs}"
+ except ValueError:
+ pass
+
+ # 常用公钥的验签速度
+ plain = SM2Signature()
+ for label, verifier in (("无缓存", plain), ("公钥缓存", sm2)):
+ start = time.time()
+ for _ in range(5):
+ verifier.verify(message, signature, public_key)
+ print(f" {label}验签: {(time.time() - start) / 5 * 1000:.2f} ms")
+
+ print("公钥预计算缓存测试通过！")
+
+def test_nonce_pool():
+ """测试签名随机数预生成池"""
+ print("\n=== 测试签名随机数池 ===")
+
+ curve = SM2Curve()
+ with NoncePool(depth=16, low_watermark=4, batch_size=5, curve=curve) as pool:
+ assert pool.wait_full(timeout=30), "随机数池未能填满"
+ assert len(pool) == 16
+
+ # 每个随机数只取出一次，x1为[k]G的x坐标
+ nonces = [pool.take() for _ in range(12)]
+ assert len({k for k, _ in nonces}) == len(nonces)
+ for k, x1 in nonces[:3]:
+ assert curve.point_multiply(k, curve.G).x == x1
+ assert pool.wait_full(timeout=30), "低于低水位后应补满"
+ assert pool.stats()['refills'] >= 2
+
+ # 签名路径上不再计算[k]G
+ sm2 = SM2Signature(nonce_pool=pool)
+ private_key, public_key = sm2.generate_keypair()
+ with instrument(sm2) as counter:
+ signatures = [sm2.sign(b"pooled", private_key, public_key) for _ in range(4)]
+ assert counter.calls['sign'].get('point_multiply', 0) == 0
+ assert all(sm2.verify(b"pooled", signature, public_key) for signature in signatures)
+ assert len({r for r, _ in signatures}) == len(signatures)
+ digest = sm3_hash(b"pooled digest")
+ assert sm2.verify_digest(digest, sm2.sign_digest(digest, private_key), public_key)
+
+ # fork后的子进程丢弃继承来的随机数 (pid检测为后备路径)
+ inherited = set(pool._pool)
+ assert inherited
+ pool._pid = -1
+ assert pool.take() not in inherited
+ assert pool.stats()['discarded'] == len(inherited)
+ print(f" 统计: {pool.stats()}")
+
+ # 后台线程补充随机数 (持有锁) 时fork: 子进程的take不能死锁，且不会取到继承来的随机数
+ if hasattr(os, 'fork'):
+ with NoncePool(depth=8, low_watermark=2, batch_size=4, curve=curve) as pool:
+ assert pool.wait_full(timeout=30), "随机数池未能填满"
+ inherited = set(pool._pool)
+ holding, release = threading.Event(), threading.Event()
+
+ def refill_in_progress():
+ with pool._cond:
+ holding.set()
+ release.wait()
+
+ holder = threading.Thread(target=refill_in_progress)
+ holder.start()
+ holding.wait()
+ pid = os.fork()
+ if pid == 0:
+ signal.alarm(10) # 死锁时由SIGALRM结束子进程
+ ok = pool.take() not in inherited and pool.stats()['discarded'] == len(inherited)
+ os._exit(0 if ok else 1)
+ release.set()
+ holder.join()
+ _, status = os.waitpid(pid, 0)
+ assert os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0, "fork后子进程取随机数失败或死锁"
+
+ # 关闭后池为空，取随机数退化为同步生成
+ assert len(pool) == 0 and not pool._thread.is_alive()
+ misses = pool.misses
+ k, x1 = pool.take()
+ assert pool.misses == misses + 1 and curve.point_multiply(k, curve.G).x == x1
+
+ for kwargs in ({'depth': 0}, {'depth': 4, 'low_watermark': 4}, {'batch_size': 0}):
+ try:
+ NoncePool(start=False, **kwargs)
+ assert False, f"应拒绝参数{kwargs}"
+ except ValueError:
+ pass
+
+ print("签名随机数池测试通过！")
+
+def test_signing_key():
+ """测试预计算 (1 + dA)^(-1)、公钥和ZA的签名私钥对象"""
+ print("\n=== 测试签名私钥对象 ===")
+
+ sm2 = SM2Signature(za_cache=ZACache())
+ private_key, public_key = sm2.generate_keypair()
+ key = sm2.signing_key(private_key)
+ assert key.public_key == public_key
+ assert key.za == sm2._compute_za(public_key, sm2.user_id)
+
+ # 反复签名不再计算模逆、公钥和ZA
+ za_stats = sm2.za_cache.stats()
+ with instrument(sm2) as counter:
+ signatures = [key.sign(f"message {i}") for i in range(5)]
+ digest_signature = key.sign_digest(sm3_hash(b"digest"))
+ assert counter.ops['mod_inverse_secret'] == 0
+ assert counter.timing_summary('point_multiply')['count'] == 6, "每次签名只应计算[k]G"
+ assert sm2.za_cache.stats() == za_stats
+
+ # 与函数式接口互相验证
+ for i, signature in enumerate(signatures):
+ assert sm2.verify(f"message {i}", signature, public_key)
+ assert key.verify(f"message {i}", signature)
+ assert not key.verify("message 0", signatures[1])
+ assert sm2.verify_digest(sm3_hash(b"digest"), digest_signature, public_key)
+ assert key.verify("functional", sm2.sign("functional", private_key, public_key))
+
+ # 自定义用户标识和新生成的密钥
+ alice = SM2SigningKey.generate(sm2, user_id="414C494345313233405941484F4F2E434F4D")
+ signature = alice.sign(b"alice")
+ assert sm2.verify(b"alice", signature, alice.public_key, alice.user_id)
+ assert not sm2.verify(b"alice", signature, alice.public_key)
+
+ for bad_key in (0, sm2.curve.n - 1, sm2.curve.n):
+ try:
+ SM2SigningKey(bad_key, signer=sm2)
+ assert False, f"应拒绝私钥{bad_key}"
+ except ValueError:
+ pass
+
+ print("签名私钥对象测试通过！")
+
+def test_worker_pool():
+ """测试多进程签名/验签工作池"""
+ print("\n=== 测试多进程工作池 ===")
+
+ sm2 = SM2Signature()
+ keys = [sm2.generate_keypair() for _ in range(2)]
+ messages = [f"pooled job {i}".encode() for i in range(20)]
+
+ with SM2WorkerPool(processes=2, signer_factory=functools.partial(SM2Signature, 5),
+ chunk_size=3, max_pending=2) as pool:
+ # 签名任务与验签任务混合，结果按提交顺序给出
+ sign_jobs = [SignJob(m, *keys[i % 2]) for i, m in enumerate(messages)]
+ signatures = list(pool.imap(iter(sign_jobs)))
+ assert len(signatures) == len(messages)
+ for (message, private_key, public_key, _), signature in zip(sign_jobs, signatures):
+ assert sm2.verify(message, signature, public_key)
+
+ verify_jobs = [VerifyJob(m, sig, keys[i % 2][1]) for i, (m, sig) in enumerate(zip(messages, signatures))]
+ verify_jobs[3] = VerifyJob(messages[4], signatures[3], keys[1][1]) # 消息与公钥都不匹配
+ expected = [sm2.verify(*job) for job in verify_jobs]
+ assert expected.count(False) == 1
+ assert list(pool.imap(verify_jobs)) == expected
+ mixed = [job for pair in zip(sign_jobs[:5], verify_jobs[:5]) for job in pair]
+ mixed_results = list(pool.imap(mixed, chunk_size=4))
+ assert mixed_results[1::2] == expected[:5]
+ assert all(sm2.verify(job.message, sig, job.public_key) for job, sig in zip(sign_jobs, mixed_results[::2]))
+
+ # 按完成顺序给出 (序号, 结果)
+ unordered = dict(pool.imap_unordered(verify_jobs))
+ assert [unordered[i] for i in range(len(verify_jobs))] == expected
+
+ # 便捷接口与生成器输入
+ private_key, public_key = keys[0]
+ signed = pool.sign_many((m for m in messages[:4]), private_key)
+ assert pool.verify_many((m, sig, public_key) for m, sig in zip(messages, signed)) == [True] * 4
+ assert list(pool.imap([])) == []
+
+ try:
+ list(pool.imap([("not", "a", "job")]))
+ assert False, "应拒绝未知的任务类型"
+ except TypeError:
+ pass
+ print(" 顺序/乱序结果与单进程一致")
+
+ print("多进程工作池测试通过！")
+
+def test_async_frontend():
+ """测试asyncio前端"""
+ print("\n=== 测试asyncio前端 ===")
+
+ sm2 = SM2Signature()
+ private_key, public_key = sm2.generate_keypair()
+ messages = [f"async request {i}".encode() for i in range(24)]
+
+ async def scenario(executor):
+ frontend = AsyncSM2(executor, max_workers=1, signer_factory=functools.partial(SM2Signature, 5),
+ max_queue=4, batch_size=8)
+ async with frontend:
+ keypair = await frontend.generate_keypair()
+ assert sm2.curve.point_multiply(keypair[0], sm2.curve.G) == keypair[1]
+
+ # 并发提交: 队列只有4个位置，其余请求在put处等待
+ signatures = await asyncio.gather(*(frontend.sign(m, private_key, public_key) for m in messages))
+ tampered = list(signatures)
+ tampered[5] = (tampered[5][0], tampered[5][1] ^ 1)
+ results = await asyncio.gather(*(frontend.verify(m, sig, public_key)
+ for m, sig in zip(messages, tampered)))
+
+ # 批内有出错的请求时，异常只交给该请求
+ outcomes = await asyncio.gather(frontend.verify(messages[0], signatures[0], public_key),
+ frontend.verify(messages[0], None, public_key),
+ return_exceptions=True)
+ stats = frontend.stats()
+ try:
+ await frontend.sign(messages[0], private_key)
+ assert False, "关闭后应拒绝新请求"
+ except RuntimeError:
+ pass
+ return signatures, results, outcomes, stats
+
+ for executor in ('thread', 'process'):
+ signatures, results, outcomes, stats = asyncio.run(scenario(executor))
+ assert all(sm2.verify(m, sig, public_key) for m, sig in zip(messages, signatures))
+ assert results == [i != 5 for i in range(len(messages))]
+ assert outcomes[0] is True and isinstance(outcomes[1], TypeError)
+ assert stats['retries'] == 1
+ # 执行器繁忙时请求被打包，批次数少于请求数
+ assert 1 < stats['max_batch'] <= 8
+ assert stats['batches'] < stats['requests']
+ print(f" {executor}: {stats['requests']}个请求, {stats['batches']}批, 最大批次{stats['max_batch']}")
+
+ # 队列已满、提交方阻塞在put上时关闭: 每个请求都要结束 (完成或RuntimeError)，不能一直挂起
+ async def close_under_backpressure(steps):
+ frontend = AsyncSM2('thread', max_workers=1, max_queue=1, batch_size=2)
+ await frontend.start()
+ tasks = [asyncio.ensure_future(frontend.sign(m, private_key, public_key)) for m in messages[:6]]
+ for _ in range(steps):
+ await asyncio.sleep(0)
+ await frontend.close()
+ _, pending = await asyncio.wait(tasks, timeout=10)
+ for task in pending:
+ task.cancel()
+ return [task.exception() or task.result() for task in tasks if task not in pending], len(pending)
+
+ for steps in range(12):
+ outcomes, stranded = asyncio.run(close_under_backpressure(steps))
+ assert stranded == 0, f"关闭后有{stranded}个请求一直未返回"
+ for outcome, message in zip(outcomes, messages):
+ assert isinstance(outcome, RuntimeError) or sm2.verify(message, outcome, public_key)
+
+ try:
+ AsyncSM2('fiber')
+ assert False, "应拒绝未知的执行器类型"
+ except ValueError:
+ pass
+
+ print("asyncio前端测试通过！")
+
+def test_instrumentation():
+ """测试运算计数和计时插桩"""
+ print("\n=== 测试插桩统计 ===")
+
+ curve = SM2Curve()
+ P = curve.point_multiply(7, curve.G)
+
+ # 11的NAF为 [-1, 0, -1, 0, 1]: 4次倍点、2次混合加法、1次模逆
+ with instrument(curve) as counter:
+ assert curve.point_multiply(11, P) == curve.point_multiply(11, P)
+ assert counter.ops['point_double_jacobian'] == 8
+ assert counter.ops['point_add_mixed'] == 4
+ assert counter.ops['mod_inverse'] == 2
+ assert counter.timing_summary('point_multiply')['count'] == 2
+ assert counter.field_ops('point_multiply') == {'M': 64, 'S': 44, 'I': 2}
+
+ # 离开with块后恢复原方法
+ assert 'point_multiply' not in vars(curve)
+ assert 'point_double_jacobian' not in vars(curve)
+ curve.point_multiply(11, P)
+ assert counter.ops['mod_inverse'] == 2
+
+ # 签名对象: 按最外层高层调用归类
+ sm2 = SM2Signature()
+ private_key, public_key = sm2.generate_keypair()
+ with instrument(sm2) as counter:
+ signature = sm2.sign(b"instrumented", private_key, public_key)
+ for _ in range(3):
+ assert sm2.verify(b"instrumented", signature, public_key)
+ assert counter.timing_summary('sign')['count'] == 1
+ assert counter.timing_summary('verify')['count'] == 3
+ assert counter.calls['sign']['point_multiply'] == 1
+ assert counter.calls['verify']['double_scalar_multiply'] == 3
+ assert 'point_multiply' not in counter.timings
+ assert sum(counter.histogram('verify')) == 3
+ # 每次验签: 公钥奇数倍点表一次批量求逆 + 最后一次转换
+ assert counter.field_ops('verify')['I'] == 6
+ assert 'sign' not in vars(sm2) and 'mod_inverse' not in vars(sm2.curve)
+ print(counter.report())
+
+ print("插桩统计测试通过！")
+
+def test_field_math():
+ """测试共享模逆模块的各种策略"""
+ print("\n=== 测试模逆策略 ===")
+
+ curve = SM2Curve()
+ rng = random.Random(2024)
+ for m in (curve.p, curve.n):
+ values = [1, 2, m - 1] + [rng.randrange(1, m) for _ in range(20)]
+ for value in values:
+ expected = pow(value, -1, m)
+ for name, inverse in STRATEGIES.items():
+ assert inverse(value, m) == expected, f"{name}求逆错误"
+ assert inverse(value - m, m) == expected
+ assert batch_mod_inverse(values, m) == [pow(v, -1, m) for v in values]
+ assert curve.mod_inverse(12345, curve.n) == pow(12345, -1, curve.n)
+ assert curve.mod_inverse_secret(12345, curve.n) == pow(12345, -1, curve.n)
+
+ # 不可逆的元素
+ for name in ('pow', 'euclid', 'binary'):
+ for value, m in ((0, curve.p), (6, 9)):
+ try:
+ STRATEGIES[name](value, m)
+ assert False, f"{name}应拒绝不可逆元素"
+ except ValueError:
+ pass
+
+ # 迭代实现没有递归深度限制 (梅森素数 2^2203 - 1)
+ m = (1 << 2203) - 1
+ value = rng.randrange(1, m)
+ assert mod_inverse(value, m) == STRATEGIES['euclid'](value, m) == STRATEGIES['binary'](value, m)
+
+ results = benchmark_inversion(curve.p, samples=20, repeat=1)
+ assert set(results) == set(STRATEGIES)
+ print(" " + ", ".join(f"{name}: {cost:.1f}us" for name, cost in results.items()))
+
+ # SM2素数的Solinas约化
+ p = curve.p
+ values = [0, 1, p - 1, p, p + 1, 2 * p, (p - 1) ** 2, (1 << 512) - 1, (1 << 256) - 1]
+ values += [rng.randrange(p) * rng.randrange(p) for _ in range(200)]
+ for value in values:
+ assert sm2_reduce(value) == value % p, f"约化错误: {hex(value)}"
+ results = benchmark_reduction(samples=100, repeat=1)
+ assert set(results) == set(REDUCTIONS)
+ print(" " + ", ".join(f"{name}: {cost:.0f}ns" for name, cost in results.items()))
+
+ print("模逆策略测试通过！")
+
 def test_sm3_vectors():
  """测试SM3标准测试向量"""
  print("\n=== 测试SM3标准测试向量 ===")
@@ -102,6 +934,97 @@ def test_sm3_vectors():
 
  print("SM3标准测试向量验证通过！")
 
+def test_sm3_engine():
+ """测试SM3压缩函数和多消息并行杂凑"""
+ print("\n=== 测试SM3压缩引擎 ===")
+
+ # 按标准逐轮计算的参照压缩函数
+ def reference_compress(h, state, block):
+ w = [int.from_bytes(block[i:i + 4], 'big') for i in range(0, 64, 4)]
+ for i in range(16, 68):
+ w.append(h._p1(w[i - 16] ^ w[i - 9] ^ h._rotl(w[i - 3], 15)) ^ h._rotl(w[i - 13], 7) ^ w[i - 6])
+ A, B, C, D, E, F, G, H = state
+ for j in range(64):
+ SS1 = h._rotl((h._rotl(A, 12) + E + h._rotl(h.T[j], j % 32)) & 0xFFFFFFFF, 7)
+ SS2 = SS1 ^ h._rotl(A, 12)
+ TT1 = (h._ff(A, B, C, j) + D + SS2 + (w[j] ^ w[j + 4])) & 0xFFFFFFFF
+ TT2 = (h._gg(E, F, G, j) + H + SS1 + w[j]) & 0xFFFFFFFF
+ A, B, C, D, E, F, G, H = TT1, A, h._rotl(B, 9), C, h._p0(TT2), E, h._rotl(F, 19), G
+ return [x ^ y for x, y in zip(state, [A, B, C, D, E, F, G, H])]
+
+ h = SM3Hash()
+ state = list(h.iv)
+ for i in range(8):
+ block = os.urandom(64)
+ expected = reference_compress(h, state, block)
+ h.state = list(state)
+ h._compress(block)
+ assert h.state == expected, "压缩函数结果与逐轮计算不一致"
+ state = expected
+ print(" 压缩函数与逐轮计算结果一致")
+
+ # 512比特标准测试向量
+ assert sm3_hexdigest("abcd" * 16) == "debe9ff92275b8a138604889c18e5a4d6fdb70e5387e5765293dcba39c0c5732"
+
+ # 多消息杂凑 (混合长度)
+ messages = [os.urandom(length) for length in [0, 3, 55, 56, 64, 100] for _ in range(20)]
+ messages.append("abc")
+ expected = [sm3_hash(m) for m in messages]
+ assert sm3_hash_many(messages, use_numpy=False) == expected
+ assert sm3_hash_many([]) == []
+ if NUMPY_AVAILABLE:
+ assert sm3_hash_many(messages, use_numpy=True) == expected
+ assert sm3_hash_many(messages) == expected
+ print(" NumPy多路并行结果与逐条计算一致")
+ else:
+ print(" 未安装NumPy，跳过并行路径")
+
+ print("SM3压缩引擎测试通过！")
+
+def test_sm3_streaming():
+ """测试SM3分块更新和文件杂凑"""
+ print("\n=== 测试SM3流式接口 ===")
+
+ data = os.urandom(5000)
+ expected = sm3_hash(data)
+
+ # 任意分块方式结果相同，缓冲区始终不足一块
+ for step in [1, 7, 63, 64, 65, 1000]:
+ hasher = SM3Hash()
+ for i in range(0, len(data), step):
+ hasher.update(data[i:i + step])
+ assert len(hasher.buffer) < 64
+ assert hasher.digest() == expected, f"分块大小{step}结果错误"
+
+ # digest不改变状态，可以继续update
+ hasher = SM3Hash()
+ hasher.update(data[:100])
+ assert hasher.digest() == sm3_hash(data[:100])
+ hasher.update(bytearray(data[100:]))
+ assert hasher.digest() == expected
+ print(" 分块更新结果一致")
+
+ # 从流读取
+ hasher = SM3Hash()
+ assert hasher.update_from_stream(io.BytesIO(data), chunk_size=100) == len(data)
+ assert hasher.digest() == expected
+
+ # 文件杂凑 (分块读取和内存映射)
+ with tempfile.TemporaryDirectory() as tmpdir:
+ path = os.path.join(tmpdir, "data.bin")
+ with open(path, 'wb') as fp:
+ fp.write(data)
+ assert sm3_hash_file(path) == expected
+ assert sm3_hash_file(path, chunk_size=333) == expected
+ assert sm3_hash_file(path, use_mmap=True) == expected
+
+ empty = os.path.join(tmpdir, "empty.bin")
+ open(empty, 'wb').close()
+ assert sm3_hash_file(empty, use_mmap=True) == sm3_hash(b"")
+ print(" 流和文件杂凑结果一致")
+
+ print("SM3流式接口测试通过！")
+
 def test_sm2_standard_vectors():
  """测试SM2标准测试向量"""
  print("\n=== 测试SM2标准测试向量 ===")
@@ -221,10 +1144,27 @@ def run_all_tests():
  test_curve_parameters,
  test_basic_operations,
  test_point_operations,
+ test_fixed_base_table,
+ test_jacobian_pipeline,
+ test_point_representation,
+ test_batch_to_affine,
+ test_wnaf_multiply,
+ test_double_scalar_multiply,
  test_sm3,
  test_sm3_vectors,
+ test_sm3_engine,
+ test_sm3_streaming,
  test_sm2_signature,
  test_sm2_standard_vectors,
+ test_verify_batch,
+ test_za_cache,
+ test_key_cache,
+ test_nonce_pool,
+ test_signing_key,
+ test_worker_pool,
+ test_async_frontend,
+ test_instrumentation,
+ test_field_math,
  test_performance_basic,
  test_edge_cases,
  ]
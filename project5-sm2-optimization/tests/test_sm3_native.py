@@ -0,0 +1,211 @@
+"""
+SM3原生后端与纯Python后端一致性测试
+原生后端需要project4-sm3-optimization的共享库 (make shared)，共享库不存在时
+跳过本文件中依赖原生后端的测试。设置环境变量SM3_NATIVE_BUILD=1时，第一个需要
+原生后端的测试会先编译共享库；导入和收集本文件不会编译任何代码。
+"""
+
+import sys
+import os
+import io
+import random
+import tempfile
+import traceback
+
+import pytest
+
+# 添加src路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from basic.sm3_hash import (SM3Hash, sm3_hash, sm3_hexdigest, sm3_hash_file, sm3_hash_many,
+ set_backend, get_backend, _python_compress_blocks)
+from basic.sm3_native import load, build_library
+from basic.sm2_signature import SM2Signature
+
+# 共享库不存在时是否先编译 (需要make和C编译器，会写入project4的build目录)
+BUILD_NATIVE = os.environ.get('SM3_NATIVE_BUILD') == '1'
+
+def _native_backend(build: bool = False):
+ """加载原生后端，build为True且共享库不存在时先编译"""
+ native = load()
+ if native is None and build:
+ try:
+ native = load(build_library())
+ except RuntimeError as e:
+ print(f"无法编译SM3共享库: {e}")
+ return native
+
+@pytest.fixture(scope='session')
+def native():
+ """原生后端，不可用时跳过测试"""
+ backend = _native_backend(BUILD_NATIVE)
+ if backend is None:
+ pytest.skip("SM3原生后端不可用 (设置SM3_NATIVE_BUILD=1可自动编译共享库)")
+ return backend
+
+def _hash_with(backend, func, *args):
+ """在指定后端下调用func，结束后恢复原来的后端"""
+ previous = get_backend()
+ set_backend(backend)
+ try:
+ return func(*args)
+ finally:
+ set_backend(previous)
+
+def test_native_vectors(native):
+ """测试原生后端的标准测试向量"""
+ print("\n=== 测试原生后端标准向量 ===")
+
+ vectors = [
+ ("", "1ab21d8355cfa17f8e61194831e81a8f22bec8c728fefb747ed035eb5082aa2b"),
+ ("abc", "66c7f0f462eeedd9d1f2d46bdc10e4e24167c4875cf2f7a2297da02b8f4ba8e0"),
+ ("abcd" * 16, "debe9ff92275b8a138604889c18e5a4d6fdb70e5387e5765293dcba39c0c5732"),
+ ]
+ for message, expected in vectors:
+ assert _hash_with('native', sm3_hexdigest, message) == expected, f"原生后端向量失败: {message}"
+ print("原生后端标准向量测试通过！")
+
+def test_compress_blocks_parity(native):
+ """测试两个后端的分组压缩函数结果一致"""
+ print("\n=== 测试分组压缩函数一致性 ===")
+
+ rng = random.Random(2024)
+ for count in [1, 2, 7, 64]:
+ state = [rng.getrandbits(32) for _ in range(8)]
+ data = bytes(rng.getrandbits(8) for _ in range(count * 64 + 13))
+ for offset in [0, 13]:
+ expected = _python_compress_blocks(state, data, offset, count)
+ assert native.compress_blocks(state, data, offset, count) == expected
+ assert native.compress_blocks(state, bytearray(data), offset, count) == expected
+ assert native.compress_blocks(state, memoryview(data), offset, count) == expected
+ print("分组压缩函数一致性测试通过！")
+
+def test_backend_parity_lengths(native):
+ """测试0-300字节所有长度的杂凑结果一致"""
+ print("\n=== 测试各长度消息一致性 ===")
+
+ rng = random.Random(7)
+ for length in range(301):
+ data = bytes(rng.getrandbits(8) for _ in range(length))
+ assert _hash_with('native', sm3_hash, data) == _hash_with('python', sm3_hash, data), f"长度{length}不一致"
+ print("各长度消息一致性测试通过！")
+
+def test_backend_parity_streaming(native):
+ """测试分块更新、流和文件杂凑在两个后端下结果一致"""
+ print("\n=== 测试流式接口一致性 ===")
+
+ rng = random.Random(11)
+ data = os.urandom(20000)
+ expected = _hash_with('python', sm3_hash, data)
+
+ def chunked(source):
+ hasher = SM3Hash()
+ position = 0
+ while position < len(source):
+ step = rng.randint(1, 300)
+ hasher.update(source[position:position + step])
+ position += step
+ return hasher.digest()
+
+ assert _hash_with('native', chunked, data) == expected
+ assert _hash_with('native', chunked, bytearray(data)) == expected
+ assert _hash_with('native', chunked, memoryview(data)) == expected
+
+ def streamed():
+ hasher = SM3Hash()
+ hasher.update_from_stream(io.BytesIO(data), chunk_size=4096)
+ return hasher.digest()
+
+ assert _hash_with('native', streamed) == expected
+
+ with tempfile.TemporaryDirectory() as tmpdir:
+ path = os.path.join(tmpdir, "data.bin")
+ with open(path, 'wb') as fp:
+ fp.write(data)
+ assert _hash_with('native', sm3_hash_file, path) == expected
+ assert _hash_with('native', sm3_hash_file, path, 1000, True) == expected
+ print("流式接口一致性测试通过！")
+
+def test_backend_parity_large(native):
+ """测试1,000,000字节消息在两个后端下结果一致"""
+ print("\n=== 测试长消息一致性 ===")
+
+ data = b"a" * 1000000
+ native_digest = _hash_with('native', sm3_hash, data)
+ assert native_digest == _hash_with('python', sm3_hash, data)
+ print(f" 1,000,000个'a': {native_digest.hex()}")
+ print("长消息一致性测试通过！")
+
+def test_backend_interop(native):
+ """测试一个后端签名、另一个后端验证"""
+ print("\n=== 测试后端互操作 ===")
+
+ sm2 = SM2Signature()
+ private_key, public_key = sm2.generate_keypair()
+ message = b"native backend interop"
+
+ SM2Signature.za_cache.clear()
+ signature = _hash_with('native', sm2.sign, message, private_key, public_key)
+ SM2Signature.za_cache.clear()
+ assert _hash_with('python', sm2.verify, message, signature, public_key)
+
+ messages = [os.urandom(40) for _ in range(20)]
+ assert _hash_with('native', sm3_hash_many, messages) == [sm3_hash(m) for m in messages]
+ print("后端互操作测试通过！")
+
+def test_backend_selection():
+ """测试后端选择接口"""
+ print("\n=== 测试后端选择 ===")
+
+ previous = get_backend()
+ try:
+ assert set_backend('python') == 'python'
+ assert get_backend() == 'python'
+ assert sm3_hexdigest("abc") == "66c7f0f462eeedd9d1f2d46bdc10e4e24167c4875cf2f7a2297da02b8f4ba8e0"
+
+ expected = 'native' if load() is not None else 'python'
+ assert set_backend('auto') == expected
+
+ with pytest.raises(ValueError):
+ set_backend('gpu')
+ finally:
+ set_backend(previous)
+ print(f" 当前后端: {get_backend()}")
+ print("后端选择测试通过！")
+
+def run_all_tests():
+ """运行所有测试"""
+ print("开始运行SM3后端一致性测试...\n")
+
+ native = _native_backend(BUILD_NATIVE)
+ if native is None:
+ print("SM3原生后端不可用，只运行后端选择测试")
+
+ native_functions = []
+ if native is not None:
+ native_functions = [
+ test_native_vectors,
+ test_compress_blocks_parity,
+ test_backend_parity_lengths,
+ test_backend_parity_streaming,
+ test_backend_parity_large,
+ test_backend_interop,
+ ]
+ test_functions = native_functions + [test_backend_selection]
+
+ failed = 0
+ for test_func in test_functions:
+ try:
+ test_func(native) if test_func in native_functions else test_func()
+ print(f" {test_func.__name__} 通过")
+ except Exception as e:
+ failed += 1
+ print(f" {test_func.__name__} 失败: {str(e)}")
+ traceback.print_exc()
+
+ print(f"\n通过: {len(test_functions) - failed}, 失败: {failed}")
+ return failed == 0
+
+if __name__ == "__main__":
+ success = run_all_tests()
+ exit(0 if success else 1)
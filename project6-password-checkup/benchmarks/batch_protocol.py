@@ -0,0 +1,50 @@
+"""
+批量密码检查: 逐个请求 vs 一个批量请求
+- 逐个: 每个密码一次prepare/请求/响应/去盲化 (共用同一个服务端)
+- 批量: 一个请求携带N个盲化元素，盲化、服务端处理和去盲化都共用批量模逆
+改动前每个密码还要新建一个服务端 (重新做数据库的PBKDF2和加密)，其耗时单独列出
+"""
+
+import sys
+import os
+import time
+import contextlib
+import io
+
+# 添加项目路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src', 'crypto'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src', 'client'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src', 'server'))
+
+from password_client import PasswordCheckupClient
+from password_server import PasswordCheckupServer
+
+def timed(func) -> float:
+ start = time.perf_counter()
+ with contextlib.redirect_stdout(io.StringIO()):
+ func()
+ return time.perf_counter() - start
+
+def main(sizes=(1, 10, 50)):
+ with contextlib.redirect_stdout(io.StringIO()):
+ client = PasswordCheckupClient()
+ server = PasswordCheckupServer()
+ client._server = server
+ setup = timed(PasswordCheckupServer)
+
+ def one_by_one(passwords):
+ for password in passwords:
+ request = client.prepare_password_check(password)
+ client.process_server_response(server.process_client_request(request))
+
+ print("=== 批量密码检查 (秒) ===")
+ print(f"新建服务端 (改动前每个密码一次): {setup:.3f}\n")
+ print(f"{'密码数':<8}{'逐个请求':>10}{'批量请求':>10}{'加速比':>8}{'改动前(估计)':>14}")
+ for size in sizes:
+ passwords = [f"candidate-password-{i}" for i in range(size)]
+ single = timed(lambda: one_by_one(passwords))
+ batch = timed(lambda: client.batch_check_passwords(passwords))
+ print(f"{size:<8}{single:>10.3f}{batch:>10.3f}{single / batch:>8.2f}{single + size * setup:>14.3f}")
+
+if __name__ == "__main__":
+ main()
@@ -0,0 +1,52 @@
+"""
+服务端响应编码的对比
+- 逐个列出桶中的压缩点 (每个33字节，JSON中为66个十六进制字符)
+- Bloom过滤器 (每个元素约 1.44 log2(1/p) 位)
+输出响应大小和客户端查找耗时；作为参照，同时给出改为单次去盲化之前
+客户端对每个条目做点解压和去盲化的耗时估计
+"""
+
+import sys
+import os
+import secrets
+import timeit
+
+# 添加项目路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src', 'crypto'))
+
+from elliptic_curve import PasswordCheckupCrypto
+from bloom_filter import BloomFilter
+
+def main(sizes=(10, 100, 1000, 10000), rates=(1e-3, 1e-6)):
+ crypto = PasswordCheckupCrypto()
+ blind_factor = crypto.generate_blind_factor()
+ point = crypto.curve.hash_to_curve(b'response encoding')
+ encoded = crypto.point_to_bytes(point)
+
+ # 旧客户端对每个条目: 点解压 + 一次标量乘法去盲化
+ per_entry = min(timeit.repeat(
+ lambda: crypto.unblind_element(crypto.bytes_to_point(encoded), blind_factor), number=5, repeat=3)) / 5
+
+ print("=== 响应编码: 大小 (KB) / 客户端查找耗时 (ms) ===")
+ header = f"{'桶大小':<8}{'逐个解盲(估计)':>16}{'列表':>18}"
+ for rate in rates:
+ header += f"{f'Bloom p={rate:g}':>22}"
+ print(header)
+
+ for size in sizes:
+ bucket = [secrets.token_bytes(33) for _ in range(size)]
+ member = bucket[0]
+ response = [value.hex() for value in bucket]
+ list_bytes = sum(len(value) for value in response)
+ list_time = min(timeit.repeat(lambda: member.hex() in set(response), number=10, repeat=3)) / 10
+
+ row = f"{size:<8}{per_entry * size * 1000:>16.1f}{list_bytes / 1024:>9.1f}/{list_time * 1000:<8.3f}"
+ for rate in rates:
+ hex_filter = BloomFilter.from_items(bucket, rate).to_bytes().hex()
+ bloom_time = min(timeit.repeat(
+ lambda: member in BloomFilter.from_bytes(bytes.fromhex(hex_filter)), number=10, repeat=3)) / 10
+ row += f"{len(hex_filter) / 1024:>13.2f}/{bloom_time * 1000:<8.3f}"
+ print(row)
+
+if __name__ == "__main__":
+ main()
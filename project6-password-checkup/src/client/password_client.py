@@ -13,14 +13,26 @@ import os
 # 添加crypto模块路径
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'crypto'))
 
-from elliptic_curve import PasswordCheckupCrypto, ECPoint
+from elliptic_curve import PasswordCheckupCrypto, ECPoint, DEFAULT_PREFIX_BITS
+from bloom_filter import BloomFilter
 
 class PasswordCheckupClient:
  """Password Checkup协议客户端"""
 
- def __init__(self):
+ def __init__(self, prefix_bits: int = DEFAULT_PREFIX_BITS, response_format: str = 'bloom'):
+ """
+ Args:
+ prefix_bits: 请求中暴露的密码哈希前缀位数，须与服务端一致
+ response_format: 请求的响应格式，'bloom' (默认，Bloom过滤器，体积小，有很小的误判率)
+ 或 'list' (逐个列出桶中的条目，精确)；服务端对未指定格式的请求同样使用'bloom'
+ """
+ if response_format not in ('list', 'bloom'):
+ raise ValueError(f"未知的响应格式: {response_format}")
  self.crypto = PasswordCheckupCrypto()
+ self.prefix_bits = prefix_bits
+ self.response_format = response_format
  self.session_data = {}
+ self._server = None # 模拟通信时使用的服务端实例
  print("Password Checkup客户端初始化完成")
 
  def prepare_password_check(self, password: str, salt: bytes = b'password_checkup_salt') -> Dict[str, Any]:
@@ -32,7 +44,7 @@ class PasswordCheckupClient:
  salt: 盐值
 
  Returns:
- 包含盲化元素和会话信息的字典
+ 包含盲化元素、密码哈希前缀和会话信息的字典
  """
  print(f"准备检查密码（长度: {len(password)}）")
 
@@ -48,18 +60,25 @@ class PasswordCheckupClient:
  blinded_element = self.crypto.blind_element(password_hash, blind_factor)
  print(f"盲化完成: {blinded_element}")
 
- # 4. 保存会话数据
+ # 4. 计算哈希前缀，服务端只返回同一前缀桶中的条目 (k-匿名)
+ hash_prefix = self.crypto.hash_prefix(password_hash, self.prefix_bits)
+
+ # 5. 保存会话数据
  session_id = secrets.token_hex(16)
  self.session_data[session_id] = {
  'password_hash': password_hash,
  'blind_factor': blind_factor,
- 'blinded_element': blinded_element
+ 'blinded_element': blinded_element,
+ 'hash_prefix': hash_prefix
  }
 
- # 5. 构造请求
+ # 6. 构造请求
  request = {
  'session_id': session_id,
  'blinded_element': self.crypto.point_to_bytes(blinded_element).hex(),
+ 'hash_prefix': hash_prefix,
+ 'prefix_bits': self.prefix_bits,
+ 'response_format': self.response_format,
  'version': '1.0'
  }
 
@@ -77,7 +96,7 @@ class PasswordCheckupClient:
  True if password is compromised, False otherwise
  """
  session_id = response.get('session_id')
- if session_id not in self.session_data:
+ if session_id not in self.session_data or 'batch' in self.session_data[session_id]:
  raise ValueError("无效的会话ID")
 
  print(f"处理服务端响应，会话ID: {session_id}")
@@ -85,37 +104,23 @@ class PasswordCheckupClient:
  # 获取会话数据
  session = self.session_data[session_id]
 
- # 解析服务端返回的处理结果
+ # 第一个元素是服务端处理后的客户端元素 H(p)^(rk)；同一桶中的 H(p')^k
+ # 或者跟在后面逐个列出，或者编码在bloom_filter中
  processed_elements_hex = response.get('processed_elements', [])
- processed_elements = []
+ if not processed_elements_hex:
+ raise ValueError("响应中缺少处理后的客户端元素")
+ if response.get('hash_prefix', session['hash_prefix']) != session['hash_prefix']:
+ raise ValueError("响应的桶与请求不符")
 
- for elem_hex in processed_elements_hex:
- elem_bytes = bytes.fromhex(elem_hex)
- elem_point = self.crypto.bytes_to_point(elem_bytes)
- processed_elements.append(elem_point)
+ print(f"收到 {len(processed_elements_hex)} 个处理后的元素")
 
- print(f"收到 {len(processed_elements)} 个处理后的元素")
-
- # 对每个处理后的元素进行去盲化
- unblinded_elements = []
- for processed_point in processed_elements:
+ # 只需对客户端元素去盲化得到 H(p)^k，再在桶中查找
+ processed_point = self.crypto.bytes_to_point(bytes.fromhex(processed_elements_hex[0]))
  unblinded_point = self.crypto.unblind_element(processed_point, session['blind_factor'])
- unblinded_elements.append(unblinded_point)
-
- print(f"去盲化完成，得到 {len(unblinded_elements)} 个元素")
-
- # 计算用户密码的预期处理结果
- password_hash = session['password_hash']
- expected_point = self.crypto.curve.hash_to_curve(password_hash)
- server_key = response.get('server_key_hint') # 实际实现中不会直接传输
+ encrypted_hash = self.crypto.point_to_bytes(unblinded_point)
 
- # 为了演示，我们简化处理：检查是否有匹配的元素
- is_compromised = False
- for unblinded_point in unblinded_elements:
- # 在实际实现中，这里需要更复杂的匹配机制
- if self._points_match(unblinded_point, expected_point):
- is_compromised = True
- break
+ bucket = response if 'bloom_filter' in response else {'bucket_elements': processed_elements_hex[1:]}
+ is_compromised = self._bucket_contains(bucket, encrypted_hash)
 
  # 清理会话数据
  del self.session_data[session_id]
@@ -125,17 +130,101 @@ class PasswordCheckupClient:
 
  return is_compromised
 
- def _points_match(self, point1: ECPoint, point2: ECPoint) -> bool:
+ def _bucket_contains(self, bucket: Dict[str, Any], encrypted_hash: bytes) -> bool:
+ """在桶 (bucket_elements列表或Bloom过滤器) 中查找去盲化后的 H(p)^k"""
+ if 'bloom_filter' in bucket:
+ bloom = BloomFilter.from_bytes(bytes.fromhex(bucket['bloom_filter']))
+ print(f"查询Bloom过滤器（{bloom.nbytes()} 字节）")
+ return encrypted_hash in bloom
+ elements = set(bucket['bucket_elements'])
+ print(f"与桶中 {len(elements)} 个元素比较")
+ return encrypted_hash.hex() in elements
+
+ def prepare_batch_check(self, passwords: List[str], salt: bytes = b'password_checkup_salt') -> Dict[str, Any]:
+ """
+ 准备批量密码检查请求: N个盲化元素放在同一个请求中
+
+ Args:
+ passwords: 待检查的密码列表
+ salt: 盐值
+
+ Returns:
+ 批量请求，elements与passwords一一对应
+ """
+ print(f"准备批量检查 {len(passwords)} 个密码")
+
+ password_hashes = [self.crypto.hash_password(password, salt) for password in passwords]
+ blind_factors = [self.crypto.generate_blind_factor() for _ in passwords]
+ hash_prefixes = [self.crypto.hash_prefix(h, self.prefix_bits) for h in password_hashes]
+
+ # 盲化结果共用一次模逆转换为仿射坐标
+ blinded_elements = self.crypto.blind_elements(password_hashes, blind_factors)
+
+ session_id = secrets.token_hex(16)
+ self.session_data[session_id] = {
+ 'batch': [
+ {'password_hash': h, 'blind_factor': r, 'hash_prefix': prefix}
+ for h, r, prefix in zip(password_hashes, blind_factors, hash_prefixes)
+ ]
+ }
+
+ request = {
+ 'session_id': session_id,
+ 'elements': [
+ {'blinded_element': self.crypto.point_to_bytes(point).hex(), 'hash_prefix': prefix}
+ for point, prefix in zip(blinded_elements, hash_prefixes)
+ ],
+ 'prefix_bits': self.prefix_bits,
+ 'response_format': self.response_format,
+ 'version': '1.0'
+ }
+
+ print(f"批量请求准备完成，会话ID: {session_id}")
+ return request
+
+ def process_batch_response(self, response: Dict[str, Any]) -> List[bool]:
  """
- 检查两个椭圆曲线点是否匹配
- 实际实现中需要考虑服务端密钥处理
+ 处理批量响应
+
+ Args:
+ response: 服务端的批量响应
+
+ Returns:
+ 与请求中的密码一一对应的泄露状态列表
  """
- # 简化的匹配逻辑，实际实现更复杂
- return point1 == point2
+ session_id = response.get('session_id')
+ session = self.session_data.get(session_id)
+ if session is None or 'batch' not in session:
+ raise ValueError("无效的会话ID")
+
+ items = session['batch']
+ processed_hex = response.get('processed_elements', [])
+ if len(processed_hex) != len(items):
+ raise ValueError("响应中的元素数量与请求不符")
+
+ print(f"处理批量响应，会话ID: {session_id}，元素数量: {len(items)}")
+
+ # 所有盲化因子共用一次模逆，去盲化结果再共用一次模逆转换为仿射坐标
+ processed_points = [self.crypto.bytes_to_point(bytes.fromhex(h)) for h in processed_hex]
+ unblinded_points = self.crypto.unblind_elements(processed_points,
+ [item['blind_factor'] for item in items])
+
+ buckets = response.get('buckets', {})
+ results = []
+ for item, point in zip(items, unblinded_points):
+ bucket = buckets.get(str(item['hash_prefix']))
+ if bucket is None:
+ raise ValueError(f"响应中缺少桶 {item['hash_prefix']}")
+ results.append(self._bucket_contains(bucket, self.crypto.point_to_bytes(point)))
+
+ del self.session_data[session_id]
+
+ print(f"批量检查结果: {sum(results)}/{len(results)} 个密码已泄露")
+ return results
 
  def batch_check_passwords(self, passwords: List[str]) -> Dict[str, bool]:
  """
- 批量检查多个密码
+ 批量检查多个密码 (一个请求、一个响应)
 
  Args:
  passwords: 密码列表
@@ -144,38 +233,37 @@ class PasswordCheckupClient:
  密码泄露状态字典
  """
  print(f"开始批量检查 {len(passwords)} 个密码")
+ if not passwords:
+ return {}
 
- results = {}
- for i, password in enumerate(passwords):
- print(f"检查密码 {i+1}/{len(passwords)}")
-
- # 准备请求
- request = self.prepare_password_check(password)
+ request = self.prepare_batch_check(passwords)
 
  # 模拟服务端响应（在实际实现中需要网络通信）
- response = self._simulate_server_response(request)
+ response = self._simulated_server().process_batch_request(request)
 
- # 处理响应
- is_compromised = self.process_server_response(response)
- results[password] = is_compromised
+ results = dict(zip(passwords, self.process_batch_response(response)))
 
  print(f"批量检查完成，共检查 {len(passwords)} 个密码")
  return results
 
- def _simulate_server_response(self, request: Dict[str, Any]) -> Dict[str, Any]:
+ def _simulated_server(self):
  """
- 模拟服务端响应（用于测试）
+ 模拟通信使用的服务端（用于测试），首次使用时创建，之后复用
  实际实现中需要通过网络与服务端通信
  """
+ if self._server is None:
  # 导入服务端模块进行模拟
  sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'server'))
  from password_server import PasswordCheckupServer
+ self._server = PasswordCheckupServer()
+ return self._server
 
- # 创建服务端实例
- server = PasswordCheckupServer()
-
- # 处理请求
- return server.process_client_request(request)
+ def _simulate_server_response(self, request: Dict[str, Any]) -> Dict[str, Any]:
+ """
+ 模拟服务端响应（用于测试）
+ 实际实现中需要通过网络与服务端通信
+ """
+ return self._simulated_server().process_client_request(request)
 
  def check_password_strength(self, password: str) -> Dict[str, Any]:
  """
@@ -0,0 +1,103 @@
+"""
+服务端响应使用的Bloom过滤器
+
+服务端不再逐个发送桶中的 H(p)^k (每个33字节的压缩点)，而是把它们插入一个
+Bloom过滤器后发送位数组。客户端对自己的元素去盲化一次，得到 H(p)^k 后查询过滤器。
+
+- 每个元素先经SHA-256截断为两个64位值h1、h2，第i个位置为 (h1 + i*h2) mod m
+ (双重哈希，效果等同于k个独立哈希函数)
+- 对n个元素、误判率p，位数 m = -n ln p / (ln 2)^2，哈希函数个数 k = (m/n) ln 2，
+ 每个元素约占 1.44 log2(1/p) 位，与点的长度无关
+- 过滤器没有漏判；误判 (未泄露的密码被报告为泄露) 的概率约为p
+
+序列化格式: 位数m (4字节小端) + 哈希函数个数k (1字节) + 位数组
+"""
+
+import hashlib
+import math
+import struct
+from typing import Iterable
+
+HEADER = struct.Struct('<IB')
+
+# 位数组的最小长度，避免空桶得到0位的过滤器
+MIN_BITS = 8
+
+class BloomFilter:
+ """定长位数组上的Bloom过滤器"""
+
+ def __init__(self, num_bits: int, num_hashes: int):
+ """
+ Args:
+ num_bits: 位数组长度m
+ num_hashes: 哈希函数个数k
+ """
+ if num_bits < 1 or not 1 <= num_hashes <= 255:
+ raise ValueError("无效的Bloom过滤器参数")
+ self.num_bits = num_bits
+ self.num_hashes = num_hashes
+ self.bits = bytearray((num_bits + 7) // 8)
+
+ @classmethod
+ def for_capacity(cls, capacity: int, false_positive_rate: float) -> 'BloomFilter':
+ """
+ 按元素个数和目标误判率选择参数
+
+ Args:
+ capacity: 预计插入的元素个数
+ false_positive_rate: 目标误判率，0 < p < 1
+ """
+ if not 0 < false_positive_rate < 1:
+ raise ValueError("误判率必须在0和1之间")
+ capacity = max(capacity, 1)
+ num_bits = max(MIN_BITS, math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+ num_hashes = min(255, max(1, round(num_bits / capacity * math.log(2))))
+ return cls(num_bits, num_hashes)
+
+ @classmethod
+ def from_items(cls, items: Iterable[bytes], false_positive_rate: float) -> 'BloomFilter':
+ """用一组元素构建过滤器"""
+ items = list(items)
+ bloom = cls.for_capacity(len(items), false_positive_rate)
+ for item in items:
+ bloom.add(item)
+ return bloom
+
+ def _positions(self, item: bytes):
+ """元素对应的k个位置 (双重哈希)"""
+ digest = hashlib.sha256(b'password-checkup-bloom' + item).digest()
+ h1 = int.from_bytes(digest[:8], 'little')
+ h2 = int.from_bytes(digest[8:16], 'little') | 1
+ m = self.num_bits
+ return [(h1 + i * h2) % m for i in range(self.num_hashes)]
+
+ def add(self, item: bytes):
+ """插入元素"""
+ bits = self.bits
+ for position in self._positions(item):
+ bits[position >> 3] |= 1 << (position & 7)
+
+ def __contains__(self, item: bytes) -> bool:
+ """元素是否可能在集合中 (有误判，无漏判)"""
+ bits = self.bits
+ return all(bits[position >> 3] >> (position & 7) & 1 for position in self._positions(item))
+
+ def to_bytes(self) -> bytes:
+ """序列化为字节串"""
+ return HEADER.pack(self.num_bits, self.num_hashes) + bytes(self.bits)
+
+ @classmethod
+ def from_bytes(cls, data: bytes) -> 'BloomFilter':
+ """从字节串恢复过滤器"""
+ if len(data) < HEADER.size:
+ raise ValueError("Bloom过滤器数据不完整")
+ num_bits, num_hashes = HEADER.unpack_from(data)
+ bloom = cls(num_bits, num_hashes)
+ if len(data) != HEADER.size + len(bloom.bits):
+ raise ValueError("Bloom过滤器长度与位数不符")
+ bloom.bits[:] = data[HEADER.size:]
+ return bloom
+
+ def nbytes(self) -> int:
+ """序列化后的字节数"""
+ return HEADER.size + len(self.bits)
@@ -5,15 +5,42 @@
 
 import hashlib
 import secrets
-from typing import Tuple, List, Optional
+import sys
+import os
+from typing import Dict, Tuple, List, Optional
+
+# 模逆运算和wNAF分解与project5的SM2实现共用field_math/ecc_math模块
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..',
+ 'project5-sm2-optimization', 'src', 'basic'))
+
+from field_math import mod_inverse, mod_inverse_secret, batch_mod_inverse
+from ecc_math import wnaf_digits, wnaf_width
 
 class ECPoint:
- """椭圆曲线点表示"""
+ """
+ 椭圆曲线点表示 (不可变)
+ 坐标存放在__slots__中，无穷远点是单例ECPoint.INFINITY
+ """
+
+ __slots__ = ('x', 'y', 'is_infinity')
+
+ def __new__(cls, x: Optional[int] = None, y: Optional[int] = None, is_infinity: bool = False):
+ if is_infinity and _INFINITY is not None:
+ return _INFINITY
+ point = object.__new__(cls)
+ _set_x(point, x)
+ _set_y(point, y)
+ _set_infinity(point, is_infinity)
+ return point
+
+ def __setattr__(self, name, value):
+ raise AttributeError("ECPoint是不可变对象")
+
+ def __delattr__(self, name):
+ raise AttributeError("ECPoint是不可变对象")
 
- def __init__(self, x: Optional[int] = None, y: Optional[int] = None, is_infinity: bool = False):
- self.x = x
- self.y = y
- self.is_infinity = is_infinity
+ def __reduce__(self):
+ return ECPoint, (self.x, self.y, self.is_infinity)
 
  def __eq__(self, other):
  if not isinstance(other, ECPoint):
@@ -22,18 +49,113 @@ class ECPoint:
  self.y == other.y and
  self.is_infinity == other.is_infinity)
 
+ def __hash__(self):
+ return hash((self.x, self.y, self.is_infinity))
+
  def __repr__(self):
  if self.is_infinity:
  return "ECPoint(∞)"
  return f"ECPoint({self.x}, {self.y})"
 
+# 绕过__setattr__直接写入槽位，只在ECPoint.__new__中使用
+_set_x = ECPoint.x.__set__
+_set_y = ECPoint.y.__set__
+_set_infinity = ECPoint.is_infinity.__set__
+
+_INFINITY = None
+_INFINITY = ECPoint.INFINITY = ECPoint(is_infinity=True)
+
+# 雅可比坐标的无穷远点 (Z = 0)
+_JACOBIAN_INFINITY = (1, 1, 0)
+
+class CombTable:
+ """
+ 基点G的Lim-Lee梳状预计算表
+
+ 把256位标量分成t段 (t为齿数)，每段d = ceil(256/t)位，预计算
+ table[s] = sum(2^(i*d) * G, s的第i位为1)，1 <= s < 2^t。
+ 计算k*G时从高到低扫描d列，每列倍点一次，再把各段在这一列的比特
+ 拼成s查表做一次混合加法，共d次倍点和至多d次点加。
+ """
+
+ def __init__(self, curve: 'P256Curve', teeth: int = 8):
+ """
+ Args:
+ curve: 用于构建表的曲线
+ teeth: 齿数t (1-8)，表中有 2^t - 1 个点
+ """
+ if not 1 <= teeth <= 8:
+ raise ValueError("梳状表齿数必须在1-8之间")
+ self.teeth = teeth
+ self.columns = (curve.n.bit_length() + teeth - 1) // teeth
+ self.n = curve.n
+ self.table = self._build_table(curve)
+
+ def _build_table(self, curve: 'P256Curve') -> List[Optional[Tuple[int, int]]]:
+ """先倍点得到各段的基点 2^(i*d) * G，再逐个累加出所有子集和，最后批量转为仿射坐标"""
+ double = curve._double_xyz
+ add_mixed = curve._add_mixed_xyz
+
+ X, Y, Z = curve.gx, curve.gy, 1
+ bases = [(X, Y, Z)]
+ for _ in range(self.teeth - 1):
+ for _ in range(self.columns):
+ X, Y, Z = double(X, Y, Z)
+ bases.append((X, Y, Z))
+ bases = curve._batch_to_affine_xy(bases)
+
+ sums = [_JACOBIAN_INFINITY]
+ for s in range(1, 1 << self.teeth):
+ low = (s & -s).bit_length() - 1
+ X, Y, Z = sums[s ^ (1 << low)]
+ x, y = bases[low]
+ sums.append(add_mixed(X, Y, Z, x, y))
+ return [None] + curve._batch_to_affine_xy(sums[1:])
+
+ def multiply_xyz(self, curve: 'P256Curve', k: int) -> Tuple[int, int, int]:
+ """k*G，结果为雅可比坐标三元组"""
+ k %= self.n
+ d = self.columns
+ mask = (1 << d) - 1
+ segments = [(k >> (i * d)) & mask for i in range(self.teeth)]
+
+ double = curve._double_xyz
+ add_mixed = curve._add_mixed_xyz
+ table = self.table
+ X, Y, Z = _JACOBIAN_INFINITY
+ for column in range(d - 1, -1, -1):
+ X, Y, Z = double(X, Y, Z)
+ s = 0
+ for i, segment in enumerate(segments):
+ s |= ((segment >> column) & 1) << i
+ if s:
+ x, y = table[s]
+ X, Y, Z = add_mixed(X, Y, Z, x, y)
+ return X, Y, Z
+
+# 梳状表只与曲线参数和齿数有关，构建一次后由所有曲线实例共享
+_comb_tables: Dict[int, CombTable] = {}
+
 class P256Curve:
  """
  NIST P-256椭圆曲线实现
  用于Password Checkup协议的密码学运算
+
+ 标量乘法在雅可比坐标下进行，只在返回结果时求一次逆:
+ - 基点G使用共享的梳状预计算表 (CombTable)
+ - 其他点 (盲化、服务端处理、去盲化) 使用wNAF，奇数倍点表批量转为仿射坐标后做混合加法
+ - P-256的 a = -3，倍点中的 3X^2 + aZ^4 化为 3(X - Z^2)(X + Z^2)
+
+ P-256素数也可以做Solinas约化 (见field_math.p256_reduce)，但CPython中比
+ C实现的 x % p 慢约8倍，因此内核仍使用 % p。CPython的大整数运算本身不是
+ 常数时间的，这里只保证秘密值的模逆走盲化路径 (mod_inverse_secret)。
  """
 
- def __init__(self):
+ def __init__(self, comb_teeth: int = 8):
+ """
+ Args:
+ comb_teeth: 基点G梳状表的齿数 (1-8)，表中有 2^t - 1 个点
+ """
  # NIST P-256参数
  self.p = 0xffffffff00000001000000000000000000000000ffffffffffffffffffffffff
  self.a = -3
@@ -44,27 +166,25 @@ class P256Curve:
  self.gx = 0x6b17d1f2e12c4247f8bce6e563a440f277037d812deb33a0f4a13945d898c296
  self.gy = 0x4fe342e2fe1a7f9b8ee7eb4a7c0f9e162bce33576b315ececbb6406837bf51f5
  self.G = ECPoint(self.gx, self.gy)
+ self.comb_teeth = comb_teeth
 
  print("P-256椭圆曲线初始化完成")
 
- def mod_inverse(self, a: int, m: int) -> int:
- """计算模逆元 a^(-1) mod m"""
- if a < 0:
- a = (a % m + m) % m
-
- def extended_gcd(a, b):
- if a == 0:
- return b, 0, 1
- gcd, x1, y1 = extended_gcd(b % a, a)
- x = y1 - (b // a) * x1
- y = x1
- return gcd, x, y
+ @property
+ def comb_table(self) -> CombTable:
+ """基点G的梳状表 (首次使用时构建，所有实例共享)"""
+ table = _comb_tables.get(self.comb_teeth)
+ if table is None:
+ table = _comb_tables[self.comb_teeth] = CombTable(self, self.comb_teeth)
+ return table
 
- gcd, x, _ = extended_gcd(a, m)
- if gcd != 1:
- raise ValueError("模逆元不存在")
+ def mod_inverse(self, a: int, m: int) -> int:
+ """计算模逆元 a^(-1) mod m (公开值)"""
+ return mod_inverse(a, m)
 
- return (x % m + m) % m
+ def mod_inverse_secret(self, a: int, m: int) -> int:
+ """计算秘密值的模逆元 a^(-1) mod m，使用乘法盲化"""
+ return mod_inverse_secret(a, m)
 
  def point_add(self, P: ECPoint, Q: ECPoint) -> ECPoint:
  """椭圆曲线点加法 P + Q"""
@@ -72,54 +192,216 @@ class P256Curve:
  return Q
  if Q.is_infinity:
  return P
+ return self._to_point(self._add_xy(P.x, P.y, Q.x, Q.y))
 
- if P.x == Q.x:
- if P.y == Q.y:
- return self.point_double(P)
- else:
- return ECPoint(is_infinity=True) # P + (-P) = ∞
+ def point_double(self, P: ECPoint) -> ECPoint:
+ """椭圆曲线点倍乘 2P"""
+ if P.is_infinity:
+ return P
+ return self._to_point(self._double_xy(P.x, P.y))
+
+ # 以下两个仿射内核返回 (x, y) 或表示无穷远点的None，每次运算一次模逆，
+ # 只用于单次的point_add/point_double；标量乘法使用后面的雅可比内核
+
+ def _to_point(self, xy: Optional[Tuple[int, int]]) -> ECPoint:
+ return ECPoint.INFINITY if xy is None else ECPoint(xy[0], xy[1])
+
+ def _add_xy(self, x1: int, y1: int, x2: int, y2: int) -> Optional[Tuple[int, int]]:
+ """仿射点加法内核"""
+ if x1 == x2:
+ if y1 == y2:
+ return self._double_xy(x1, y1)
+ return None # P + (-P) = ∞
 
  # 计算斜率 s = (y2 - y1) / (x2 - x1)
- s = ((Q.y - P.y) * self.mod_inverse(Q.x - P.x, self.p)) % self.p
+ s = ((y2 - y1) * self.mod_inverse(x2 - x1, self.p)) % self.p
 
  # 计算新点坐标
- x3 = (s * s - P.x - Q.x) % self.p
- y3 = (s * (P.x - x3) - P.y) % self.p
+ x3 = (s * s - x1 - x2) % self.p
+ y3 = (s * (x1 - x3) - y1) % self.p
 
- return ECPoint(x3, y3)
+ return x3, y3
 
- def point_double(self, P: ECPoint) -> ECPoint:
- """椭圆曲线点倍乘 2P"""
- if P.is_infinity:
- return P
+ def _double_xy(self, x: int, y: int) -> Optional[Tuple[int, int]]:
+ """仿射倍点内核"""
+ if y == 0:
+ return None
 
  # 计算斜率 s = (3x² + a) / (2y)
- s = ((3 * P.x * P.x + self.a) * self.mod_inverse(2 * P.y, self.p)) % self.p
+ s = ((3 * x * x + self.a) * self.mod_inverse(2 * y, self.p)) % self.p
 
  # 计算新点坐标
- x3 = (s * s - 2 * P.x) % self.p
- y3 = (s * (P.x - x3) - P.y) % self.p
+ x3 = (s * s - 2 * x) % self.p
+ y3 = (s * (x - x3) - y) % self.p
+
+ return x3, y3
+
+ # 以下三个内核在雅可比坐标 (X, Y, Z) 上运算，x = X/Z^2, y = Y/Z^3，Z = 0为无穷远点
+
+ def _double_xyz(self, X1: int, Y1: int, Z1: int) -> Tuple[int, int, int]:
+ """雅可比倍点内核，利用 a = -3: M = 3(X - Z^2)(X + Z^2)"""
+ if Z1 == 0 or Y1 == 0:
+ return _JACOBIAN_INFINITY
+
+ p = self.p
+ Z1_sq = (Z1 * Z1) % p
+ Y1_sq = (Y1 * Y1) % p
+ S = (4 * X1 * Y1_sq) % p
+ M = (3 * (X1 - Z1_sq) * (X1 + Z1_sq)) % p
+
+ X3 = (M * M - 2 * S) % p
+ Y3 = (M * (S - X3) - 8 * Y1_sq * Y1_sq) % p
+ Z3 = (2 * Y1 * Z1) % p
+
+ return X3, Y3, Z3
+
+ def _add_xyz(self, X1: int, Y1: int, Z1: int, X2: int, Y2: int, Z2: int) -> Tuple[int, int, int]:
+ """雅可比加法内核"""
+ if Z1 == 0:
+ return X2, Y2, Z2
+ if Z2 == 0:
+ return X1, Y1, Z1
+
+ p = self.p
+ Z1_sq = (Z1 * Z1) % p
+ Z2_sq = (Z2 * Z2) % p
+ U1 = (X1 * Z2_sq) % p
+ U2 = (X2 * Z1_sq) % p
+ S1 = (Y1 * Z2 * Z2_sq) % p
+ S2 = (Y2 * Z1 * Z1_sq) % p
+
+ if U1 == U2:
+ if S1 == S2:
+ return self._double_xyz(X1, Y1, Z1)
+ return _JACOBIAN_INFINITY
+
+ H = (U2 - U1) % p
+ R = (S2 - S1) % p
+ H_sq = (H * H) % p
+ H_cube = (H_sq * H) % p
+ V = (U1 * H_sq) % p
+
+ X3 = (R * R - H_cube - 2 * V) % p
+ Y3 = (R * (V - X3) - S1 * H_cube) % p
+ Z3 = (Z1 * Z2 * H) % p
+
+ return X3, Y3, Z3
+
+ def _add_mixed_xyz(self, X1: int, Y1: int, Z1: int, x2: int, y2: int) -> Tuple[int, int, int]:
+ """混合加法内核，(x2, y2) 为仿射坐标 (不能是无穷远点)"""
+ if Z1 == 0:
+ return x2, y2, 1
+
+ p = self.p
+ Z1_sq = (Z1 * Z1) % p
+ U2 = (x2 * Z1_sq) % p
+ S2 = (y2 * Z1 * Z1_sq) % p
+
+ if X1 == U2:
+ if Y1 == S2:
+ return self._double_xyz(X1, Y1, Z1)
+ return _JACOBIAN_INFINITY
+
+ H = (U2 - X1) % p
+ R = (S2 - Y1) % p
+ H_sq = (H * H) % p
+ H_cube = (H_sq * H) % p
+ V = (X1 * H_sq) % p
+
+ X3 = (R * R - H_cube - 2 * V) % p
+ Y3 = (R * (V - X3) - Y1 * H_cube) % p
+ Z3 = (Z1 * H) % p
+
+ return X3, Y3, Z3
+
+ def _to_affine_xyz(self, X: int, Y: int, Z: int) -> ECPoint:
+ """雅可比坐标转换为仿射坐标点 (一次模逆)"""
+ if Z == 0:
+ return ECPoint.INFINITY
+ p = self.p
+ z_inv = self.mod_inverse(Z, p)
+ z_inv_sq = (z_inv * z_inv) % p
+ return ECPoint((X * z_inv_sq) % p, (Y * z_inv_sq * z_inv) % p)
+
+ def batch_to_affine(self, points: List[Tuple[int, int, int]]) -> List[ECPoint]:
+ """
+ 批量将雅可比坐标三元组转换为仿射坐标点，所有Z共用一次模逆
+
+ Args:
+ points: (X, Y, Z) 三元组列表，Z = 0为无穷远点
 
- return ECPoint(x3, y3)
+ Returns:
+ 与points一一对应的ECPoint列表
+ """
+ finite = [point for point in points if point[2] != 0]
+ converted = iter(self._batch_to_affine_xy(finite)) if finite else iter(())
+ return [ECPoint.INFINITY if Z == 0 else ECPoint(*next(converted)) for _, _, Z in points]
+
+ def _batch_to_affine_xy(self, points: List[Tuple[int, int, int]]) -> List[Tuple[int, int]]:
+ """批量转换为仿射坐标 (x, y)，所有Z共用一次模逆；点均不能是无穷远点"""
+ p = self.p
+ z_inverses = batch_mod_inverse([Z for _, _, Z in points], p, self.mod_inverse)
+ result = []
+ for (X, Y, _), z_inv in zip(points, z_inverses):
+ z_inv_sq = (z_inv * z_inv) % p
+ result.append(((X * z_inv_sq) % p, (Y * z_inv_sq * z_inv) % p))
+ return result
+
+ def _wnaf_multiply_xyz(self, k: int, x: int, y: int) -> Tuple[int, int, int]:
+ """变基点wNAF标量乘法 k*(x, y)，k > 0，结果为雅可比坐标三元组"""
+ p = self.p
+ width = wnaf_width(k.bit_length())
+
+ # 奇数倍点表 [P, 3P, ..., (2^(w-1)-1)P]，批量转为仿射坐标后用于混合加法。
+ # P-256的余因子为1，曲线上每个有限点的阶都是素数n，倍数小于n时不会得到无穷远点
+ positives = [(x, y)]
+ if width > 2:
+ acc = (x, y, 1)
+ X2, Y2, Z2 = self._double_xyz(x, y, 1)
+ odd = []
+ for _ in range((1 << (width - 2)) - 1):
+ acc = self._add_xyz(acc[0], acc[1], acc[2], X2, Y2, Z2)
+ odd.append(acc)
+ positives += self._batch_to_affine_xy(odd)
+ negatives = [(qx, (-qy) % p) for qx, qy in positives]
+
+ digits = wnaf_digits(k, width)
+ double = self._double_xyz
+ add_mixed = self._add_mixed_xyz
+
+ # 最高位非零且为正，从它开始，每位倍点一次，非零位混合加上表中的点
+ X, Y = positives[digits[-1] >> 1]
+ Z = 1
+ for digit in reversed(digits[:-1]):
+ X, Y, Z = double(X, Y, Z)
+ if digit > 0:
+ qx, qy = positives[digit >> 1]
+ X, Y, Z = add_mixed(X, Y, Z, qx, qy)
+ elif digit < 0:
+ qx, qy = negatives[(-digit) >> 1]
+ X, Y, Z = add_mixed(X, Y, Z, qx, qy)
+ return X, Y, Z
 
  def point_multiply(self, k: int, P: ECPoint) -> ECPoint:
- """标量乘法 k * P"""
- if k == 0:
- return ECPoint(is_infinity=True)
+ """
+ 标量乘法 k * P
+ 基点G查梳状表，其他点使用wNAF；中间结果全部为雅可比坐标，只在最后求一次逆
+ """
  if k == 1:
  return P
+ return self._to_affine_xyz(*self.point_multiply_jacobian(k, P))
 
- # 二进制展开法
- result = ECPoint(is_infinity=True)
- addend = P
-
- while k:
- if k & 1:
- result = self.point_add(result, addend)
- addend = self.point_double(addend)
- k >>= 1
+ def point_multiply_jacobian(self, k: int, P: ECPoint) -> Tuple[int, int, int]:
+ """标量乘法 k * P，结果保留为雅可比坐标三元组 (供batch_to_affine批量转换)"""
+ if k == 0 or P.is_infinity:
+ return _JACOBIAN_INFINITY
+ if k < 0:
+ k = -k
+ P = ECPoint(P.x, (-P.y) % self.p)
 
- return result
+ if P.x == self.gx and P.y == self.gy:
+ return self.comb_table.multiply_xyz(self, k)
+ return self._wnaf_multiply_xyz(k, P.x, P.y)
 
  def generate_keypair(self) -> Tuple[int, ECPoint]:
  """生成椭圆曲线密钥对"""
@@ -155,6 +437,11 @@ class P256Curve:
 
  raise ValueError("无法将数据映射到椭圆曲线点")
 
+# k-匿名分桶使用的哈希前缀位数: 请求只暴露密码哈希的前16位，
+# 每个前缀对应所有可能密码中的1/65536，服务端无法据此确定具体密码
+DEFAULT_PREFIX_BITS = 16
+MAX_PREFIX_BITS = 16
+
 class PasswordCheckupCrypto:
  """Password Checkup协议密码学组件"""
 
@@ -167,6 +454,18 @@ class PasswordCheckupCrypto:
  # 使用PBKDF2进行密码哈希
  return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, 100000)
 
+ def hash_prefix(self, password_hash: bytes, prefix_bits: int = DEFAULT_PREFIX_BITS) -> int:
+ """
+ 密码哈希所属的桶号
+
+ 取 SHA-256(域分隔符 || 密码哈希) 的前prefix_bits位，而不是直接截取密码哈希，
+ 使暴露的前缀与映射到曲线上的值无关
+ """
+ if not 0 <= prefix_bits <= MAX_PREFIX_BITS:
+ raise ValueError(f"前缀位数必须在0-{MAX_PREFIX_BITS}之间")
+ digest = hashlib.sha256(b'password-checkup-bucket' + password_hash).digest()
+ return int.from_bytes(digest[:2], 'big') >> (16 - prefix_bits)
+
  def blind_element(self, element: bytes, blind_factor: int) -> ECPoint:
  """对元素进行盲化处理"""
  # 将元素哈希到椭圆曲线点
@@ -177,14 +476,38 @@ class PasswordCheckupCrypto:
 
  return blinded_point
 
+ def blind_elements(self, elements: List[bytes], blind_factors: List[int]) -> List[ECPoint]:
+ """批量盲化: 各标量乘法结果保留为雅可比坐标，最后共用一次模逆转换"""
+ curve = self.curve
+ return curve.batch_to_affine([curve.point_multiply_jacobian(r, curve.hash_to_curve(element))
+ for element, r in zip(elements, blind_factors)])
+
  def server_process(self, blinded_point: ECPoint, server_key: int) -> ECPoint:
  """服务端处理盲化点"""
  return self.curve.point_multiply(server_key, blinded_point)
 
+ def server_process_batch(self, blinded_points: List[ECPoint], server_key: int) -> List[ECPoint]:
+ """服务端批量处理盲化点，共用一次模逆转换为仿射坐标"""
+ curve = self.curve
+ return curve.batch_to_affine([curve.point_multiply_jacobian(server_key, point)
+ for point in blinded_points])
+
+ def unblind_elements(self, processed_points: List[ECPoint], blind_factors: List[int]) -> List[ECPoint]:
+ """
+ 批量去盲化
+
+ 所有盲化因子的逆元由Montgomery批量求逆得到 (只对乘积做一次盲化模逆)，
+ 各标量乘法结果再共用一次模逆转换为仿射坐标；N个元素共两次模逆
+ """
+ curve = self.curve
+ inverses = batch_mod_inverse(blind_factors, curve.n, curve.mod_inverse_secret)
+ return curve.batch_to_affine([curve.point_multiply_jacobian(r_inv, point)
+ for point, r_inv in zip(processed_points, inverses)])
+
  def unblind_element(self, processed_point: ECPoint, blind_factor: int) -> ECPoint:
  """去盲化处理"""
  # 计算盲化因子的逆元
- blind_inverse = self.curve.mod_inverse(blind_factor, self.curve.n)
+ blind_inverse = self.curve.mod_inverse_secret(blind_factor, self.curve.n)
 
  # 乘以逆元实现去盲化
  unblinded_point = self.curve.point_multiply(blind_inverse, processed_point)
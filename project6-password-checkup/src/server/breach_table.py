@@ -0,0 +1,226 @@
+"""
+服务端预计算的泄露密码加密表
+
+表中保存数据库中每个泄露密码的 H(p)^k (k为服务端密钥)，以压缩点的字节形式
+存放。这些值在数据库加载或更新时计算一次，之后每个请求只需处理客户端发来的元素，
+请求耗时与数据库大小无关。
+
+表按密码哈希的前缀分桶 (k-匿名): 客户端只发送自己密码哈希的前prefix_bits位
+(见PasswordCheckupCrypto.hash_prefix)，服务端只返回该桶中的条目。每条记录为
+桶号(2字节大端) + 值，整张表按字节序排序，同一个桶的记录因此连续存放，
+用两次二分查找即可定位。
+
+文件格式:
+ 0 4 魔数 b'PCBT'
+ 4 2 版本 (小端)
+ 6 2 值的长度 (小端)
+ 8 8 记录数 (小端)
+ 16 16 服务端密钥指纹，防止用另一个密钥的表回答请求
+ 32 1 前缀位数
+ 33 ... 按字节序升序排列的定长记录
+
+保存时先写临时文件再原子替换；打开时用mmap只读映射，记录按需从页缓存读取，
+不需要把整张表读入内存。
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+HEADER = struct.Struct('<4sHHQ16sB')
+MAGIC = b'PCBT'
+VERSION = 2
+
+# P-256压缩点的长度
+RECORD_SIZE = 33
+
+# 桶号的字节数，前缀位数最多为16
+BUCKET_BYTES = 2
+MAX_PREFIX_BITS = 8 * BUCKET_BYTES
+
+def key_fingerprint(server_key: int) -> bytes:
+ """服务端密钥的指纹 (不泄露密钥本身)"""
+ return hashlib.sha256(b'password-checkup-table' + server_key.to_bytes(32, 'big')).digest()[:16]
+
+class EncryptedBreachTable:
+ """按前缀分桶、排序的定长记录表，可以在内存中构建，也可以从文件mmap打开"""
+
+ def __init__(self, entries: Iterable[Tuple[int, bytes]] = (), fingerprint: bytes = bytes(16),
+ prefix_bits: int = 0, record_size: int = RECORD_SIZE):
+ """
+ 在内存中构建表 (重复条目只保留一份)
+
+ Args:
+ entries: (桶号, 值) 对，值为定长记录，如压缩后的 H(p)^k
+ fingerprint: 服务端密钥指纹
+ prefix_bits: 分桶用的前缀位数，0表示只有一个桶
+ record_size: 值的长度
+ """
+ if not 0 <= prefix_bits <= MAX_PREFIX_BITS:
+ raise ValueError(f"前缀位数必须在0-{MAX_PREFIX_BITS}之间")
+ if len(fingerprint) != 16:
+ raise ValueError("密钥指纹应为16字节")
+
+ records = set()
+ for bucket, value in entries:
+ if len(value) != record_size:
+ raise ValueError(f"记录长度应为{record_size}字节")
+ if not 0 <= bucket < (1 << prefix_bits):
+ raise ValueError(f"桶号{bucket}超出{prefix_bits}位前缀的范围")
+ records.add(bucket.to_bytes(BUCKET_BYTES, 'big') + value)
+
+ self.record_size = record_size
+ self.fingerprint = fingerprint
+ self.prefix_bits = prefix_bits
+ self.path: Optional[str] = None
+ self._count = len(records)
+ self._data = (HEADER.pack(MAGIC, VERSION, record_size, self._count, fingerprint, prefix_bits) +
+ b''.join(sorted(records)))
+ self._file = None
+
+ @property
+ def _stride(self) -> int:
+ """每条记录 (桶号 + 值) 占用的字节数"""
+ return BUCKET_BYTES + self.record_size
+
+ @classmethod
+ def open(cls, path: str, fingerprint: Optional[bytes] = None) -> 'EncryptedBreachTable':
+ """
+ 以只读mmap方式打开表文件
+
+ Args:
+ path: 表文件路径
+ fingerprint: 期望的密钥指纹，不一致时抛出ValueError
+
+ Returns:
+ EncryptedBreachTable实例
+ """
+ file = open(path, 'rb')
+ try:
+ data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+ except ValueError:
+ file.close()
+ raise ValueError("表文件为空") from None
+
+ try:
+ if len(data) < HEADER.size:
+ raise ValueError("表文件头不完整")
+ magic, version, record_size, count, stored, prefix_bits = HEADER.unpack_from(data)
+ if magic != MAGIC or version != VERSION or prefix_bits > MAX_PREFIX_BITS:
+ raise ValueError("不是有效的加密表文件")
+ if len(data) != HEADER.size + count * (BUCKET_BYTES + record_size):
+ raise ValueError("表文件长度与记录数不符")
+ if fingerprint is not None and fingerprint != stored:
+ raise ValueError("表文件与服务端密钥不匹配")
+ except ValueError:
+ data.close()
+ file.close()
+ raise
+
+ table = cls.__new__(cls)
+ table.record_size = record_size
+ table.fingerprint = stored
+ table.prefix_bits = prefix_bits
+ table.path = path
+ table._count = count
+ table._data = data
+ table._file = file
+ return table
+
+ def close(self):
+ """关闭文件映射 (内存中的表无需关闭)"""
+ if self._file is not None:
+ self._data.close()
+ self._file.close()
+ self._file = None
+
+ def __enter__(self) -> 'EncryptedBreachTable':
+ return self
+
+ def __exit__(self, *exc_info):
+ self.close()
+
+ def __len__(self) -> int:
+ return self._count
+
+ def _record(self, index: int) -> bytes:
+ """第index条记录 (桶号 + 值)"""
+ offset = HEADER.size + index * self._stride
+ return self._data[offset:offset + self._stride]
+
+ def _lower_bound(self, key: bytes) -> int:
+ """第一条不小于key的记录的序号"""
+ lo, hi = 0, self._count
+ while lo < hi:
+ mid = (lo + hi) // 2
+ if self._record(mid) < key:
+ lo = mid + 1
+ else:
+ hi = mid
+ return lo
+
+ def __iter__(self) -> Iterator[Tuple[int, bytes]]:
+ """按顺序给出全部 (桶号, 值)"""
+ for index in range(self._count):
+ record = self._record(index)
+ yield int.from_bytes(record[:BUCKET_BYTES], 'big'), record[BUCKET_BYTES:]
+
+ def bucket(self, bucket: int) -> List[bytes]:
+ """
+ 某个桶中的全部值
+
+ Args:
+ bucket: 桶号 (见PasswordCheckupCrypto.hash_prefix)
+
+ Returns:
+ 按字节序排列的值列表
+ """
+ if not 0 <= bucket < (1 << self.prefix_bits):
+ raise ValueError(f"桶号{bucket}超出{self.prefix_bits}位前缀的范围")
+ start = self._lower_bound(bucket.to_bytes(BUCKET_BYTES, 'big'))
+ if bucket + 1 < (1 << MAX_PREFIX_BITS):
+ stop = self._lower_bound((bucket + 1).to_bytes(BUCKET_BYTES, 'big'))
+ else:
+ stop = self._count
+ return [self._record(index)[BUCKET_BYTES:] for index in range(start, stop)]
+
+ def __contains__(self, entry: Tuple[int, bytes]) -> bool:
+ """(桶号, 值) 是否在表中"""
+ bucket, value = entry
+ record = bucket.to_bytes(BUCKET_BYTES, 'big') + value
+ index = self._lower_bound(record)
+ return index < self._count and self._record(index) == record
+
+ def merge(self, entries: Iterable[Tuple[int, bytes]]) -> 'EncryptedBreachTable':
+ """返回加入新条目后的新表 (内存中)，原表不变"""
+ return EncryptedBreachTable(list(self) + list(entries), self.fingerprint,
+ self.prefix_bits, self.record_size)
+
+ def bucket_sizes(self) -> List[int]:
+ """各非空桶的条目数"""
+ sizes = {}
+ for bucket, _ in self:
+ sizes[bucket] = sizes.get(bucket, 0) + 1
+ return list(sizes.values())
+
+ def save(self, path: str):
+ """写入文件: 先写同目录下的临时文件，再原子替换"""
+ directory = os.path.dirname(os.path.abspath(path))
+ fd, tmp_path = tempfile.mkstemp(prefix='.breach_table.', dir=directory)
+ try:
+ with os.fdopen(fd, 'wb') as file:
+ file.write(self._data[:self.nbytes()])
+ file.flush()
+ os.fsync(file.fileno())
+ os.replace(tmp_path, path)
+ except BaseException:
+ if os.path.exists(tmp_path):
+ os.unlink(tmp_path)
+ raise
+
+ def nbytes(self) -> int:
+ """表的字节数 (含文件头)"""
+ return HEADER.size + self._count * self._stride
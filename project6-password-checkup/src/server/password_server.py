@@ -6,22 +6,54 @@ Password Checkup协议服务端实现
 import hashlib
 import json
 import secrets
-from typing import List, Dict, Any, Set
+from typing import Iterable, List, Dict, Any, Optional, Set
 import sys
 import os
 
 # 添加crypto模块路径
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'crypto'))
 
-from elliptic_curve import PasswordCheckupCrypto, ECPoint
+from elliptic_curve import PasswordCheckupCrypto, ECPoint, DEFAULT_PREFIX_BITS
+from bloom_filter import BloomFilter
+from breach_table import EncryptedBreachTable, key_fingerprint
 
 class PasswordCheckupServer:
- """Password Checkup协议服务端"""
+ """
+ Password Checkup协议服务端
+
+ 数据库中每个泄露密码的 H(p)^k 在加载或更新数据库时预先计算，保存在
+ EncryptedBreachTable中；指定table_path时表持久化到文件，使用同一密钥
+ 重启后直接mmap打开，不再重新计算。
+
+ 表按密码哈希的前缀分桶，请求只携带客户端密码哈希的前缀，响应只包含
+ 对应桶中的条目，响应大小与数据库总大小无关。桶中的条目可以逐个发送
+ (response_format='list')，也可以编码为Bloom过滤器 (response_format='bloom')；
+ 请求未指定时使用'bloom'，与客户端的默认值一致。各桶的Bloom过滤器在表构建、
+ 打开或更新时编码一次并缓存，请求只读取缓存。
+ """
 
- def __init__(self):
+ def __init__(self, server_key: Optional[int] = None, table_path: Optional[str] = None,
+ prefix_bits: int = DEFAULT_PREFIX_BITS, false_positive_rate: float = 1e-6):
+ """
+ Args:
+ server_key: 服务端密钥，默认随机生成 (使用已有的表文件时必须提供生成该表的密钥)
+ table_path: 加密表文件路径，为None时表只保存在内存中
+ prefix_bits: 分桶用的哈希前缀位数，客户端必须使用相同的值
+ false_positive_rate: Bloom过滤器响应的误判率
+ """
+ if not 0 < false_positive_rate < 1:
+ raise ValueError("误判率必须在0和1之间")
  self.crypto = PasswordCheckupCrypto()
- self.server_key = self.crypto.generate_server_key()
+ self.server_key = server_key if server_key is not None else self.crypto.generate_server_key()
+ self.table_path = table_path
+ self.prefix_bits = prefix_bits
+ self.false_positive_rate = false_positive_rate
  self.compromised_db = set() # 已泄露密码哈希数据库
+ self._bloom_filters: Dict[int, str] = {} # 桶号 -> 编码后的Bloom过滤器 (十六进制)
+ self._empty_bloom_filter = BloomFilter.for_capacity(0, false_positive_rate).to_bytes().hex()
+ self.breach_table = self._open_table()
+ if self.breach_table is not None:
+ self._encode_bloom_filters()
  self.load_compromised_passwords()
  print("Password Checkup服务端初始化完成")
  print(f"服务端密钥: {hex(self.server_key)[:16]}...")
@@ -59,12 +91,73 @@ class PasswordCheckupServer:
  password_hash = self.crypto.hash_password(password, salt)
  self.compromised_db.add(password_hash)
 
+ # 从文件打开的表已包含加密后的数据库，否则一次性计算全部 H(p)^k
+ if self.breach_table is None:
+ self.breach_table = EncryptedBreachTable(fingerprint=key_fingerprint(self.server_key),
+ prefix_bits=self.prefix_bits)
+ self._extend_table(self.compromised_db)
+
  print(f"已加载 {len(common_passwords)} 个常见泄露密码到数据库")
 
+ def _open_table(self) -> Optional[EncryptedBreachTable]:
+ """打开已有的表文件 (不存在时返回None)"""
+ if self.table_path is None or not os.path.exists(self.table_path):
+ return None
+ table = EncryptedBreachTable.open(self.table_path, key_fingerprint(self.server_key))
+ if table.prefix_bits != self.prefix_bits:
+ table.close()
+ raise ValueError(f"表文件按{table.prefix_bits}位前缀分桶，与服务端配置的{self.prefix_bits}位不符")
+ print(f"已打开加密表 {self.table_path}（{len(table)} 条记录）")
+ return table
+
+ def encrypt_password_hash(self, password_hash: bytes) -> bytes:
+ """计算泄露密码哈希的 H(p)^k (压缩点字节)"""
+ point = self.crypto.curve.hash_to_curve(password_hash)
+ return self.crypto.point_to_bytes(self.crypto.server_process(point, self.server_key))
+
+ def _extend_table(self, password_hashes: Iterable[bytes]):
+ """加密新的泄露密码哈希并并入加密表 (按前缀分桶)，指定了表文件时同时写回"""
+ records = []
+ for password_hash in password_hashes:
+ try:
+ records.append((self.crypto.hash_prefix(password_hash, self.prefix_bits),
+ self.encrypt_password_hash(password_hash)))
+ except ValueError:
+ # 跳过无法映射的元素
+ continue
+
+ old_table = self.breach_table
+ self.breach_table = old_table.merge(records)
+ if self.table_path is not None:
+ self.breach_table.save(self.table_path)
+ self.breach_table = EncryptedBreachTable.open(self.table_path, old_table.fingerprint)
+ old_table.close()
+ self._encode_bloom_filters({bucket for bucket, _ in records})
+
+ def _encode_bloom_filters(self, buckets: Optional[Set[int]] = None):
+ """
+ 为桶编码Bloom过滤器并缓存，buckets为None时编码整张表
+
+ 只有表中条目变化的桶需要重新编码，其余桶的缓存保持不变
+ """
+ if buckets is None:
+ self._bloom_filters = {}
+ contents: Dict[int, List[bytes]] = {}
+ for bucket, value in self.breach_table:
+ contents.setdefault(bucket, []).append(value)
+ else:
+ contents = {bucket: self.breach_table.bucket(bucket) for bucket in buckets}
+
+ for bucket, values in contents.items():
+ bloom = BloomFilter.from_items(values, self.false_positive_rate)
+ self._bloom_filters[bucket] = bloom.to_bytes().hex()
+
  def add_compromised_password(self, password: str, salt: bytes = b'password_checkup_salt'):
  """添加泄露密码到数据库"""
  password_hash = self.crypto.hash_password(password, salt)
+ if password_hash not in self.compromised_db:
  self.compromised_db.add(password_hash)
+ self._extend_table([password_hash])
  print(f"添加泄露密码到数据库（哈希: {password_hash[:8].hex()}...）")
 
  def process_client_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
@@ -72,61 +165,131 @@ class PasswordCheckupServer:
  处理客户端密码检查请求
 
  Args:
- request: 客户端请求
+ request: 客户端请求，包含盲化元素、密码哈希前缀 (桶号) 和响应格式
+ ('list' 逐个发送桶中的条目，'bloom' 发送Bloom过滤器，默认为 'bloom')
 
  Returns:
  处理结果响应
  """
  session_id = request.get('session_id')
  blinded_element_hex = request.get('blinded_element')
+ hash_prefix = request.get('hash_prefix')
 
  print(f"处理客户端请求，会话ID: {session_id}")
 
+ if hash_prefix is None:
+ raise ValueError("请求缺少密码哈希前缀")
+ response_format = self._check_request_options(request)
+
  # 解析盲化元素
  blinded_element_bytes = bytes.fromhex(blinded_element_hex)
  blinded_element = self.crypto.bytes_to_point(blinded_element_bytes)
 
  print(f"收到盲化元素: {blinded_element}")
 
- # 对盲化元素进行服务端处理
+ # 对盲化元素进行服务端处理 (每个请求唯一的椭圆曲线运算)
  processed_element = self.crypto.server_process(blinded_element, self.server_key)
 
- # 对数据库中的所有泄露密码进行相同处理
- processed_db_elements = []
- for password_hash in self.compromised_db:
- # 将密码哈希映射到椭圆曲线点
- try:
- db_point = self.crypto.curve.hash_to_curve(password_hash)
- # 用服务端密钥处理
- processed_db_point = self.crypto.server_process(db_point, self.server_key)
- processed_db_elements.append(processed_db_point)
- except ValueError:
- # 跳过无法映射的元素
- continue
+ # 构造响应（包含处理后的客户端元素，以及逐个列出或编码为Bloom过滤器的数据库元素）
+ bucket = self._encode_bucket(hash_prefix, response_format)
+ response_elements = [self.crypto.point_to_bytes(processed_element).hex()]
+ response_elements.extend(bucket.pop('bucket_elements', []))
+ response = {
+ 'session_id': session_id,
+ 'processed_elements': response_elements,
+ 'hash_prefix': hash_prefix,
+ 'prefix_bits': self.prefix_bits,
+ 'response_format': response_format,
+ 'server_key_hint': self.server_key, # 仅用于演示，实际不传输
+ 'version': '1.0',
+ 'status': 'success'
+ }
+ response.update(bucket)
+
+ print(f"响应生成完成，包含 {len(response_elements)} 个处理后的元素")
+ return response
+
+ def process_batch_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+ """
+ 处理批量密码检查请求: 一个请求携带N个盲化元素，一次返回全部结果
+
+ Args:
+ request: 批量请求，elements为 {'blinded_element', 'hash_prefix'} 列表，
+ prefix_bits、response_format的含义同process_client_request
+
+ Returns:
+ 批量响应: processed_elements与请求中的元素一一对应；buckets按桶号
+ (字符串) 给出各个桶的内容，多个元素落在同一个桶时只发送一次
+ """
+ session_id = request.get('session_id')
+ elements = request.get('elements') or []
+ response_format = self._check_request_options(request)
+
+ print(f"处理批量请求，会话ID: {session_id}，元素数量: {len(elements)}")
 
- print(f"处理了数据库中的 {len(processed_db_elements)} 个元素")
+ blinded_points = []
+ buckets = {}
+ for element in elements:
+ hash_prefix = element.get('hash_prefix')
+ if hash_prefix is None:
+ raise ValueError("请求缺少密码哈希前缀")
+ blinded_points.append(self.crypto.bytes_to_point(bytes.fromhex(element['blinded_element'])))
+ if str(hash_prefix) not in buckets:
+ buckets[str(hash_prefix)] = self._encode_bucket(hash_prefix, response_format)
 
- # 构造响应（包含处理后的客户端元素和数据库元素）
- response_elements = [processed_element] + processed_db_elements
+ # 所有元素的服务端处理结果共用一次模逆转换为仿射坐标
+ processed_points = self.crypto.server_process_batch(blinded_points, self.server_key)
 
  response = {
  'session_id': session_id,
- 'processed_elements': [
- self.crypto.point_to_bytes(elem).hex()
- for elem in response_elements
- ],
- 'server_key_hint': self.server_key, # 仅用于演示，实际不传输
+ 'processed_elements': [self.crypto.point_to_bytes(point).hex() for point in processed_points],
+ 'buckets': buckets,
+ 'prefix_bits': self.prefix_bits,
+ 'response_format': response_format,
  'version': '1.0',
  'status': 'success'
  }
 
- print(f"响应生成完成，包含 {len(response_elements)} 个处理后的元素")
+ print(f"批量响应生成完成，包含 {len(processed_points)} 个处理后的元素和 {len(buckets)} 个桶")
  return response
 
+ def _check_request_options(self, request: Dict[str, Any]) -> str:
+ """检查请求的前缀位数和响应格式，返回响应格式"""
+ if request.get('prefix_bits', self.prefix_bits) != self.prefix_bits:
+ raise ValueError(f"前缀位数不符，服务端使用{self.prefix_bits}位")
+ response_format = request.get('response_format', 'bloom')
+ if response_format not in ('list', 'bloom'):
+ raise ValueError(f"未知的响应格式: {response_format}")
+ return response_format
+
+ def _encode_bucket(self, hash_prefix: int, response_format: str) -> Dict[str, Any]:
+ """
+ 桶中条目的响应字段
+
+ 数据库元素 H(p)^k 已预先计算，只读取与客户端前缀相同的桶；
+ 'list' 格式为bucket_elements列表，'bloom' 格式为缓存的Bloom过滤器及其误判率
+ """
+ if response_format == 'bloom':
+ if not 0 <= hash_prefix < (1 << self.prefix_bits):
+ raise ValueError(f"桶号{hash_prefix}超出{self.prefix_bits}位前缀的范围")
+ bloom_filter = self._bloom_filters.get(hash_prefix, self._empty_bloom_filter)
+ print(f"使用桶 {hash_prefix} 预先编码的Bloom过滤器（{len(bloom_filter) // 2} 字节）")
+ return {'bloom_filter': bloom_filter, 'false_positive_rate': self.false_positive_rate}
+
+ bucket = self.breach_table.bucket(hash_prefix)
+ print(f"读取了桶 {hash_prefix} 中的 {len(bucket)} 个元素")
+ return {'bucket_elements': [record.hex() for record in bucket]}
+
  def get_statistics(self) -> Dict[str, Any]:
  """获取服务端统计信息"""
+ bucket_sizes = self.breach_table.bucket_sizes()
  return {
  'total_compromised_passwords': len(self.compromised_db),
+ 'encrypted_table_entries': len(self.breach_table),
+ 'encrypted_table_path': self.table_path,
+ 'prefix_bits': self.prefix_bits,
+ 'non_empty_buckets': len(bucket_sizes),
+ 'max_bucket_size': max(bucket_sizes, default=0),
  'server_key_id': hex(self.server_key)[:16] + '...',
  'database_version': '1.0'
  }
@@ -134,13 +297,18 @@ class PasswordCheckupServer:
  def update_database(self, new_passwords: List[str]):
  """更新泄露密码数据库"""
  salt = b'password_checkup_salt'
- added_count = 0
+ new_hashes = []
 
  for password in new_passwords:
  password_hash = self.crypto.hash_password(password, salt)
  if password_hash not in self.compromised_db:
  self.compromised_db.add(password_hash)
- added_count += 1
+ new_hashes.append(password_hash)
+
+ # 只加密新增的条目
+ added_count = len(new_hashes)
+ if new_hashes:
+ self._extend_table(new_hashes)
 
  print(f"数据库更新完成，新增 {added_count} 个泄露密码")
  return added_count
@@ -6,6 +6,7 @@ Password Checkup协议测试套件
 import unittest
 import sys
 import os
+import tempfile
 
 # 添加项目路径
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src', 'crypto'))
@@ -13,8 +14,10 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src', 'client'))
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src', 'server'))
 
 from elliptic_curve import P256Curve, PasswordCheckupCrypto, ECPoint
+from bloom_filter import BloomFilter
 from password_client import PasswordCheckupClient
 from password_server import PasswordCheckupServer
+from breach_table import EncryptedBreachTable, key_fingerprint
 
 class TestEllipticCurve(unittest.TestCase):
  """测试椭圆曲线密码学组件"""
@@ -48,8 +51,57 @@ class TestEllipticCurve(unittest.TestCase):
  self.assertEqual(P3.x, P3_alt.x)
  self.assertEqual(P3.y, P3_alt.y)
 
+ # 阶n与无穷远点
+ self.assertIs(self.curve.point_multiply(self.curve.n, G), ECPoint.INFINITY)
+ self.assertEqual(self.curve.point_multiply(self.curve.n + 3, G), P3)
+
  print(" 椭圆曲线点运算验证通过")
 
+ def test_scalar_multiplication_engine(self):
+ """测试梳状表 (基点) 和wNAF (变基点) 与仿射二进制展开法结果一致"""
+ curve = self.curve
+
+ def reference(k, P):
+ result = ECPoint.INFINITY
+ while k:
+ if k & 1:
+ result = curve.point_add(result, P)
+ P = curve.point_double(P)
+ k >>= 1
+ return result
+
+ # 已知测试向量: 2G的x坐标
+ self.assertEqual(curve.point_multiply(2, curve.G).x,
+ 0x7cf27b188d034f7e8a52380304b51ac3c08969e277f21b35a60b48fc47669978)
+
+ Q = curve.point_multiply(0x1234567890abcdef, curve.G)
+ scalars = [2, 3, 15, 16, 17, 255, 256, 2 ** 128 + 1, curve.n - 1,
+ 0x9e3779b97f4a7c15f39cc0605cedc8341082276bf3a27251f86c6a11d0c18e95]
+ for k in scalars:
+ self.assertEqual(curve.point_multiply(k, curve.G), reference(k, curve.G))
+ self.assertEqual(curve.point_multiply(k, Q), reference(k, Q))
+ self.assertEqual(curve.point_multiply(-5, Q), reference(curve.n - 5, Q))
+ self.assertIs(curve.point_multiply(curve.n, Q), ECPoint.INFINITY)
+
+ # 不同齿数的梳状表结果相同，表在实例之间共享
+ self.assertEqual(P256Curve(comb_teeth=3).point_multiply(scalars[-1], curve.G),
+ curve.point_multiply(scalars[-1], curve.G))
+ self.assertIs(P256Curve().comb_table, curve.comb_table)
+ self.assertEqual(len(curve.comb_table.table), 1 << curve.comb_teeth)
+
+ print(" 梳状表/wNAF标量乘法验证通过")
+
+ def test_point_representation(self):
+ """测试点对象的紧凑不可变表示"""
+ G = self.curve.G
+ self.assertFalse(hasattr(G, '__dict__'))
+ with self.assertRaises(AttributeError):
+ G.x = 1
+ self.assertIs(ECPoint(is_infinity=True), ECPoint.INFINITY)
+ self.assertEqual(len({G, ECPoint(G.x, G.y), ECPoint.INFINITY}), 2)
+
+ print(" 点对象表示验证通过")
+
  def test_keypair_generation(self):
  """测试密钥对生成"""
  private_key, public_key = self.curve.generate_keypair()
@@ -133,6 +185,51 @@ class TestPasswordCheckupCrypto(unittest.TestCase):
 
  print(" 椭圆曲线点序列化验证通过")
 
+ def test_batch_blinding(self):
+ """测试批量盲化/服务端处理/去盲化与逐个计算结果一致"""
+ elements = [f"element{i}".encode() for i in range(5)]
+ blind_factors = [self.crypto.generate_blind_factor() for _ in elements]
+ server_key = self.crypto.generate_server_key()
+
+ blinded = self.crypto.blind_elements(elements, blind_factors)
+ self.assertEqual(blinded, [self.crypto.blind_element(e, r) for e, r in zip(elements, blind_factors)])
+
+ processed = self.crypto.server_process_batch(blinded, server_key)
+ self.assertEqual(processed, [self.crypto.server_process(P, server_key) for P in blinded])
+
+ unblinded = self.crypto.unblind_elements(processed, blind_factors)
+ expected = [self.crypto.server_process(self.crypto.curve.hash_to_curve(e), server_key) for e in elements]
+ self.assertEqual(unblinded, expected)
+ self.assertEqual(self.crypto.unblind_elements([], []), [])
+ self.assertEqual(self.crypto.curve.batch_to_affine([(1, 1, 0)]), [ECPoint.INFINITY])
+
+ print(" 批量盲化/去盲化验证通过")
+
+ def test_bloom_filter(self):
+ """测试Bloom过滤器无漏判、误判率接近目标值、可序列化"""
+ members = [i.to_bytes(33, 'big') for i in range(500)]
+ bloom = BloomFilter.from_items(members, 0.01)
+ self.assertTrue(all(member in bloom for member in members))
+
+ others = [(10 ** 6 + i).to_bytes(33, 'big') for i in range(5000)]
+ false_positives = sum(other in bloom for other in others)
+ self.assertLess(false_positives / len(others), 0.02)
+
+ restored = BloomFilter.from_bytes(bloom.to_bytes())
+ self.assertEqual(restored.nbytes(), bloom.nbytes())
+ self.assertTrue(all(member in restored for member in members))
+ # 每个元素约 1.44 * log2(100) ≈ 9.6 位，远小于33字节的点
+ self.assertLess(bloom.nbytes(), len(members) * 2)
+
+ empty = BloomFilter.from_items([], 1e-6)
+ self.assertNotIn(members[0], empty)
+ with self.assertRaises(ValueError):
+ BloomFilter.from_bytes(bloom.to_bytes()[:-1])
+ with self.assertRaises(ValueError):
+ BloomFilter.for_capacity(10, 0)
+
+ print(f" Bloom过滤器验证通过（误判 {false_positives}/{len(others)}）")
+
 class TestPasswordCheckupProtocol(unittest.TestCase):
  """测试完整的Password Checkup协议"""
 
@@ -148,8 +245,8 @@ class TestPasswordCheckupProtocol(unittest.TestCase):
  response = self.server.process_client_request(request)
  is_compromised = self.client.process_server_response(response)
 
- # 应该检测到泄露（注意：这里的检测逻辑在实际实现中更复杂）
  print(f"泄露密码 '{compromised_password}' 检测结果: {'已泄露' if is_compromised else '安全'}")
+ self.assertTrue(is_compromised)
 
  # 测试安全密码
  safe_password = "VerySecureP@ssw0rd2023!#$"
@@ -158,6 +255,7 @@ class TestPasswordCheckupProtocol(unittest.TestCase):
  is_compromised = self.client.process_server_response(response)
 
  print(f"安全密码 '{safe_password}' 检测结果: {'已泄露' if is_compromised else '安全'}")
+ self.assertFalse(is_compromised)
 
  print(" 单个密码检查协议验证通过")
 
@@ -178,8 +276,40 @@ class TestPasswordCheckupProtocol(unittest.TestCase):
  print(f" '{password}': {status}")
 
  self.assertEqual(len(results), len(test_passwords))
+ self.assertEqual(results, {"password": True, "qwerty": True,
+ "SecurePass123!@#": False, "MyRandomPassword2023": False})
  print(" 批量密码检查协议验证通过")
 
+ def test_batch_protocol(self):
+ """测试批量协议: 一个请求、一个响应，服务端只创建一次，同一个桶只发送一次"""
+ server = PasswordCheckupServer(prefix_bits=1)
+ batch_requests = []
+ process_batch = server.process_batch_request
+ server.process_batch_request = lambda request: batch_requests.append(request) or process_batch(request)
+ server.process_client_request = None # 批量检查不走单个请求的路径
+
+ passwords = ["123456", "letmein", "NotInTheDatabase!42"]
+ for response_format in ('bloom', 'list'):
+ client = PasswordCheckupClient(prefix_bits=1, response_format=response_format)
+ client._server = server
+ results = client.batch_check_passwords(passwords)
+ self.assertEqual(results, {"123456": True, "letmein": True, "NotInTheDatabase!42": False})
+
+ # 4个元素最多落在2个桶中
+ request = client.prepare_batch_check(passwords + ["123456"])
+ self.assertEqual(len(request['elements']), 4)
+ response = process_batch(request)
+ self.assertEqual(len(response['processed_elements']), 4)
+ self.assertLessEqual(len(response['buckets']), 2)
+ self.assertEqual(client.process_batch_response(response), [True, True, False, True])
+ with self.assertRaises(ValueError):
+ client.process_batch_response(response)
+
+ self.assertEqual(len(batch_requests), 2)
+ self.assertEqual(PasswordCheckupClient().batch_check_passwords([]), {})
+
+ print(" 批量协议验证通过")
+
  def test_password_strength_analysis(self):
  """测试密码强度分析"""
  test_cases = [
@@ -220,6 +350,210 @@ class TestPasswordCheckupProtocol(unittest.TestCase):
 
  print(f" 服务端数据库操作验证通过（初始: {initial_size}, 最终: {len(self.server.compromised_db)}）")
 
+class TestBreachTable(unittest.TestCase):
+ """测试服务端预计算的加密表"""
+
+ def setUp(self):
+ self.tmpdir = tempfile.TemporaryDirectory()
+ self.path = os.path.join(self.tmpdir.name, 'breach.tbl')
+
+ def tearDown(self):
+ self.tmpdir.cleanup()
+
+ def test_table_file_roundtrip(self):
+ """测试表的分桶、排序、查找、持久化和mmap打开"""
+ entries = [(i % 4, bytes([i % 3]) * 33) for i in range(12)] + [(255, b'\x02' + bytes(range(32)))]
+ fingerprint = key_fingerprint(12345)
+ table = EncryptedBreachTable(entries, fingerprint, prefix_bits=8)
+ self.assertEqual(len(table), 13)
+ self.assertEqual(list(table), sorted(set(entries)))
+ self.assertIn(entries[-1], table)
+ self.assertNotIn((254, entries[-1][1]), table)
+ self.assertEqual(table.bucket(1), sorted({value for bucket, value in entries if bucket == 1}))
+ self.assertEqual(table.bucket(255), [entries[-1][1]])
+ self.assertEqual(table.bucket(7), [])
+ self.assertEqual(sorted(table.bucket_sizes()), [1, 3, 3, 3, 3])
+
+ table.save(self.path)
+ with EncryptedBreachTable.open(self.path, fingerprint) as mapped:
+ self.assertEqual(mapped.prefix_bits, 8)
+ self.assertEqual(list(mapped), list(table))
+ self.assertEqual(mapped.bucket(2), table.bucket(2))
+ self.assertIn(entries[1], mapped)
+ merged = mapped.merge([(7, b'\x03' * 33), entries[0]])
+ self.assertEqual(len(merged), 14)
+ self.assertEqual(merged.bucket(7), [b'\x03' * 33])
+
+ # 整个16位前缀范围的边界桶
+ wide = EncryptedBreachTable([(0xffff, b'\x01' * 33), (0, b'\x02' * 33)], prefix_bits=16)
+ self.assertEqual(wide.bucket(0xffff), [b'\x01' * 33])
+ self.assertEqual(wide.bucket(0), [b'\x02' * 33])
+
+ # 用另一个密钥打开、损坏的文件、越界的桶号都应被拒绝
+ with self.assertRaises(ValueError):
+ EncryptedBreachTable.open(self.path, key_fingerprint(54321))
+ with open(self.path, 'r+b') as file:
+ file.truncate(os.path.getsize(self.path) - 1)
+ with self.assertRaises(ValueError):
+ EncryptedBreachTable.open(self.path)
+ with self.assertRaises(ValueError):
+ EncryptedBreachTable([(0, b'short')])
+ with self.assertRaises(ValueError):
+ EncryptedBreachTable([(256, b'\x02' * 33)], prefix_bits=8)
+ with self.assertRaises(ValueError):
+ table.bucket(256)
+
+ print(" 加密表持久化验证通过")
+
+ def test_server_uses_precomputed_table(self):
+ """测试服务端请求只处理客户端元素，表在重启后复用"""
+ server = PasswordCheckupServer(table_path=self.path)
+ self.assertEqual(len(server.breach_table), len(server.compromised_db))
+ password_hash = server.crypto.hash_password("123456", b'password_checkup_salt')
+ bucket = server.crypto.hash_prefix(password_hash, server.prefix_bits)
+ self.assertIn((bucket, server.encrypt_password_hash(password_hash)), server.breach_table)
+
+ # 同一密钥重启: 直接打开表文件，不再计算 H(p)^k
+ restarted = PasswordCheckupServer(server_key=server.server_key, table_path=self.path)
+ self.assertEqual(list(restarted.breach_table), list(server.breach_table))
+ self.assertEqual(restarted.breach_table.path, self.path)
+
+ # 请求路径上不再对数据库条目做hash_to_curve
+ client = PasswordCheckupClient(response_format='list')
+ request = client.prepare_password_check("123456")
+ curve = restarted.crypto.curve
+ curve.hash_to_curve = None
+ response = restarted.process_client_request(request)
+ del curve.hash_to_curve
+ self.assertEqual(len(response['processed_elements']), len(restarted.breach_table.bucket(bucket)) + 1)
+
+ # 更新数据库只加密新条目，并写回表文件
+ self.assertEqual(restarted.update_database(["newleak1", "123456"]), 1)
+ new_hash = restarted.crypto.hash_password("newleak1", b'password_checkup_salt')
+ with EncryptedBreachTable.open(self.path) as on_disk:
+ self.assertEqual(len(on_disk), len(server.breach_table) + 1)
+ new_bucket = restarted.crypto.hash_prefix(new_hash, restarted.prefix_bits)
+ self.assertIn((new_bucket, restarted.encrypt_password_hash(new_hash)), on_disk)
+
+ # 另一个密钥或另一种分桶配置不能使用这张表
+ with self.assertRaises(ValueError):
+ PasswordCheckupServer(table_path=self.path)
+ with self.assertRaises(ValueError):
+ PasswordCheckupServer(server_key=server.server_key, table_path=self.path, prefix_bits=8)
+
+ print(" 服务端预计算加密表验证通过")
+
+ def test_bucketed_lookup(self):
+ """测试请求只暴露哈希前缀，响应只包含对应桶中的条目"""
+ server = PasswordCheckupServer(prefix_bits=4)
+ server.update_database([f"leaked{i}" for i in range(40)])
+ client = PasswordCheckupClient(prefix_bits=4, response_format='list')
+
+ request = client.prepare_password_check("leaked7")
+ self.assertNotIn('password_hash', request)
+ password_hash = client.crypto.hash_password("leaked7", b'password_checkup_salt')
+ self.assertEqual(request['hash_prefix'], client.crypto.hash_prefix(password_hash, 4))
+
+ response = server.process_client_request(request)
+ bucket = server.breach_table.bucket(request['hash_prefix'])
+ self.assertEqual(response['processed_elements'][1:], [value.hex() for value in bucket])
+ self.assertLess(len(bucket), len(server.breach_table))
+ self.assertTrue(client.process_server_response(response))
+
+ # 同一桶中的其他条目不会造成误判
+ for password in ("not-leaked", "leaked7x"):
+ request = client.prepare_password_check(password)
+ self.assertFalse(client.process_server_response(server.process_client_request(request)))
+
+ # 缺少前缀或前缀位数不符的请求被拒绝
+ request = client.prepare_password_check("leaked7")
+ with self.assertRaises(ValueError):
+ server.process_client_request(dict(request, hash_prefix=None))
+ with self.assertRaises(ValueError):
+ server.process_client_request(dict(request, prefix_bits=16))
+
+ stats = server.get_statistics()
+ self.assertEqual(stats['prefix_bits'], 4)
+ self.assertLessEqual(stats['non_empty_buckets'], 16)
+
+ print(" 哈希前缀分桶查询验证通过")
+
+ def test_bloom_filter_response(self):
+ """测试Bloom过滤器响应: 客户端只去盲化一次并查询过滤器"""
+ server = PasswordCheckupServer(prefix_bits=2, false_positive_rate=1e-4)
+ server.update_database([f"leaked{i}" for i in range(40)])
+ client = PasswordCheckupClient(prefix_bits=2)
+ self.assertEqual(client.response_format, 'bloom')
+
+ request = client.prepare_password_check("leaked3")
+ response = server.process_client_request(request)
+ self.assertEqual(len(response['processed_elements']), 1)
+ bucket_size = len(server.breach_table.bucket(request['hash_prefix']))
+ self.assertLess(len(response['bloom_filter']) // 2, 33 * bucket_size)
+
+ # 客户端只对自己的元素做一次点解压和一次去盲化
+ calls = []
+ unblind = client.crypto.unblind_element
+ client.crypto.unblind_element = lambda *args: calls.append(args) or unblind(*args)
+ self.assertTrue(client.process_server_response(response))
+ self.assertEqual(len(calls), 1)
+
+ for password in ("123456", "password"):
+ request = client.prepare_password_check(password)
+ self.assertTrue(client.process_server_response(server.process_client_request(request)))
+ request = client.prepare_password_check("VerySecureP@ssw0rd2023!#$")
+ self.assertFalse(client.process_server_response(server.process_client_request(request)))
+
+ with self.assertRaises(ValueError):
+ server.process_client_request(dict(request, response_format='xor'))
+
+ print(" Bloom过滤器响应验证通过")
+
+ def test_bloom_filters_cached(self):
+ """测试各桶的Bloom过滤器随表构建和更新编码一次，请求只读取缓存"""
+ server = PasswordCheckupServer(table_path=self.path, prefix_bits=2)
+ client = PasswordCheckupClient(prefix_bits=2)
+ expected = {bucket: BloomFilter.from_items(server.breach_table.bucket(bucket),
+ server.false_positive_rate).to_bytes().hex()
+ for bucket in range(4)}
+
+ # 请求路径上不再构建过滤器；未指定响应格式的请求同样得到Bloom过滤器
+ from_items = BloomFilter.from_items
+ BloomFilter.from_items = None
+ try:
+ request = client.prepare_password_check("123456")
+ del request['response_format']
+ response = server.process_client_request(request)
+ self.assertEqual(response['response_format'], 'bloom')
+ self.assertEqual(response['bloom_filter'], expected[request['hash_prefix']])
+ self.assertTrue(client.process_server_response(response))
+
+ batch = client.prepare_batch_check(["password", "VerySecureP@ssw0rd2023!#$"])
+ response = server.process_batch_request(batch)
+ for bucket, payload in response['buckets'].items():
+ self.assertEqual(payload['bloom_filter'], expected[int(bucket)])
+ self.assertEqual(client.process_batch_response(response), [True, False])
+ with self.assertRaises(ValueError):
+ server.process_client_request(dict(request, hash_prefix=4))
+ finally:
+ BloomFilter.from_items = from_items
+
+ # 更新数据库只重新编码新条目所在的桶
+ server.update_database(["newleak1"])
+ new_hash = server.crypto.hash_password("newleak1", b'password_checkup_salt')
+ new_bucket = server.crypto.hash_prefix(new_hash, 2)
+ for bucket in range(4):
+ if bucket != new_bucket:
+ self.assertEqual(server._bloom_filters.get(bucket), expected[bucket])
+ request = client.prepare_password_check("newleak1")
+ self.assertTrue(client.process_server_response(server.process_client_request(request)))
+
+ # 重启后从打开的表文件编码
+ restarted = PasswordCheckupServer(server_key=server.server_key, table_path=self.path, prefix_bits=2)
+ self.assertEqual(restarted._bloom_filters, server._bloom_filters)
+
+ print(" Bloom过滤器缓存验证通过")
+
 class TestSecurityProperties(unittest.TestCase):
  """测试协议的安全性质"""
 
@@ -276,6 +610,7 @@ def run_all_tests():
  TestEllipticCurve,
  TestPasswordCheckupCrypto,
  TestPasswordCheckupProtocol,
+ TestBreachTable,
  TestSecurityProperties
  ]
 